@@ -1,9 +1,37 @@
 import argparse
+from concurrent.futures import ThreadPoolExecutor
+import os
+import signal
+import sys
 from dotenv import load_dotenv
-from tools.app_logger import setup_logger
-from tools.spotify import Spotify
-from tools.youtube import Youtube
+from tools.app_logger import LEVELS, set_log_level, setup_logger
+from tools.cache import PageCache, SearchCache
+from tools.catalog import CatalogIndex
+from tools.journal import Journal
+from tools.metadata import MetadataStore
+from tools.metrics import DEFAULT_INTERVAL, MetricsWriter, metrics
+from tools.pipeline import (
+    DEFAULT_ESCALATE_CONFIDENCE,
+    STAGE_FUNCTIONS,
+    ArchivePipeline,
+    PipelineStats,
+    Resolution,
+)
+from tools.profiling import StageProfiler
+from tools.ratelimit import DEFAULT_RATE, RateLimitedError
+from tools.spotify import PlaylistWriter, SearchFailedError, Spotify
+from tools.state import SyncState
+from tools.transport import DEFAULT_POOL_SIZE
+from tools.utils import DEFAULT_MATCH_THRESHOLD
+from tools.watch import (
+    DEFAULT_JITTER,
+    DEFAULT_POLL_INTERVAL,
+    PlaylistWatcher,
+    start_control_server,
+)
+from tools.youtube import STRATEGIES, YTDLP_FIRST, Youtube
 from datetime import datetime
+from functools import partial
 from typing import Any
 
 
@@ -12,7 +40,7 @@ load_dotenv()
 
 
 def build_ydl_opts(
-    cookies_file: str, archive_file: str, output_location: str, store_json: bool
+    cookies_file: str, archive_file: str, output_location: str
 ) -> dict[str, Any]:
     """
     Build youtube-dl options dictionary.
@@ -21,7 +49,6 @@ def build_ydl_opts(
         cookies_file (str): Path to cookies file.
         archive_file (str): Path to archive file.
         output_location (str): Directory to save output files.
-        store_json (bool): Flag to store JSON metadata.
 
     Returns:
         dict[str, Any]: Dictionary of youtube-dl options.
@@ -34,7 +61,6 @@ def build_ydl_opts(
         "outtmpl": (output_location + json_out_format),
         "quiet": True,
         "ignoreerrors": True,
-        "writeinfojson": store_json,
         "skip_download": True,
         "verbose": False,
         "logtostderr": False,
@@ -59,21 +85,92 @@ def url_to_id(playlist_id: str) -> str:
     return playlist_id
 
 
+def read_batch(source: str) -> list[str]:
+    """
+    Read the playlists of a batch run.
+
+    Args:
+        source (str): Path of a file with one playlist URL or ID per line, or
+            "-" to read them from stdin. Blank lines and lines starting with
+            "#" are ignored.
+
+    Returns:
+        list[str]: Playlist URLs or IDs, without duplicates, in file order.
+    """
+    if source == "-":
+        lines = sys.stdin.read().splitlines()
+    else:
+        with open(os.path.expanduser(source)) as batch_file:
+            lines = batch_file.read().splitlines()
+    playlists = [line.strip() for line in lines]
+    return list(
+        dict.fromkeys(line for line in playlists if line and not line.startswith("#"))
+    )
+
+
+def report_resolution(
+    resolution: Resolution,
+    logger,
+    state: SyncState | None = None,
+    youtube_playlist_id: str | None = None,
+) -> None:
+    """
+    Log the final outcome of a playlist item and record it for --sync.
+
+    Args:
+        resolution (Resolution): Outcome reported by the pipeline.
+        logger (logging.Logger): Logger to report to.
+        state (SyncState, optional): Sync state store to record handled videos in.
+        youtube_playlist_id (str, optional): YouTube playlist ID, required with state.
+    """
+    song = resolution.song
+    status = None
+    if not song:
+        logger.error(f"Could not parse track and title: {resolution.item.title}")
+        status = "unparsed"
+    elif isinstance(resolution.uri, RateLimitedError):
+        logger.error(f"{song.artist} - {song.title} was rate limited!")
+    elif isinstance(resolution.uri, SearchFailedError):
+        # Not marked handled, so the next run searches it again.
+        logger.error(f"{song.artist} - {song.title}: {resolution.uri}")
+    elif not resolution.uri:
+        logger.error(f"{song.artist} - {song.title} was not found!")
+        status = "not_found"
+    elif resolution.duplicate:
+        logger.info(f"{song.artist} - {song.title} is already in the playlist.")
+        status = "duplicate"
+    elif resolution.added:
+        logger.info(f"{song.artist} - {song.title} was added to playlist.")
+        status = "added"
+    elif resolution.added is False:
+        logger.error(
+            f"{song.artist} - {song.title} could not be added ({resolution.uri})."
+        )
+
+    if state and status:
+        state.mark_handled(youtube_playlist_id, [resolution.item.video_id], status)
+
+
 def get_args():
     """
     Parse command-line arguments.
 
     Returns:
-        tuple: Parsed arguments including YouTube URL, playlist name, youtube-dl options, and dry run flag.
+        tuple: Parsed arguments including YouTube URL, playlist name, youtube-dl options, and the remaining parsed options.
     """
     parser = argparse.ArgumentParser()
-    parser.add_argument(
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument(
         "--url",
         "-u",
         type=str,
-        required=True,
         help="Link to Video or Song URL",
     )
+    source.add_argument(
+        "--batch",
+        type=str,
+        help="File with one playlist URL or ID per line, or - for stdin",
+    )
     parser.add_argument(
         "-o",
         "--output",
@@ -99,7 +196,30 @@ def get_args():
             (Default: Youtube Playlist Name)",
     )
     parser.add_argument(
-        "--store_json", action="store_true", help="Download json the video."
+        "--sync",
+        action="store_true",
+        default=False,
+        help="Add only new videos to the Spotify playlist of a previous run.",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        default=False,
+        help="Continue an interrupted run from its journal, without repeating "
+        "finished extractions, searches or inserts.",
+    )
+    parser.add_argument(
+        "--store_json",
+        action="store_true",
+        help="Deprecated, has no effect: video metadata is always kept in "
+        "<output>/video_metadata.sqlite",
+    )
+    parser.add_argument(
+        "--import-info-json",
+        type=str,
+        default=None,
+        help="Load the .info.json files of earlier --store_json runs from this "
+        "directory into the metadata store before archiving",
     )
 
     parser.add_argument(
@@ -112,87 +232,568 @@ def get_args():
     )
     parser.add_argument("--cookies", type=str, required=False, help="Cookies file")
     parser.add_argument(
-        "--loglevel",
+        "--concurrency",
+        type=int,
+        default=1,
+        required=False,
+        help="Number of Spotify searches to run at once (Default: 1)",
+    )
+    parser.add_argument(
+        "--parallel-playlists",
+        type=int,
+        default=4,
+        required=False,
+        help="Number of playlists archived at once in --batch mode (Default: 4)",
+    )
+    parser.add_argument(
+        "--ytdlp-workers",
+        type=int,
+        default=1,
+        required=False,
+        help="Number of videos to extract with yt-dlp at once (Default: 1)",
+    )
+    parser.add_argument(
+        "--strategy",
+        choices=STRATEGIES,
+        default=YTDLP_FIRST,
+        help="ytdlp-first extracts every video videos.list cannot resolve with "
+        "yt-dlp; parse-first parses the video title first and uses yt-dlp only "
+        f"for unparsable titles and matches below --escalate-confidence "
+        f"(Default: {YTDLP_FIRST})",
+    )
+    parser.add_argument(
+        "--escalate-confidence",
+        type=float,
+        default=DEFAULT_ESCALATE_CONFIDENCE,
+        help="With --strategy parse-first, match confidence (0-100) below which "
+        f"a video is extracted with yt-dlp (Default: {DEFAULT_ESCALATE_CONFIDENCE})",
+    )
+    parser.add_argument(
+        "--rate-limit",
+        type=float,
+        default=DEFAULT_RATE,
+        required=False,
+        help=f"Maximum Spotify requests per second (Default: {DEFAULT_RATE:g})",
+    )
+    parser.add_argument(
+        "--match-threshold",
+        type=float,
+        default=DEFAULT_MATCH_THRESHOLD,
+        required=False,
+        help=f"Minimum match confidence, 0-100 (Default: {DEFAULT_MATCH_THRESHOLD})",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        default=False,
+        help="Do not read or write the Spotify search cache.",
+    )
+    parser.add_argument(
+        "--no-catalog",
+        action="store_true",
+        default=False,
+        help="Do not match songs against, or add search results to, the local "
+        "track catalog.",
+    )
+    parser.add_argument(
+        "--import-catalog",
+        type=str,
+        action="append",
+        default=[],
+        help="Add the tracks of a CSV or JSONL catalog dump (uri, artists, title, "
+        "duration) to the local track catalog. Can be given more than once.",
+    )
+    parser.add_argument(
+        "--refresh-cache",
+        action="store_true",
+        default=False,
+        help="Ignore cached Spotify searches and store fresh results.",
+    )
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        default=False,
+        help="Stay running and sync the playlists whenever they change "
+        "(implies --sync). SIGUSR1 syncs every playlist at once, SIGTERM stops.",
+    )
+    parser.add_argument(
+        "--interval",
+        type=float,
+        default=DEFAULT_POLL_INTERVAL,
+        help="Seconds between two checks of a watched playlist "
+        f"(Default: {DEFAULT_POLL_INTERVAL:g})",
+    )
+    parser.add_argument(
+        "--jitter",
+        type=float,
+        default=DEFAULT_JITTER,
+        help="Share of --interval each check is moved by at random "
+        f"(Default: {DEFAULT_JITTER:g})",
+    )
+    parser.add_argument(
+        "--control-port",
+        type=int,
+        default=None,
+        help="With --watch, serve POST /sync[?playlist=<url>] and GET /status "
+        "on this localhost port",
+    )
+    parser.add_argument(
+        "--metrics-dir",
         type=str,
+        default=None,
+        help="Where to write the JSON and Prometheus metrics (Default: <output>/metrics)",
+    )
+    parser.add_argument(
+        "--metrics-interval",
+        type=float,
+        default=DEFAULT_INTERVAL,
+        help="Seconds between metrics writes during a run, 0 to write only at the end "
+        f"(Default: {DEFAULT_INTERVAL:g})",
+    )
+    parser.add_argument(
+        "--profile",
+        nargs="?",
+        const="",
+        default=None,
+        metavar="DIR",
+        help="Profile CPU time and allocations of every pipeline stage and write "
+        "pstats, flamegraph (folded stacks) and tracemalloc files with a summary "
+        "to DIR (Default: <output>/profile)",
+    )
+    parser.add_argument(
+        "--loglevel",
+        type=str.upper,
+        choices=list(LEVELS),
         default="INFO",
         help="Set log level (DEBUG, INFO, WARNING, ERROR, CRITICAL)",
     )
 
     args = parser.parse_args()
+    if args.no_catalog and args.import_catalog:
+        parser.error("--import-catalog cannot be used with --no-catalog")
+    if args.batch and args.playlist:
+        parser.error("--playlist names a single playlist and cannot be used with --batch")
+    if args.watch and args.dryrun:
+        parser.error("--watch adds to Spotify and cannot be used with --dryrun")
+    if args.control_port is not None and not args.watch:
+        parser.error("--control-port needs --watch")
+    # Watching only ever handles the videos added since the last sync.
+    args.sync = args.sync or args.watch
+    if args.resume and args.dryrun:
+        parser.error("--resume continues runs that add to Spotify and cannot be used with --dryrun")
     youtube_url = args.url
     cookies_file = args.cookies
     playlist_name = args.playlist
 
-    ydl_opts = build_ydl_opts(cookies_file, args.archive, args.output, args.store_json)
+    ydl_opts = build_ydl_opts(cookies_file, args.archive, args.output)
 
-    return youtube_url, playlist_name, ydl_opts, args.dryrun
+    return youtube_url, playlist_name, ydl_opts, args
+
+
+def archive_playlist(
+    youtube_url: str,
+    sp: Spotify,
+    yt: Youtube,
+    args: argparse.Namespace,
+    logger,
+    playlist_name: str | None = None,
+    state: SyncState | None = None,
+    profiler: StageProfiler | None = None,
+) -> PipelineStats:
+    """
+    Archive one YouTube playlist into a Spotify playlist.
+
+    Args:
+        youtube_url (str): YouTube playlist URL or ID.
+        sp (Spotify): Spotify client, possibly shared with other playlists.
+        yt (Youtube): YouTube client, possibly shared with other playlists.
+        args (argparse.Namespace): Parsed command-line options.
+        logger (logging.Logger): Logger to report to.
+        playlist_name (str, optional): Name of the Spotify playlist.
+            Defaults to the title of the YouTube playlist.
+        state (SyncState, optional): Sync state store, with --sync.
+        profiler (StageProfiler, optional): Profiler of the pipeline stages,
+            with --profile.
+
+    Returns:
+        PipelineStats: Counts of every outcome of the playlist's items.
+    """
+    dryrun = args.dryrun
+    yt_playlist_id = url_to_id(youtube_url)
+    logger.info(f"Playlist ID: {yt_playlist_id}")
+    spotify_playlist_id = None
+    handled_video_ids = set()
+    # Every run that adds to Spotify keeps a journal, so --resume can continue it.
+    journal_path = os.path.join(
+        os.path.expanduser(args.output), "journal", f"{yt_playlist_id}.jsonl"
+    )
+    resume = Journal.load(journal_path) if args.resume else None
+    if resume:
+        spotify_playlist_id = resume.spotify_playlist_id
+        logger.info(
+            f"Resuming: {len(resume.final_video_ids)} videos done, "
+            f"{len(resume.resolutions)} matched and waiting to be added."
+        )
+    elif args.resume:
+        logger.info("No interrupted run to resume, starting from the beginning.")
+    if state:
+        handled_video_ids = state.handled_video_ids(yt_playlist_id)
+        spotify_playlist_id = spotify_playlist_id or state.get_spotify_playlist(
+            yt_playlist_id
+        )
+        logger.info(f"{len(handled_video_ids)} videos already synced.")
+
+    if not playlist_name and not spotify_playlist_id:
+        playlist_name = yt.get_playlist_title(yt_playlist_id)
+
+    writer = None
+    journal = None
+    if dryrun:
+        logger.info("Dryrun mode enabled. No songs will be added to Spotify.")
+    else:
+        existing_uris = set()
+        if state and not spotify_playlist_id:
+            spotify_playlist_id = sp.find_playlist(playlist_name)
+        if spotify_playlist_id:
+            logger.info("Syncing into existing Spotify playlist.")
+            existing_uris = sp.get_playlist_track_uris(spotify_playlist_id)
+            logger.info(f"Spotify playlist already has {len(existing_uris)} tracks.")
+        else:
+            playlist_description = yt.get_playlist_description(yt_playlist_id)
+            if not playlist_description:
+                playlist_description = f"YouTube playlist imported on {datetime.now().strftime('%Y-%m-%d')}"
+            # Spotify has a 300 char limit for descriptions; truncate the YT description if necessary
+            playlist_description = playlist_description[:300]
+            logger.info("Creating Spotify playlist.")
+            spotify_playlist_id = sp.create_playlist(
+                playlist_name, playlist_description
+            )
+        if state:
+            state.set_spotify_playlist(yt_playlist_id, spotify_playlist_id)
+        writer = PlaylistWriter(sp, spotify_playlist_id, existing_uris=existing_uris)
+        journal = Journal(journal_path, resume=bool(resume))
+        journal.playlist(spotify_playlist_id)
+
+    # Stream the YouTube playlist into the Spotify playlist
+    logger.info(f"URL:{youtube_url}")
+    pipeline = ArchivePipeline(
+        yt,
+        sp,
+        writer,
+        concurrency=args.concurrency,
+        on_result=partial(
+            report_resolution,
+            logger=logger,
+            state=None if dryrun else state,
+            youtube_playlist_id=yt_playlist_id,
+        ),
+        journal=journal,
+        profiler=profiler,
+        strategy=args.strategy,
+        escalate_confidence=args.escalate_confidence,
+    )
+    complete = False
+    try:
+        stats = pipeline.run(
+            yt_playlist_id, skip_video_ids=handled_video_ids, resume=resume
+        )
+        # Rate limited, unsearched and failed items are left for a resumed run.
+        complete = not (stats.rate_limited or stats.search_failed or stats.failed)
+    finally:
+        if journal:
+            journal.close(complete=complete)
+
+    logger.info(
+        f"{yt_playlist_id}: Resolved {stats.resolved} of {stats.items} videos "
+        f"({stats.not_found} not found, {stats.unparsed} unparsed, "
+        f"{stats.rate_limited} rate limited, {stats.search_failed} search failures)"
+    )
+    if stats.searches_saved or stats.duplicates:
+        logger.info(
+            f"{yt_playlist_id}: Skipped {stats.searches_saved} repeated searches "
+            f"and {stats.duplicates} tracks already in the playlist"
+        )
+    if stats.escalated:
+        logger.info(
+            f"{yt_playlist_id}: Extracted {stats.escalated} low confidence "
+            "matches again with yt-dlp"
+        )
+    if not dryrun:
+        total_songs_added = sp._num_playlist_songs(spotify_playlist_id)
+        logger.info(
+            f"{yt_playlist_id}: Added {stats.added} songs out of {stats.items}, "
+            f"playlist now has {total_songs_added} songs"
+        )
+    return stats
+
+
+def archive_batch(
+    youtube_urls: list[str],
+    sp: Spotify,
+    yt: Youtube,
+    args: argparse.Namespace,
+    logger,
+    state: SyncState | None = None,
+    playlist_name: str | None = None,
+    profiler: StageProfiler | None = None,
+) -> dict[str, PipelineStats | Exception]:
+    """
+    Archive several playlists concurrently with shared clients.
+
+    Every playlist uses the same Spotify token, HTTP pools, rate limit budget
+    and caches. A failing playlist does not stop the others.
+
+    Args:
+        playlist_name (str, optional): Name of the Spotify playlist, for a
+            single playlist given with --playlist.
+        profiler (StageProfiler, optional): Profiler shared by every pipeline.
+
+    Returns:
+        dict[str, PipelineStats | Exception]: Outcome of each playlist, in
+            input order.
+    """
+
+    def archive(youtube_url):
+        try:
+            return archive_playlist(
+                youtube_url,
+                sp,
+                yt,
+                args,
+                logger,
+                playlist_name=playlist_name,
+                state=state,
+                profiler=profiler,
+            )
+        except Exception as error:
+            logger.error(f"Failed to archive {youtube_url}: {error!r}")
+            return error
+
+    with ThreadPoolExecutor(
+        max_workers=max(args.parallel_playlists, 1), thread_name_prefix="playlist"
+    ) as executor:
+        return dict(zip(youtube_urls, executor.map(archive, youtube_urls)))
+
+
+def watch_playlists(
+    youtube_urls: list[str],
+    sp: Spotify,
+    yt: Youtube,
+    args: argparse.Namespace,
+    logger,
+    state: SyncState,
+    playlist_name: str | None = None,
+    profiler: StageProfiler | None = None,
+) -> dict[str, PipelineStats | Exception]:
+    """
+    Keep syncing playlists until stopped, reusing warm clients and caches.
+
+    Each check costs one YouTube API call per 50 playlists; only playlists
+    whose item count or ETag changed are read, and only their new videos are
+    archived.
+
+    Returns:
+        dict[str, PipelineStats | Exception]: Outcome of the last sync of
+            each playlist that was synced.
+    """
+    outcomes = {}
+
+    def check_versions(urls):
+        ids = {url: url_to_id(url) for url in urls}
+        versions = yt.get_playlist_versions(list(dict.fromkeys(ids.values())))
+        return {url: versions[ids[url]] for url in urls if ids[url] in versions}
+
+    def sync(urls):
+        synced = archive_batch(
+            urls, sp, yt, args, logger, state, playlist_name, profiler
+        )
+        outcomes.update(synced)
+        return {
+            url: not isinstance(outcome, Exception)
+            and not (outcome.rate_limited or outcome.search_failed or outcome.failed)
+            for url, outcome in synced.items()
+        }
+
+    watcher = PlaylistWatcher(
+        youtube_urls, check_versions, sync, interval=args.interval, jitter=args.jitter
+    )
+    if hasattr(signal, "SIGUSR1"):
+        signal.signal(signal.SIGUSR1, lambda *_: watcher.request_trigger())
+    signal.signal(signal.SIGTERM, lambda *_: watcher.request_stop())
+    server = None
+    if args.control_port is not None:
+        server = start_control_server(watcher, args.control_port)
+        logger.info(f"Control endpoint on http://127.0.0.1:{args.control_port}")
+    try:
+        watcher.run()
+    finally:
+        if server:
+            server.shutdown()
+    return outcomes
 
 
 def main():
     """
-    Main function to archive YouTube playlist to Spotify.
+    Main function to archive YouTube playlists to Spotify.
 
     Steps:
     1. Parse command-line arguments.
     2. Setup logger.
-    3. Initialize Spotify and YouTube tools.
-    4. Extract playlist ID from URL.
-    5. Retrieve songs from YouTube playlist.
-    6. Add songs to Spotify playlist (if not in dry run mode).
+    3. Initialize Spotify and YouTube tools, shared by every playlist.
+    4. For each playlist (one with --url, several at once with --batch):
+       extract the playlist ID, find or create the Spotify playlist (if not
+       in dry run mode) and stream its songs into the Spotify playlist.
+    5. Report the outcome of every playlist.
     """
 
     # Setup required variables
-    youtube_url, playlist_name, ydl_opts, dryrun = get_args()
-    import logging
-
-    loglevel = logging.getLevelName(ydl_opts.pop("loglevel", "INFO"))
-    archive_logger = setup_logger(__name__, level=loglevel)
-    sp = Spotify()
-    yt = Youtube(ydl_input_ops=ydl_opts)
-
-    # Get the YouTube playlist details
-    yt_playlist_id = url_to_id(youtube_url)
-    archive_logger.info(f"Playlist ID: {yt_playlist_id}")
-    if not playlist_name:
-        playlist_name = yt.get_playlist_title(yt_playlist_id)
-
-    playlist_description = yt.get_playlist_description(yt_playlist_id)
-    if not playlist_description:
-        playlist_description = f"YouTube playlist imported on {datetime.now().strftime('%Y-%m-%d')}"
-    # Spotify has a 300 char limit for descriptions; truncate the YT description if necessary
-    playlist_description = playlist_description[:300]
-
-    # Retrieve music information from the YouTube playlist
-    archive_logger.info(f"URL:{youtube_url}")
-    songs = yt.get_songs_from_playlist(yt_playlist_id)
+    youtube_url, playlist_name, ydl_opts, args = get_args()
+    set_log_level(args.loglevel)
+    archive_logger = setup_logger(__name__)
     archive_logger.debug(
-        "Starting main process with loglevel set to " + logging.getLevelName(loglevel)
+        f"Starting main process with loglevel set to {args.loglevel}"
+    )
+    youtube_urls = read_batch(args.batch) if args.batch else [youtube_url]
+    output_dir = os.path.expanduser(args.output)
+    metrics_writer = MetricsWriter(
+        metrics,
+        args.metrics_dir or os.path.join(output_dir, "metrics"),
+        interval=args.metrics_interval,
+    ).start()
+    cache = None
+    page_cache = None
+    if not args.no_cache:
+        cache = SearchCache(
+            os.path.join(output_dir, "spotify_search_cache.sqlite"),
+            refresh=args.refresh_cache,
+        )
+        page_cache = PageCache(os.path.join(output_dir, "youtube_page_cache.sqlite"))
+    metadata_store = MetadataStore(os.path.join(output_dir, "video_metadata.sqlite"))
+    if args.store_json:
+        archive_logger.warning(
+            f"--store_json is deprecated: video metadata is kept in {metadata_store.path}"
+        )
+    if args.import_info_json:
+        metadata_store.import_info_files(args.import_info_json)
+    catalog = None
+    if not args.no_catalog:
+        catalog = CatalogIndex(os.path.join(output_dir, "catalog.sqlite"))
+        for dump in args.import_catalog:
+            catalog.import_file(dump)
+    parallel_playlists = min(max(args.parallel_playlists, 1), len(youtube_urls))
+    # Dry runs only search, which does not need the user to authorize the app.
+    sp = Spotify(
+        cache=cache,
+        auth_mode="client" if args.dryrun else "user",
+        pool_size=max(args.concurrency * parallel_playlists, DEFAULT_POOL_SIZE),
+        rate_limit=args.rate_limit,
+        match_threshold=args.match_threshold,
+        catalog=catalog,
+    )
+    yt = Youtube(
+        ydl_input_ops=ydl_opts,
+        ytdlp_workers=args.ytdlp_workers,
+        page_cache=page_cache,
+        metadata_store=metadata_store,
+    )
+    state = None
+    if args.sync:
+        state = SyncState(os.path.join(output_dir, "sync_state.sqlite"))
+    profiler = None
+    if args.profile is not None:
+        profiler = StageProfiler(
+            args.profile or os.path.join(output_dir, "profile"), STAGE_FUNCTIONS
+        ).start()
+
+    try:
+        if args.watch:
+            outcomes = watch_playlists(
+                youtube_urls,
+                sp,
+                yt,
+                args,
+                archive_logger,
+                state,
+                playlist_name,
+                profiler,
+            )
+        elif args.batch:
+            archive_logger.info(f"Archiving {len(youtube_urls)} playlists.")
+            outcomes = archive_batch(
+                youtube_urls, sp, yt, args, archive_logger, state, profiler=profiler
+            )
+        else:
+            archive_playlist(
+                youtube_url,
+                sp,
+                yt,
+                args,
+                archive_logger,
+                playlist_name,
+                state,
+                profiler,
+            )
+            outcomes = {}
+    finally:
+        yt.ytdl.close()
+        metrics_writer.stop()
+        if profiler:
+            profiler.stop()
+
+    for stage in STAGE_FUNCTIONS:
+        histogram = metrics.histogram("stage_seconds", stage=stage)
+        if histogram:
+            archive_logger.info(
+                f"Stage {stage}: {histogram.count} pages, {histogram.sum:.2f}s total, "
+                f"p50 {histogram.quantile(0.5):.3f}s, p99 {histogram.quantile(0.99):.3f}s"
+            )
+    archive_logger.info(
+        f"YouTube quota used: {metrics.total('youtube_quota_units_total'):g} units, "
+        f"Spotify requests: {metrics.total('api_requests_total', api='spotify'):g}"
     )
 
-    # Add the retrieved songs to the Spotify playlist
-    if dryrun:
-        archive_logger.info("Dryrun mode enabled. No songs will be added to Spotify.")
-    else:
-        archive_logger.info("Creating Spotify playlist.")
-        spotify_playlist_id = sp.create_playlist(playlist_name, playlist_description)
-
-    for song in songs:
-        song_uri = sp.get_song_uri(song.artist, song.title)
+    if sp.scheduler.throttled:
+        archive_logger.info(f"Spotify rate limited {sp.scheduler.throttled} requests")
 
-        if not song_uri:
-            archive_logger.error(f"{song.artist} - {song.title} was not found!")
-            continue
+    if cache:
+        archive_logger.info(f"Search cache: {cache.hits} hits, {cache.misses} misses")
+        cache.close()
 
-        if dryrun:
-            continue
-        was_added = sp.add_song_to_playlist(song_uri, spotify_playlist_id)
+    if catalog:
+        archive_logger.info(
+            f"Track catalog: {catalog.hits} songs matched locally, "
+            f"{catalog.misses} searched"
+        )
+        catalog.close()
 
-        if was_added:
-            archive_logger.info(f"{song.artist} - {song.title} was added to playlist.")
+    if page_cache:
+        archive_logger.info(f"YouTube pages unchanged: {page_cache.revalidated}")
+        page_cache.close()
 
-    if not dryrun:
-        total_songs_added = sp._num_playlist_songs(spotify_playlist_id)
-        archive_logger.info(f"Added {total_songs_added} songs out of {len(songs)}")
+    archive_logger.info(
+        f"Video metadata: {metadata_store.hits} stored, "
+        f"{metadata_store.misses} extracted with yt-dlp"
+    )
+    metadata_store.close()
+
+    if state:
+        state.close()
+
+    failed = [url for url, outcome in outcomes.items() if isinstance(outcome, Exception)]
+    for url, outcome in outcomes.items():
+        if isinstance(outcome, Exception):
+            archive_logger.error(f"FAILED {url}: {outcome!r}")
+        else:
+            archive_logger.info(
+                f"OK     {url}: added {outcome.added}, resolved {outcome.resolved} "
+                f"of {outcome.items}"
+            )
+    if outcomes:
+        archive_logger.info(
+            f"{len(outcomes) - len(failed)} of {len(outcomes)} playlists archived."
+        )
+    if failed:
+        sys.exit(1)
 
 
 if __name__ == "__main__":
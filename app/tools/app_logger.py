@@ -1,36 +1,126 @@
+import atexit
 import logging
+import logging.handlers
 import os
+import queue
+import threading
 
 
-def setup_logger(name: str, level: str = "INFO") -> logging.Logger:
-    logger = logging.getLogger(name)
+LOG_DIR = "./logs"
+LEVELS = {
+    "CRITICAL": logging.CRITICAL,
+    "ERROR": logging.ERROR,
+    "WARNING": logging.WARNING,
+    "INFO": logging.INFO,
+    "DEBUG": logging.DEBUG,
+}
 
-    if not os.path.exists("./logs"):
-        os.makedirs("./logs")
+_lock = threading.Lock()
+_loggers = {}
+_level = logging.INFO
+_queue = None
+_listener = None
 
-    logging_format = logging.Formatter(
-        "%(asctime)s~%(levelname)s~\t%(message)s\n\t ~module:%(module)s\n\t~function:%(module)s"
-    )
-    stdout_formating = logging.Formatter("%(levelname)s - %(message)s")
 
-    levels = {
-        "CRITICAL": logging.CRITICAL,
-        "ERROR": logging.ERROR,
-        "WARNING": logging.WARNING,
-        "INFO": logging.INFO,
-        "DEBUG": logging.DEBUG,
-    }
-    logger.setLevel(levels.get(level, logging.INFO))
+class PerLoggerFileHandler(logging.Handler):
+    """Writes each record to ``<LOG_DIR>/<logger name>.log``.
 
-    file_handler = logging.FileHandler(f"./logs/{name}.log")
-    file_handler.setFormatter(stdout_formating)
-    file_handler.setLevel(logger.level)
+    File handlers are opened on first use and reused afterwards. Only the
+    queue listener thread calls ``emit``.
+    """
 
+    def __init__(self, directory: str = LOG_DIR):
+        super().__init__()
+        self.directory = directory
+        self._handlers = {}
+
+    def emit(self, record: logging.LogRecord) -> None:
+        handler = self._handlers.get(record.name)
+        if handler is None:
+            if not os.path.exists(self.directory):
+                os.makedirs(self.directory)
+            handler = logging.FileHandler(
+                os.path.join(self.directory, f"{record.name}.log")
+            )
+            handler.setFormatter(self.formatter)
+            self._handlers[record.name] = handler
+        handler.emit(record)
+
+    def close(self) -> None:
+        for handler in self._handlers.values():
+            handler.close()
+        self._handlers.clear()
+        super().close()
+
+
+def _start_listener() -> None:
+    global _queue, _listener
+    formatter = logging.Formatter("%(levelname)s - %(message)s")
+    file_handler = PerLoggerFileHandler(LOG_DIR)
+    file_handler.setFormatter(formatter)
     stream_handler = logging.StreamHandler()
-    stream_handler.setFormatter(stdout_formating)
-    stream_handler.setLevel(logger.level)
+    stream_handler.setFormatter(formatter)
+
+    # Loggers keep their queue handler, so a restarted listener reuses the queue.
+    _queue = _queue or queue.SimpleQueue()
+    _listener = logging.handlers.QueueListener(_queue, file_handler, stream_handler)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+
+def setup_logger(name: str, level: str | None = None) -> logging.Logger:
+    """Return a logger whose records are written off the calling thread.
+
+    Every logger shares one queue; a single background listener formats the
+    records and writes them to the console and to ``./logs/<name>.log``.
+    Handlers are attached only the first time a name is requested, so calling
+    this again (e.g. from every new client) never duplicates log lines.
 
-    logger.addHandler(file_handler)
-    logger.addHandler(stream_handler)
-    logger.setLevel(logging.DEBUG)
+    Args:
+        name (str): Logger name, usually ``__name__``.
+        level (str, optional): Level of this logger. Defaults to the level
+            set with ``set_log_level`` (INFO unless changed).
+
+    Returns:
+        logging.Logger: The configured logger.
+    """
+    with _lock:
+        if _listener is None:
+            _start_listener()
+        logger = _loggers.get(name)
+        if logger is None:
+            logger = logging.getLogger(name)
+            logger.addHandler(logging.handlers.QueueHandler(_queue))
+            logger.propagate = False
+            logger.setLevel(_level)
+            _loggers[name] = logger
+        if level is not None:
+            logger.setLevel(LEVELS.get(str(level).upper(), logging.INFO))
     return logger
+
+
+def set_log_level(level: str) -> None:
+    """Set the level of every logger, existing and future.
+
+    Records below the level are dropped before they are formatted or queued.
+
+    Args:
+        level (str): DEBUG, INFO, WARNING, ERROR or CRITICAL.
+    """
+    global _level
+    with _lock:
+        _level = LEVELS.get(str(level).upper(), logging.INFO)
+        for logger in _loggers.values():
+            logger.setLevel(_level)
+
+
+def shutdown_logging() -> None:
+    """Write out every queued record and close the log files."""
+    global _listener
+    with _lock:
+        listener, _listener = _listener, None
+        if listener is None:
+            return
+    listener.stop()
+    for handler in listener.handlers:
+        handler.close()
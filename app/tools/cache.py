@@ -0,0 +1,217 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from tools.app_logger import setup_logger
+from tools.metrics import metrics
+
+
+# Found tracks rarely change; a miss may be fixed by a new release or upload.
+DEFAULT_TTL = 30 * 24 * 60 * 60
+DEFAULT_NEGATIVE_TTL = 24 * 60 * 60
+DEFAULT_MAX_ENTRIES = 100_000
+# Number of writes between two eviction passes.
+EVICTION_INTERVAL = 500
+
+
+def normalize_query(artist: str, title: str) -> str:
+    """Build the cache key for an artist/title pair.
+
+    Args:
+        artist (str): Artist name as parsed from YouTube.
+        title (str): Track title as parsed from YouTube.
+
+    Returns:
+        str: Case-folded, whitespace-collapsed "artist|title" key.
+    """
+    artist = " ".join(str(artist).casefold().split())
+    title = " ".join(str(title).casefold().split())
+    return f"{artist}|{title}"
+
+
+class SearchCache:
+    """Persistent SQLite cache of compact Spotify search results.
+
+    Each entry holds the candidate list returned for a normalized artist/title
+    query. Empty results are kept for a shorter time than hits, and the
+    least recently used entries are evicted once ``max_entries`` is exceeded.
+
+    Args:
+        path (str): Location of the SQLite database file.
+        ttl (float, optional): Lifetime in seconds of entries with results.
+        negative_ttl (float, optional): Lifetime in seconds of empty results.
+        max_entries (int, optional): Number of entries kept after eviction.
+        refresh (bool, optional): Ignore stored entries but keep writing new
+            results, so every query is searched again and re-cached.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        ttl: float = DEFAULT_TTL,
+        negative_ttl: float = DEFAULT_NEGATIVE_TTL,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        refresh: bool = False,
+    ):
+        self.path = os.path.expanduser(path)
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self.refresh = refresh
+        self.hits = 0
+        self.misses = 0
+        self._writes = 0
+        self._lock = threading.Lock()
+        self.logger = setup_logger(__name__)
+
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+
+        self.connection = sqlite3.connect(
+            self.path, check_same_thread=False, isolation_level=None
+        )
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS search_results (
+                query TEXT PRIMARY KEY,
+                candidates TEXT NOT NULL,
+                expires_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+            """
+        )
+        self.connection.execute(
+            "CREATE INDEX IF NOT EXISTS search_results_accessed"
+            " ON search_results (accessed_at)"
+        )
+
+    def get(self, artist: str, title: str) -> list[dict] | None:
+        """Return the cached candidates for a query.
+
+        Returns:
+            list[dict] | None: Cached candidates (possibly empty), or None when
+                the query is not cached, has expired, or refresh is enabled.
+        """
+        if self.refresh:
+            return None
+        query = normalize_query(artist, title)
+        now = time.time()
+        with self._lock:
+            row = self.connection.execute(
+                "SELECT candidates, expires_at FROM search_results WHERE query = ?",
+                (query,),
+            ).fetchone()
+            if not row or row[1] < now:
+                self.misses += 1
+                metrics.inc("cache_requests_total", cache="spotify_search", result="miss")
+                return None
+            self.connection.execute(
+                "UPDATE search_results SET accessed_at = ? WHERE query = ?",
+                (now, query),
+            )
+            self.hits += 1
+        metrics.inc("cache_requests_total", cache="spotify_search", result="hit")
+        self.logger.debug("Search cache hit: %s", query)
+        return json.loads(row[0])
+
+    def set(self, artist: str, title: str, candidates: list[dict]) -> None:
+        """Store the candidates returned for a query."""
+        query = normalize_query(artist, title)
+        now = time.time()
+        ttl = self.ttl if candidates else self.negative_ttl
+        with self._lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO search_results VALUES (?, ?, ?, ?)",
+                (query, json.dumps(candidates), now + ttl, now),
+            )
+            self._writes += 1
+            if self._writes % EVICTION_INTERVAL == 0:
+                self._evict(now)
+
+    def evict(self) -> None:
+        """Drop expired entries and trim the cache down to ``max_entries``."""
+        with self._lock:
+            self._evict(time.time())
+
+    def _evict(self, now: float) -> None:
+        self.connection.execute(
+            "DELETE FROM search_results WHERE expires_at < ?", (now,)
+        )
+        (count,) = self.connection.execute(
+            "SELECT COUNT(*) FROM search_results"
+        ).fetchone()
+        if count > self.max_entries:
+            self.connection.execute(
+                """
+                DELETE FROM search_results WHERE query IN (
+                    SELECT query FROM search_results
+                    ORDER BY accessed_at LIMIT ?
+                )
+                """,
+                (count - self.max_entries,),
+            )
+            self.logger.debug(f"Evicted {count - self.max_entries} cache entries")
+
+    def close(self) -> None:
+        """Trim the cache and close the database."""
+        self.evict()
+        self.connection.close()
+
+
+class PageCache:
+    """Persistent SQLite store of API response pages and their ETags.
+
+    Used to revalidate unchanged YouTube Data API pages with
+    ``If-None-Match`` and serve them locally on a 304 response.
+
+    Args:
+        path (str): Location of the SQLite database file.
+    """
+
+    def __init__(self, path: str):
+        self.path = os.path.expanduser(path)
+        self.revalidated = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+
+        self.connection = sqlite3.connect(
+            self.path, check_same_thread=False, isolation_level=None
+        )
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS pages (
+                key TEXT PRIMARY KEY,
+                etag TEXT NOT NULL,
+                body TEXT NOT NULL,
+                stored_at REAL NOT NULL
+            )
+            """
+        )
+
+    def get(self, key: str) -> tuple[str, dict] | None:
+        """Return the ``(etag, body)`` stored for a request key."""
+        with self._lock:
+            row = self.connection.execute(
+                "SELECT etag, body FROM pages WHERE key = ?", (key,)
+            ).fetchone()
+        if not row:
+            return None
+        return row[0], json.loads(row[1])
+
+    def set(self, key: str, etag: str, body: dict) -> None:
+        with self._lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?)",
+                (key, etag, json.dumps(body), time.time()),
+            )
+
+    def close(self) -> None:
+        self.connection.close()
@@ -0,0 +1,241 @@
+import csv
+import json
+import os
+import re
+import sqlite3
+import threading
+from typing import Iterable, Iterator
+from tools.app_logger import setup_logger
+from tools.metrics import metrics
+
+
+# Local matches at least this confident are used without searching Spotify.
+DEFAULT_CATALOG_CONFIDENCE = 90
+# Candidates read from the index per lookup; the caller scores them.
+DEFAULT_CANDIDATES = 20
+# Rows inserted per transaction when importing a catalog dump.
+IMPORT_BATCH_SIZE = 10_000
+
+WORD = re.compile(r"\w+")
+
+
+def catalog_text(artists: Iterable[str], title: str) -> str:
+    """Normalized text a track is indexed and looked up by.
+
+    Args:
+        artists (Iterable[str]): Artist names.
+        title (str): Track title.
+
+    Returns:
+        str: Case-folded words of the artists and the title.
+    """
+    return " ".join(WORD.findall(" ".join([*artists, title or ""]).casefold()))
+
+
+class CatalogIndex:
+    """On-disk full-text index of Spotify tracks for matching without a search.
+
+    Tracks come from every Spotify search result and from imported catalog
+    dumps. The words of their artists and title go into an SQLite FTS5
+    inverted index, so a lookup intersects a few posting lists instead of
+    scanning the catalog. The index orders candidates by bm25, so the closest
+    tracks are read even when a query of common words matches more than
+    ``candidates`` tracks; the caller scores them.
+
+    Args:
+        path (str): Location of the SQLite database file.
+        min_confidence (float, optional): Confidence a local match needs to
+            be used instead of a Spotify search.
+        candidates (int, optional): Tracks read from the index per lookup.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        min_confidence: float = DEFAULT_CATALOG_CONFIDENCE,
+        candidates: int = DEFAULT_CANDIDATES,
+    ):
+        self.path = os.path.expanduser(path)
+        self.min_confidence = min_confidence
+        self.candidates = candidates
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self.logger = setup_logger(__name__)
+
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+
+        self.connection = sqlite3.connect(
+            self.path, check_same_thread=False, isolation_level=None
+        )
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS tracks (
+                id INTEGER PRIMARY KEY,
+                uri TEXT NOT NULL UNIQUE,
+                name TEXT,
+                artists TEXT NOT NULL,
+                duration_ms INTEGER,
+                text TEXT NOT NULL
+            )
+            """
+        )
+        self.connection.execute(
+            """
+            CREATE VIRTUAL TABLE IF NOT EXISTS tracks_index USING fts5(
+                text,
+                content='tracks',
+                content_rowid='id',
+                tokenize='unicode61 remove_diacritics 2'
+            )
+            """
+        )
+
+    def add(self, tracks: Iterable[dict]) -> int:
+        """Index tracks, e.g. Spotify search results; known URIs are skipped.
+
+        Args:
+            tracks (Iterable[dict]): Compact tracks with ``uri``, ``name``,
+                ``artists`` and optionally ``duration_ms``.
+
+        Returns:
+            int: Number of new tracks.
+        """
+        rows = [
+            (
+                track["uri"],
+                track.get("name"),
+                json.dumps([artist["name"] for artist in track.get("artists", [])]),
+                track.get("duration_ms"),
+                catalog_text(
+                    (artist["name"] for artist in track.get("artists", [])),
+                    track.get("name"),
+                ),
+            )
+            for track in tracks
+            if track.get("uri")
+        ]
+        if not rows:
+            return 0
+        with self._lock:
+            self.connection.execute("BEGIN")
+            try:
+                (last_id,) = self.connection.execute(
+                    "SELECT COALESCE(MAX(id), 0) FROM tracks"
+                ).fetchone()
+                self.connection.executemany(
+                    "INSERT OR IGNORE INTO tracks (uri, name, artists, duration_ms, text)"
+                    " VALUES (?, ?, ?, ?, ?)",
+                    rows,
+                )
+                added = self.connection.execute(
+                    "INSERT INTO tracks_index (rowid, text)"
+                    " SELECT id, text FROM tracks WHERE id > ?",
+                    (last_id,),
+                ).rowcount
+                self.connection.execute("COMMIT")
+            except BaseException:
+                self.connection.execute("ROLLBACK")
+                raise
+        return added
+
+    def import_file(self, path: str) -> int:
+        """Index a catalog dump.
+
+        CSV files need a header row; JSONL files hold one object per line.
+        Each track has a ``uri``, ``artists`` (a list, or names separated by
+        ";"), a ``title`` (or ``name``) and optionally ``duration_ms`` (or
+        ``duration`` in seconds).
+
+        Args:
+            path (str): Location of a ``.csv`` or ``.jsonl`` file.
+
+        Returns:
+            int: Number of new tracks.
+        """
+        added = 0
+        batch = []
+        for track in _read_dump(os.path.expanduser(path)):
+            batch.append(track)
+            if len(batch) >= IMPORT_BATCH_SIZE:
+                added += self.add(batch)
+                batch = []
+        added += self.add(batch)
+        self.logger.info(f"Imported {added} new tracks from {path}")
+        return added
+
+    def lookup(self, artist: str, title: str) -> list[dict]:
+        """Return the indexed tracks that contain every word of a query.
+
+        Returns:
+            list[dict]: Up to ``candidates`` compact tracks, best bm25 rank first.
+        """
+        query = self._match_query(catalog_text([artist], title))
+        if not query:
+            return []
+        with self._lock:
+            rows = self.connection.execute(
+                """
+                SELECT tracks.uri, tracks.name, tracks.artists, tracks.duration_ms
+                FROM tracks_index JOIN tracks ON tracks.id = tracks_index.rowid
+                WHERE tracks_index MATCH ?
+                ORDER BY tracks_index.rank
+                LIMIT ?
+                """,
+                (query, self.candidates),
+            ).fetchall()
+        return [
+            {
+                "uri": uri,
+                "name": name,
+                "artists": [{"name": artist} for artist in json.loads(artists)],
+                "duration_ms": duration_ms,
+            }
+            for uri, name, artists, duration_ms in rows
+        ]
+
+    def record(self, hit: bool) -> None:
+        """Count a lookup that did or did not replace a Spotify search."""
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+        metrics.inc("cache_requests_total", cache="catalog", result="hit" if hit else "miss")
+
+    def _match_query(self, text: str) -> str:
+        # Quoted, so words like "and" or "not" are not read as operators.
+        return " ".join(f'"{word}"' for word in dict.fromkeys(text.split()))
+
+    def __len__(self) -> int:
+        with self._lock:
+            (count,) = self.connection.execute("SELECT COUNT(*) FROM tracks").fetchone()
+        return count
+
+    def close(self) -> None:
+        self.connection.close()
+
+
+def _read_dump(path: str) -> Iterator[dict]:
+    with open(path, encoding="utf-8", newline="") as file:
+        if path.endswith(".csv"):
+            rows = csv.DictReader(file)
+        else:
+            rows = (json.loads(line) for line in file if line.strip())
+        for row in rows:
+            artists = row.get("artists") or row.get("artist") or []
+            if isinstance(artists, str):
+                artists = [name.strip() for name in artists.split(";") if name.strip()]
+            duration_ms = row.get("duration_ms")
+            if not duration_ms and row.get("duration"):
+                duration_ms = float(row["duration"]) * 1000
+            yield {
+                "uri": row.get("uri"),
+                "name": row.get("title") or row.get("name"),
+                "artists": [{"name": name} for name in artists],
+                "duration_ms": int(float(duration_ms)) if duration_ms else None,
+            }
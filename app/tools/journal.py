@@ -0,0 +1,237 @@
+from dataclasses import dataclass, field
+import json
+import os
+import threading
+import time
+from tools.app_logger import setup_logger
+from tools.metrics import metrics
+
+
+# Records written between two fsyncs, unless a record forces one first.
+DEFAULT_SYNC_EVERY = 256
+# Longest time, in seconds, a record may wait for its fsync.
+DEFAULT_SYNC_INTERVAL = 1.0
+
+
+@dataclass
+class ResumePoint:
+    """Where an interrupted run of a playlist left off.
+
+    Attributes:
+        spotify_playlist_id (str | None): Playlist the run was writing to.
+        page_token (str | None): Token of the first playlist page that still
+            has unfinished items, None for the first page.
+        finished (bool): Every page was fetched and every item is final.
+        final_video_ids (set[str]): Videos that need no more work: added,
+            already in the playlist, not found or unparsed.
+        songs (dict[str, dict]): Unfinished videos whose song was extracted,
+            with its ``artist``, ``title``, ``duration`` and ``source``. Once
+            the song was searched, these are the cleaned names, and its
+            ``uri`` and ``confidence`` are set too.
+    """
+
+    spotify_playlist_id: str | None = None
+    page_token: str | None = None
+    finished: bool = False
+    final_video_ids: set[str] = field(default_factory=set)
+    songs: dict[str, dict] = field(default_factory=dict)
+
+
+class Journal:
+    """Append-only, crash-safe record of the progress of one playlist run.
+
+    Each line is one JSON record: the Spotify playlist written to, every
+    playlist page consumed, the extracted song and the match of every item,
+    and every committed add batch. Records are fsynced in batches (every
+    ``sync_every`` records or ``sync_interval`` seconds), and right away when
+    they describe a change on Spotify, so ``load`` can tell exactly which
+    inserts happened.
+
+    Args:
+        path (str): Location of the journal file.
+        resume (bool, optional): Append to an existing journal instead of
+            starting a new one.
+        sync_every (int, optional): Records written between two fsyncs.
+        sync_interval (float, optional): Seconds a record may wait for its fsync.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        resume: bool = False,
+        sync_every: int = DEFAULT_SYNC_EVERY,
+        sync_interval: float = DEFAULT_SYNC_INTERVAL,
+    ):
+        self.path = os.path.expanduser(path)
+        self.sync_every = sync_every
+        self.sync_interval = sync_interval
+        self._pending = 0
+        self._synced_at = time.monotonic()
+        self._lock = threading.Lock()
+        self.logger = setup_logger(__name__)
+
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        self._file = open(self.path, "a" if resume else "w", encoding="utf-8")
+
+    @staticmethod
+    def load(path: str) -> ResumePoint | None:
+        """Read a journal and work out where its run left off.
+
+        A torn last line, left by a crash in the middle of a write, is ignored.
+
+        Returns:
+            ResumePoint | None: None when there is no journal to resume.
+        """
+        path = os.path.expanduser(path)
+        if not os.path.exists(path):
+            return None
+        point = ResumePoint()
+        # Keyed by token: a resumed run fetches some pages again.
+        pages = {}
+        with open(path, encoding="utf-8") as file:
+            for line in file:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                kind = record["type"]
+                if kind == "playlist":
+                    point.spotify_playlist_id = record["spotify_playlist_id"]
+                elif kind == "page":
+                    pages[record["token"]] = record
+                elif kind in ("song", "resolved"):
+                    point.songs[record["video_id"]] = record
+                elif kind == "done":
+                    point.final_video_ids.add(record["video_id"])
+                elif kind == "added":
+                    point.final_video_ids.update(record["video_ids"])
+
+        for video_id in point.final_video_ids:
+            point.songs.pop(video_id, None)
+        for page in pages.values():
+            if not point.final_video_ids.issuperset(page["video_ids"]):
+                point.page_token = page["token"]
+                break
+        else:
+            if pages:
+                point.page_token = page["next"]
+                point.finished = page["next"] is None
+        return point
+
+    def playlist(self, spotify_playlist_id: str) -> None:
+        """Record the Spotify playlist the run writes to."""
+        self.append(
+            {"type": "playlist", "spotify_playlist_id": spotify_playlist_id},
+            sync=True,
+        )
+
+    def page(
+        self, page_token: str | None, next_page_token: str | None, video_ids: list[str]
+    ) -> None:
+        """Record a fetched playlist page and the videos it holds."""
+        self.append(
+            {
+                "type": "page",
+                "token": page_token,
+                "next": next_page_token,
+                "video_ids": video_ids,
+            }
+        )
+
+    def song(
+        self,
+        video_id: str,
+        artist: str,
+        title: str,
+        duration: float | None,
+        source: str | None = None,
+    ) -> None:
+        """Record the song extracted from a video, and where it came from."""
+        self.append(
+            {
+                "type": "song",
+                "video_id": video_id,
+                "artist": artist,
+                "title": title,
+                "duration": duration,
+                "source": source,
+            }
+        )
+
+    def resolved(
+        self,
+        video_id: str,
+        artist: str,
+        title: str,
+        duration: float | None,
+        uri: str,
+        confidence: float,
+    ) -> None:
+        """Record the match of a video that is still to be added."""
+        self.append(
+            {
+                "type": "resolved",
+                "video_id": video_id,
+                "artist": artist,
+                "title": title,
+                "duration": duration,
+                "uri": uri,
+                "confidence": confidence,
+            }
+        )
+
+    def done(self, video_id: str, status: str) -> None:
+        """Record a video that needs no more work, e.g. "not_found"."""
+        self.append({"type": "done", "video_id": video_id, "status": status})
+
+    def added(self, video_ids: list[str]) -> None:
+        """Record a batch of videos whose tracks were added to the playlist."""
+        self.append({"type": "added", "video_ids": video_ids}, sync=True)
+
+    def append(self, record: dict, sync: bool = False) -> None:
+        """Write a record, fsyncing it now or with the next batch.
+
+        Args:
+            record (dict): JSON-serializable record with a ``type``.
+            sync (bool, optional): Make the record durable before returning.
+        """
+        line = json.dumps(record, separators=(",", ":")) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self._pending += 1
+            if (
+                sync
+                or self._pending >= self.sync_every
+                or time.monotonic() - self._synced_at >= self.sync_interval
+            ):
+                self._sync()
+
+    def sync(self) -> None:
+        """Make every record written so far durable."""
+        with self._lock:
+            self._sync()
+
+    def _sync(self) -> None:
+        if not self._pending:
+            return
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._pending = 0
+        self._synced_at = time.monotonic()
+        metrics.inc("journal_fsyncs_total")
+
+    def close(self, complete: bool = False) -> None:
+        """Sync and close the journal.
+
+        Args:
+            complete (bool, optional): The run finished, so there is nothing
+                left to resume and the journal is deleted.
+        """
+        with self._lock:
+            self._sync()
+            self._file.close()
+        if complete:
+            os.remove(self.path)
+            self.logger.debug(f"Run complete, removed journal {self.path}")
@@ -0,0 +1,148 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Iterator
+from tools.app_logger import setup_logger
+from tools.metrics import metrics
+
+
+# The yt-dlp fields the archiver reads; everything else is dropped.
+FIELDS = ("title", "artist", "track", "duration", "channel")
+INFO_JSON_SUFFIX = ".info.json"
+
+
+class MetadataStore:
+    """Persistent SQLite store of the yt-dlp metadata the archiver uses.
+
+    Replaces the per-video ``.info.json`` files yt-dlp used to write: one row
+    per video holds only ``FIELDS``, so a video that was extracted once is
+    answered locally on every later run.
+
+    Args:
+        path (str): Location of the SQLite database file.
+    """
+
+    def __init__(self, path: str):
+        self.path = os.path.expanduser(path)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self.logger = setup_logger(__name__)
+
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+
+        self.connection = sqlite3.connect(
+            self.path, check_same_thread=False, isolation_level=None
+        )
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS videos (
+                video_id TEXT PRIMARY KEY,
+                title TEXT,
+                artist TEXT,
+                track TEXT,
+                duration REAL,
+                channel TEXT,
+                stored_at REAL NOT NULL
+            )
+            """
+        )
+
+    def get(self, video_id: str) -> dict | None:
+        """Return the stored metadata of a video.
+
+        Returns:
+            dict | None: ``id`` and ``FIELDS`` of the video, with None for
+                fields yt-dlp did not report, or None when it is not stored.
+        """
+        with self._lock:
+            row = self.connection.execute(
+                f"SELECT {', '.join(FIELDS)} FROM videos WHERE video_id = ?",
+                (video_id,),
+            ).fetchone()
+            if row:
+                self.hits += 1
+            else:
+                self.misses += 1
+        metrics.inc(
+            "cache_requests_total",
+            cache="video_metadata",
+            result="hit" if row else "miss",
+        )
+        if not row:
+            return None
+        return {"id": video_id, **dict(zip(FIELDS, row))}
+
+    def set(self, video_id: str, info: dict) -> None:
+        """Store the used fields of a yt-dlp response."""
+        self.set_many([(video_id, info)])
+
+    def set_many(self, infos: list[tuple[str, dict]]) -> None:
+        """Store the used fields of several yt-dlp responses in one transaction."""
+        now = time.time()
+        rows = [
+            (video_id, *(info.get(field) for field in FIELDS), now)
+            for video_id, info in infos
+        ]
+        with self._lock:
+            self.connection.execute("BEGIN")
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO videos VALUES (?, ?, ?, ?, ?, ?, ?)", rows
+            )
+            self.connection.execute("COMMIT")
+
+    def import_info_files(self, directory: str, batch_size: int = 1000) -> int:
+        """Load the ``.info.json`` files written by earlier versions.
+
+        The files are left in place; they can be deleted once imported.
+
+        Args:
+            directory (str): Directory searched recursively for info files.
+            batch_size (int, optional): Videos stored per transaction.
+
+        Returns:
+            int: Number of videos imported.
+        """
+        imported = 0
+        batch = []
+        for path in _info_files(os.path.expanduser(directory)):
+            try:
+                with open(path, encoding="utf-8") as file:
+                    info = json.load(file)
+            except (OSError, ValueError) as error:
+                self.logger.warning(f"Skipping unreadable {path}: {error}")
+                continue
+            # Playlist info files have no single video to describe.
+            if info.get("_type", "video") != "video" or not info.get("id"):
+                continue
+            batch.append((info["id"], info))
+            if len(batch) >= batch_size:
+                self.set_many(batch)
+                imported += len(batch)
+                batch = []
+        if batch:
+            self.set_many(batch)
+            imported += len(batch)
+        self.logger.info(f"Imported metadata of {imported} videos from {directory}")
+        return imported
+
+    def __len__(self) -> int:
+        with self._lock:
+            (count,) = self.connection.execute("SELECT COUNT(*) FROM videos").fetchone()
+        return count
+
+    def close(self) -> None:
+        self.connection.close()
+
+
+def _info_files(directory: str) -> Iterator[str]:
+    for root, _, names in os.walk(directory):
+        for name in names:
+            if name.endswith(INFO_JSON_SUFFIX):
+                yield os.path.join(root, name)
@@ -0,0 +1,248 @@
+from bisect import bisect_left
+from contextlib import contextmanager
+import json
+import os
+import threading
+import time
+from tools.app_logger import setup_logger
+
+
+# Upper bounds in seconds of the latency histogram buckets.
+DEFAULT_BUCKETS = (
+    0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0,
+)
+DEFAULT_INTERVAL = 60.0
+PREFIX = "archiver_"
+JSON_REPORT = "archiver_metrics.json"
+PROMETHEUS_TEXTFILE = "archiver.prom"
+
+
+class Histogram:
+    """Counts observations in fixed buckets, like a Prometheus histogram."""
+
+    def __init__(self, buckets: tuple = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # The last bucket is +Inf.
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> float | None:
+        """Estimate a quantile by interpolating inside its bucket."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                lower = self.buckets[index - 1] if index else 0.0
+                if index == len(self.buckets):
+                    return lower
+                return lower + (self.buckets[index] - lower) * (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+
+
+def _key(name: str, labels: dict) -> tuple:
+    return name, tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: tuple, extra: tuple = ()) -> str:
+    pairs = [f'{key}="{_escape(value)}"' for key, value in labels + extra]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class MetricsRegistry:
+    """Thread-safe store of the counters, gauges and histograms of a run.
+
+    Metrics are identified by a name and optional labels, e.g.
+    ``inc("api_requests_total", api="spotify", endpoint="GET")``.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.started_at = time.time()
+            self._counters = {}
+            self._gauges = {}
+            self._histograms = {}
+
+    def inc(self, name: str, amount: float = 1, **labels) -> None:
+        key = _key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def set(self, name: str, value: float, **labels) -> None:
+        with self._lock:
+            self._gauges[_key(name, labels)] = value
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        key = _key(name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(value)
+
+    @contextmanager
+    def time(self, name: str, **labels):
+        """Observe the duration of the ``with`` block in seconds."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def counter(self, name: str, **labels) -> float:
+        with self._lock:
+            return self._counters.get(_key(name, labels), 0)
+
+    def total(self, name: str, **labels) -> float:
+        """Sum a counter over every label set that includes ``labels``."""
+        wanted = set(_key(name, labels)[1])
+        with self._lock:
+            return sum(
+                value
+                for (metric, metric_labels), value in self._counters.items()
+                if metric == name and wanted <= set(metric_labels)
+            )
+
+    def histogram(self, name: str, **labels) -> Histogram | None:
+        with self._lock:
+            return self._histograms.get(_key(name, labels))
+
+    def snapshot(self) -> dict:
+        """Return every metric as JSON-serializable data."""
+        with self._lock:
+            return {
+                "started_at": self.started_at,
+                "generated_at": time.time(),
+                "counters": [
+                    {"name": name, "labels": dict(labels), "value": value}
+                    for (name, labels), value in sorted(self._counters.items())
+                ],
+                "gauges": [
+                    {"name": name, "labels": dict(labels), "value": value}
+                    for (name, labels), value in sorted(self._gauges.items())
+                ],
+                "histograms": [
+                    {
+                        "name": name,
+                        "labels": dict(labels),
+                        "count": histogram.count,
+                        "sum": histogram.sum,
+                        "p50": histogram.quantile(0.5),
+                        "p90": histogram.quantile(0.9),
+                        "p99": histogram.quantile(0.99),
+                    }
+                    for (name, labels), histogram in sorted(self._histograms.items())
+                ],
+            }
+
+    def to_prometheus(self) -> str:
+        """Render every metric in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            for kind, values in (("counter", self._counters), ("gauge", self._gauges)):
+                for name in sorted({name for name, _ in values}):
+                    lines.append(f"# TYPE {PREFIX}{name} {kind}")
+                    for (metric, labels), value in sorted(values.items()):
+                        if metric == name:
+                            lines.append(f"{PREFIX}{name}{_format_labels(labels)} {value}")
+            for name in sorted({name for name, _ in self._histograms}):
+                lines.append(f"# TYPE {PREFIX}{name} histogram")
+                for (metric, labels), histogram in sorted(self._histograms.items()):
+                    if metric != name:
+                        continue
+                    cumulative = 0
+                    bounds = [str(bound) for bound in histogram.buckets] + ["+Inf"]
+                    for bound, count in zip(bounds, histogram.counts):
+                        cumulative += count
+                        lines.append(
+                            f"{PREFIX}{name}_bucket"
+                            f"{_format_labels(labels, (('le', bound),))} {cumulative}"
+                        )
+                    lines.append(f"{PREFIX}{name}_sum{_format_labels(labels)} {histogram.sum}")
+                    lines.append(f"{PREFIX}{name}_count{_format_labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, directory: str) -> None:
+        """Write the JSON report and the Prometheus textfile to ``directory``.
+
+        Files are replaced atomically so collectors never read a partial file.
+        """
+        directory = os.path.expanduser(directory)
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        for filename, content in (
+            (JSON_REPORT, json.dumps(self.snapshot(), indent=2)),
+            (PROMETHEUS_TEXTFILE, self.to_prometheus()),
+        ):
+            path = os.path.join(directory, filename)
+            with open(f"{path}.tmp", "w") as file:
+                file.write(content)
+            os.replace(f"{path}.tmp", path)
+
+
+# Registry shared by every module of a run.
+metrics = MetricsRegistry()
+
+
+class MetricsWriter:
+    """Writes a registry to disk every ``interval`` seconds and once at the end.
+
+    Args:
+        registry (MetricsRegistry): Metrics to export.
+        directory (str): Destination of the report files.
+        interval (float, optional): Seconds between two periodic writes;
+            0 only writes when stopped.
+    """
+
+    def __init__(
+        self,
+        registry: MetricsRegistry,
+        directory: str,
+        interval: float = DEFAULT_INTERVAL,
+    ):
+        self.registry = registry
+        self.directory = directory
+        self.interval = interval
+        self.logger = setup_logger(__name__)
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self) -> "MetricsWriter":
+        if self.interval > 0:
+            self._thread = threading.Thread(
+                target=self._run, name="metrics-writer", daemon=True
+            )
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        """Stop the periodic writes and write the final report."""
+        self._stopped.set()
+        if self._thread:
+            self._thread.join()
+        self._write()
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            self._write()
+
+    def _write(self) -> None:
+        try:
+            self.registry.write(self.directory)
+        except OSError as error:
+            self.logger.error(f"Could not write metrics to {self.directory}: {error}")
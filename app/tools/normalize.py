@@ -0,0 +1,66 @@
+from functools import lru_cache
+import re
+from youtube_title_parse import get_artist_title
+
+
+# Entries kept by each memoized function; titles repeat heavily across playlists.
+CACHE_SIZE = 65536
+
+# Noise removal rules as (field, pattern, description). Everything from the
+# first match of any rule of a field to the end of the line is removed, so all
+# rules of a field are applied together with a single compiled expression.
+TRUNCATION_RULES = (
+    ("artist", r"\sx\s", "collaborations written as 'A x B'"),
+    ("title", r"\(", "parenthesized notes, e.g. '(Official Video)'"),
+    ("artist", r"\(", "parenthesized notes"),
+    ("title", r"ft", "featured artists, 'ft' and 'ft.'"),
+    ("artist", r"ft", "featured artists, 'ft' and 'ft.'"),
+    ("title", r",", "comma separated extras"),
+    ("artist", r",", "additional artists"),
+)
+
+
+def compile_rules(field: str) -> re.Pattern:
+    """Combine every truncation rule of a field into one expression."""
+    patterns = [
+        pattern for rule_field, pattern, _ in TRUNCATION_RULES if rule_field == field
+    ]
+    return re.compile(f"(?:{'|'.join(patterns)}).*")
+
+
+ARTIST_NOISE = compile_rules("artist")
+TITLE_NOISE = compile_rules("title")
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def normalize_artist_title(artist: str, title: str) -> tuple[str, str]:
+    """Remove common noise from an artist and a track title.
+
+    Args:
+        artist (str): Raw artist name.
+        title (str): Raw track title.
+
+    Returns:
+        tuple[str, str]: Cleaned ``(artist, title)``.
+    """
+    return ARTIST_NOISE.sub("", artist).strip(), TITLE_NOISE.sub("", title).strip()
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def parse_title(video_title: str) -> tuple[str, str] | None:
+    """Split a video title into artist and track with youtube_title_parse.
+
+    Args:
+        video_title (str): Title of the YouTube video.
+
+    Returns:
+        tuple[str, str] | None: ``(artist, title)``, or None if either part
+            could not be found.
+    """
+    try:
+        artist, title = get_artist_title(video_title)
+    except TypeError:
+        return None
+    if not artist or not title:
+        return None
+    return str(artist), str(title)
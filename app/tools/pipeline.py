@@ -0,0 +1,520 @@
+from contextlib import nullcontext
+from dataclasses import dataclass
+import queue
+import threading
+from typing import Callable, Iterable
+from tools.app_logger import setup_logger
+from tools.cache import normalize_query
+from tools.journal import Journal, ResumePoint
+from tools.metrics import metrics
+from tools.profiling import StageProfiler
+from tools.ratelimit import RateLimitedError
+from tools.spotify import SEARCH_ERRORS, PlaylistWriter, SearchFailedError, Spotify
+from tools.utils import Match
+from tools.youtube import (
+    PARSE_FIRST,
+    YTDLP_FIRST,
+    PlaylistItem,
+    Song,
+    Youtube,
+    clean_song_info,
+)
+from tools.ytdlp import VideoTitleExtractor
+
+
+# Pages buffered between two stages; bounds memory whatever the playlist size.
+DEFAULT_QUEUE_SIZE = 4
+# With the parse-first strategy, songs parsed from the video title whose match
+# is less confident than this are extracted again with yt-dlp.
+DEFAULT_ESCALATE_CONFIDENCE = 80
+# How often blocked stages check whether another stage failed.
+POLL_INTERVAL = 0.1
+
+_DONE = object()
+
+
+class PipelineCancelled(Exception):
+    """Raised inside a stage when another stage has failed"""
+
+    pass
+
+
+@dataclass(slots=True)
+class Resolution:
+    """What happened to one playlist item.
+
+    ``song`` is None when the title could not be parsed, ``uri`` is None when
+    no track was found (or a RateLimitedError when the search was throttled,
+    a SearchFailedError when it failed), and ``added`` is None when the track was not written to a playlist.
+    ``duplicate`` is set when the track was skipped because the playlist
+    already holds it, and ``resumed`` when the match was read from the
+    journal of an interrupted run instead of being searched again.
+    """
+
+    item: PlaylistItem
+    song: Song | None = None
+    uri: str | RateLimitedError | SearchFailedError | None = None
+    confidence: float = 0.0
+    added: bool | None = None
+    duplicate: bool = False
+    resumed: bool = False
+
+
+@dataclass
+class PipelineStats:
+    items: int = 0
+    unparsed: int = 0
+    not_found: int = 0
+    rate_limited: int = 0
+    search_failed: int = 0
+    resolved: int = 0
+    added: int = 0
+    failed: int = 0
+    duplicates: int = 0
+    searches_saved: int = 0
+    escalated: int = 0
+
+
+class ArchivePipeline:
+    """Streams a YouTube playlist into a Spotify playlist.
+
+    Each stage runs in its own thread and hands whole pages to the next one
+    through a bounded queue::
+
+        page fetch -> metadata extraction -> normalization -> Spotify search -> batched add
+
+    so Spotify searches and writes start while later pages are still being
+    fetched, and only a few pages are held in memory at any time. Items keep
+    their playlist order through every stage.
+
+    Songs with the same normalized artist and title are searched only once
+    per run, and tracks the writer's playlist already holds (or that an
+    earlier item resolved to) are skipped without a write.
+
+    With a ``journal``, every consumed page, extracted song, search outcome
+    and committed add batch is recorded, and ``run`` can pick up an
+    interrupted run from the ``ResumePoint`` loaded from it.
+
+    With the ``PARSE_FIRST`` strategy, songs are parsed from the video title
+    before yt-dlp is tried. An escalation stage after the search extracts the
+    songs whose parsed title matched less confidently than
+    ``escalate_confidence`` with yt-dlp, and searches them again::
+
+        ... -> Spotify search -> yt-dlp escalation -> batched add
+
+    With a ``profiler``, every stage thread is profiled while it works on a
+    page and allocations are snapshotted as each stage finishes.
+
+    Args:
+        youtube (Youtube): Source of playlist pages and song metadata.
+        spotify (Spotify): Client used for searches.
+        writer (PlaylistWriter, optional): Destination of resolved tracks.
+            Without one (dry run) tracks are only resolved.
+        concurrency (int, optional): Spotify searches in flight per page.
+        queue_size (int, optional): Pages buffered between two stages.
+        on_result (Callable[[Resolution], None], optional): Called, in
+            playlist order, once the outcome of an item is final.
+        journal (Journal, optional): Progress journal of the run.
+        profiler (StageProfiler, optional): Profiler of the stages.
+        strategy (str, optional): ``YTDLP_FIRST`` or ``PARSE_FIRST``.
+        escalate_confidence (float, optional): With ``PARSE_FIRST``, match
+            confidence below which a song is extracted again with yt-dlp.
+    """
+
+    def __init__(
+        self,
+        youtube: Youtube,
+        spotify: Spotify,
+        writer: PlaylistWriter | None = None,
+        concurrency: int = 1,
+        queue_size: int = DEFAULT_QUEUE_SIZE,
+        on_result: Callable[[Resolution], None] | None = None,
+        journal: Journal | None = None,
+        profiler: StageProfiler | None = None,
+        strategy: str = YTDLP_FIRST,
+        escalate_confidence: float = DEFAULT_ESCALATE_CONFIDENCE,
+    ):
+        self.youtube = youtube
+        self.spotify = spotify
+        self.writer = writer
+        self.concurrency = concurrency
+        self.queue_size = queue_size
+        self.on_result = on_result
+        self.journal = journal
+        self.profiler = profiler
+        self.strategy = strategy
+        self.escalate_confidence = escalate_confidence
+        self.stats = PipelineStats()
+        self.logger = setup_logger(__name__)
+        self._failed = threading.Event()
+        self._errors = []
+        self._matches: dict[str, Match] = {}
+        self._resumed: dict[str, dict] = {}
+
+    def run(
+        self, playlist_id: str, skip_video_ids=(), resume: ResumePoint | None = None
+    ) -> PipelineStats:
+        """Archive a playlist and return counts of every outcome.
+
+        Args:
+            playlist_id (str): Youtube Playlist ID
+            skip_video_ids (Collection, optional): Video IDs to leave out.
+            resume (ResumePoint, optional): Progress of an interrupted run.
+                Fetching starts at its page, its final items are left out,
+                its extracted songs are not extracted again and its matched
+                songs are only added.
+
+        Raises:
+            Exception: The first error raised by any stage.
+        """
+        self.stats = PipelineStats()
+        self._failed.clear()
+        self._errors = []
+        self._matches = {}
+        self._resumed = {}
+
+        page_token = None
+        if resume:
+            skip_video_ids = set(skip_video_ids) | resume.final_video_ids
+            page_token = resume.page_token
+            self._resumed = resume.songs
+            self._matches.update(
+                (
+                    normalize_query(song["artist"], song["title"]),
+                    Match(song["uri"], song["confidence"]),
+                )
+                for song in resume.songs.values()
+                if "uri" in song
+            )
+        if resume and resume.finished:
+            pages = (page for page in ())
+        else:
+            pages = self.youtube.iter_playlist_pages(
+                playlist_id,
+                skip_video_ids,
+                page_token=page_token,
+                on_page=self.journal.page if self.journal else None,
+            )
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in range(4)]
+        resolved = queue.Queue(maxsize=self.queue_size)
+        stages = [
+            ("fetch", self._produce, (pages, queues[0])),
+            ("extract", self._stage, (self._extract, queues[0], queues[1])),
+            ("normalize", self._stage, (self._normalize, queues[1], queues[2])),
+        ]
+        if self.strategy == PARSE_FIRST:
+            stages += [
+                ("search", self._stage, (self._search, queues[2], queues[3])),
+                ("escalate", self._stage, (self._escalate, queues[3], resolved)),
+            ]
+        else:
+            stages.append(("search", self._stage, (self._search, queues[2], resolved)))
+        threads = [
+            threading.Thread(target=target, args=(name, *args), name=f"pipeline-{name}")
+            for name, target, args in stages
+        ]
+        for thread in threads:
+            thread.start()
+        try:
+            self._write(resolved)
+        except PipelineCancelled:
+            pass
+        except BaseException as error:
+            self._fail(error)
+        finally:
+            for thread in threads:
+                thread.join()
+            pages.close()
+
+        if self._errors:
+            raise self._errors[0]
+        return self.stats
+
+    def _extract(self, items: list[PlaylistItem]) -> list[Resolution]:
+        fresh = [item for item in items if item.video_id not in self._resumed]
+        songs = self.youtube.extract_songs(fresh, strategy=self.strategy) if fresh else []
+        if self.journal:
+            for item, song in zip(fresh, songs):
+                if song:
+                    self.journal.song(
+                        item.video_id,
+                        song.artist,
+                        song.title,
+                        song.duration,
+                        song.source,
+                    )
+                else:
+                    self.journal.done(item.video_id, "unparsed")
+
+        songs = iter(songs)
+        page = []
+        for item in items:
+            stored = self._resumed.get(item.video_id)
+            if not stored:
+                page.append(Resolution(item, next(songs)))
+                continue
+            song = Song(
+                stored["artist"],
+                stored["title"],
+                item.video_id,
+                stored["duration"],
+                stored.get("source"),
+            )
+            if "uri" in stored:
+                page.append(
+                    Resolution(
+                        item, song, stored["uri"], stored["confidence"], resumed=True
+                    )
+                )
+            else:
+                page.append(Resolution(item, song))
+        return page
+
+    def _normalize(self, page: list[Resolution]) -> list[Resolution]:
+        for resolution in page:
+            if resolution.song and not resolution.resumed:
+                resolution.song = clean_song_info(resolution.song)
+        return page
+
+    def _search(self, page: list[Resolution]) -> list[Resolution]:
+        queries = {
+            id(resolution): normalize_query(resolution.song.artist, resolution.song.title)
+            for resolution in page
+            if resolution.song and not resolution.resumed
+        }
+        # One search per normalized query not seen earlier in the run.
+        pending = {}
+        for resolution in page:
+            query = queries.get(id(resolution))
+            if query and query not in self._matches and query not in pending:
+                pending[query] = resolution.song
+        matches = self.spotify.match_songs(
+            list(pending.values()), concurrency=self.concurrency
+        )
+        fresh = dict(zip(pending, matches))
+        self._matches.update(
+            (query, match)
+            for query, match in fresh.items()
+            if not isinstance(match, SEARCH_ERRORS)
+        )
+
+        for resolution in page:
+            query = queries.get(id(resolution))
+            if not query:
+                continue
+            match = fresh.get(query) or self._matches.get(query)
+            if isinstance(match, SEARCH_ERRORS):
+                resolution.uri = match
+            else:
+                resolution.uri, resolution.confidence = match.uri, match.confidence
+            # The escalation stage journals the final outcome.
+            if not self._escalates(resolution):
+                self._journal(resolution)
+        saved = len(queries) - len(pending)
+        if saved:
+            self.stats.searches_saved += saved
+            metrics.inc("duplicates_total", saved, kind="query")
+        return page
+
+    def _escalate(self, page: list[Resolution]) -> list[Resolution]:
+        escalated = [resolution for resolution in page if self._escalates(resolution)]
+        if not escalated:
+            return page
+        songs = self.youtube.extract_songs_ytdlp(
+            [resolution.item for resolution in escalated]
+        )
+        retried = [
+            (resolution, clean_song_info(song))
+            for resolution, song in zip(escalated, songs)
+            if song
+        ]
+        matches = self.spotify.match_songs(
+            [song for _, song in retried], concurrency=self.concurrency
+        )
+        for (resolution, song), match in zip(retried, matches):
+            if isinstance(match, SEARCH_ERRORS):
+                # The match of the parsed title is better than none.
+                outcome = "search_failed"
+            elif match.uri and match.confidence > resolution.confidence:
+                resolution.song = song
+                resolution.uri, resolution.confidence = match.uri, match.confidence
+                outcome = "improved"
+            else:
+                outcome = "kept"
+            metrics.inc("escalations_total", outcome=outcome)
+        if len(retried) < len(escalated):
+            metrics.inc(
+                "escalations_total", len(escalated) - len(retried), outcome="no_track"
+            )
+        self.stats.escalated += len(escalated)
+        for resolution in escalated:
+            self._journal(resolution)
+        return page
+
+    def _escalates(self, resolution: Resolution) -> bool:
+        """Whether a song parsed from its title needs a yt-dlp extraction"""
+        return (
+            self.strategy == PARSE_FIRST
+            and resolution.song is not None
+            and resolution.song.source == "title"
+            and not resolution.resumed
+            and not isinstance(resolution.uri, SEARCH_ERRORS)
+            and (not resolution.uri or resolution.confidence < self.escalate_confidence)
+        )
+
+    def _write(self, inbox: queue.Queue) -> None:
+        while (page := self._get(inbox)) is not _DONE:
+            with metrics.time("stage_seconds", stage="write"), self._profiled("write"):
+                for resolution in page:
+                    self._count(resolution)
+                    found = resolution.uri and not isinstance(
+                        resolution.uri, SEARCH_ERRORS
+                    )
+                    if found and self.writer and resolution.uri in self.writer:
+                        resolution.duplicate = True
+                        self.stats.duplicates += 1
+                        metrics.inc("duplicates_total", kind="track")
+                        if self.journal:
+                            self.journal.done(resolution.item.video_id, "duplicate")
+                        self._report([(resolution, resolution.uri, None)])
+                    elif found and self.writer:
+                        self._report(self.writer.add(resolution.uri, resolution))
+                    else:
+                        self._report([(resolution, resolution.uri, None)])
+        if self.writer:
+            with metrics.time("stage_seconds", stage="write"), self._profiled("write"):
+                self._report(self.writer.flush())
+        self._finished("write")
+
+    def _count(self, resolution: Resolution) -> None:
+        self.stats.items += 1
+        if not resolution.song:
+            self.stats.unparsed += 1
+            outcome = "unparsed"
+        elif isinstance(resolution.uri, RateLimitedError):
+            self.stats.rate_limited += 1
+            outcome = "rate_limited"
+        elif isinstance(resolution.uri, SearchFailedError):
+            self.stats.search_failed += 1
+            outcome = "search_failed"
+        elif not resolution.uri:
+            self.stats.not_found += 1
+            outcome = "not_found"
+        else:
+            self.stats.resolved += 1
+            outcome = "resolved"
+        metrics.inc("items_total", outcome=outcome)
+        searched = (
+            self.stats.items
+            - self.stats.unparsed
+            - self.stats.rate_limited
+            - self.stats.search_failed
+        )
+        if searched:
+            metrics.set("match_rate", self.stats.resolved / searched)
+
+    def _journal(self, resolution: Resolution) -> None:
+        """Record the search outcome of an item"""
+        if not self.journal:
+            return
+        video_id = resolution.item.video_id
+        # Rate limited and failed searches are not final; a resumed run
+        # repeats them.
+        if isinstance(resolution.uri, SEARCH_ERRORS):
+            return
+        if not resolution.uri:
+            self.journal.done(video_id, "not_found")
+            return
+        song = resolution.song
+        self.journal.resolved(
+            video_id,
+            song.artist,
+            song.title,
+            song.duration,
+            resolution.uri,
+            resolution.confidence,
+        )
+
+    def _report(self, outcomes: Iterable[tuple[Resolution, str, bool | None]]) -> None:
+        outcomes = list(outcomes)
+        if self.journal:
+            added = [resolution.item.video_id for resolution, _, ok in outcomes if ok]
+            if added:
+                self.journal.added(added)
+        for resolution, _, added in outcomes:
+            resolution.added = added
+            if added:
+                self.stats.added += 1
+                metrics.inc("items_total", outcome="added")
+            elif added is False:
+                self.stats.failed += 1
+                metrics.inc("items_total", outcome="add_failed")
+            if self.on_result:
+                self.on_result(resolution)
+
+    def _produce(self, name: str, pages, outbox: queue.Queue) -> None:
+        try:
+            while True:
+                with metrics.time("stage_seconds", stage=name), self._profiled(name):
+                    page = next(pages, _DONE)
+                if page is _DONE:
+                    break
+                self._put(outbox, page)
+            self._finished(name)
+            self._put(outbox, _DONE)
+        except PipelineCancelled:
+            pass
+        except BaseException as error:
+            self._fail(error)
+
+    def _stage(self, name: str, work, inbox: queue.Queue, outbox: queue.Queue) -> None:
+        try:
+            while (page := self._get(inbox)) is not _DONE:
+                with metrics.time("stage_seconds", stage=name), self._profiled(name):
+                    page = work(page)
+                self._put(outbox, page)
+            self._finished(name)
+            self._put(outbox, _DONE)
+        except PipelineCancelled:
+            pass
+        except BaseException as error:
+            self._fail(error)
+
+    def _profiled(self, name: str):
+        return self.profiler.stage(name) if self.profiler else nullcontext()
+
+    def _finished(self, name: str) -> None:
+        if self.profiler:
+            self.profiler.stage_finished(name)
+
+    def _fail(self, error: BaseException) -> None:
+        self.logger.error(f"Pipeline stage failed: {error!r}")
+        self._errors.append(error)
+        self._failed.set()
+
+    def _get(self, inbox: queue.Queue):
+        while not self._failed.is_set():
+            try:
+                return inbox.get(timeout=POLL_INTERVAL)
+            except queue.Empty:
+                continue
+        raise PipelineCancelled
+
+    def _put(self, outbox: queue.Queue, page) -> None:
+        while not self._failed.is_set():
+            try:
+                return outbox.put(page, timeout=POLL_INTERVAL)
+            except queue.Full:
+                continue
+        raise PipelineCancelled
+
+
+# Functions whose frames tell which stage a thread works for, for profiling.
+STAGE_FUNCTIONS = {
+    "fetch": [ArchivePipeline._produce],
+    "extract": [ArchivePipeline._extract, VideoTitleExtractor.get_yt_metadata],
+    "normalize": [ArchivePipeline._normalize],
+    "search": [ArchivePipeline._search, Spotify._search],
+    "escalate": [ArchivePipeline._escalate],
+    "write": [ArchivePipeline._write],
+}
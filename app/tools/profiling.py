@@ -0,0 +1,249 @@
+from collections import Counter, defaultdict
+import cProfile
+from contextlib import contextmanager
+import os
+import pstats
+import sys
+import threading
+import tracemalloc
+from typing import Callable, Iterable, Iterator
+from tools.app_logger import setup_logger
+
+
+# Seconds between two stack samples of every thread.
+DEFAULT_SAMPLE_INTERVAL = 0.005
+# Frames kept per allocation; deep enough to reach the stage that made it.
+TRACEMALLOC_FRAMES = 64
+DEFAULT_TOP = 25
+OTHER = "other"
+
+
+class StageProfiler:
+    """Profiles the stages of the archive pipeline while it runs.
+
+    Three views are recorded, one file per stage each:
+
+    * ``<stage>.pstats``: cProfile of the stage threads, for ``pstats``,
+      snakeviz or gprof2dot.
+    * ``<stage>.folded``: wall-clock stacks of every thread, sampled every
+      ``sample_interval`` seconds, in the folded format of flamegraph.pl,
+      inferno and speedscope. Worker threads (yt-dlp, Spotify searches) are
+      included; ``all.folded`` has every sample with its stage as root.
+    * ``<stage>.tracemalloc``: allocations alive when the stage finished, for
+      ``tracemalloc.Snapshot.load``.
+
+    ``summary.txt`` lists the hottest functions and allocation sites of each
+    stage. Samples and allocations are attributed to the innermost stage
+    function on their stack, so a stage is known even in worker threads.
+
+    Args:
+        directory (str): Where to write the profiles.
+        stage_functions (dict[str, Iterable[Callable]]): Functions whose
+            frames mark each stage.
+        sample_interval (float, optional): Seconds between stack samples.
+        top (int, optional): Entries per stage in the summary.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        stage_functions: dict[str, Iterable[Callable]],
+        sample_interval: float = DEFAULT_SAMPLE_INTERVAL,
+        top: int = DEFAULT_TOP,
+    ):
+        self.directory = os.path.expanduser(directory)
+        self.sample_interval = sample_interval
+        self.top = top
+        self.logger = setup_logger(__name__)
+        self.stages = list(stage_functions)
+        self._stage_of = {
+            function.__code__: stage
+            for stage, functions in stage_functions.items()
+            for function in functions
+        }
+        # Line ranges of the stage functions, to read stages off tracebacks.
+        self._stage_lines = defaultdict(list)
+        for code, stage in self._stage_of.items():
+            lines = [line for *_, line in code.co_lines() if line]
+            self._stage_lines[code.co_filename].append(
+                (code.co_firstlineno, max(lines, default=code.co_firstlineno), stage)
+            )
+        self._profiles: dict[tuple[str, int], cProfile.Profile] = {}
+        self._cprofile = True
+        self._samples = defaultdict(Counter)
+        self._snapshots: dict[str, tracemalloc.Snapshot] = {}
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._sampler = None
+
+    def start(self) -> "StageProfiler":
+        os.makedirs(self.directory, exist_ok=True)
+        tracemalloc.start(TRACEMALLOC_FRAMES)
+        self._sampler = threading.Thread(
+            target=self._sample, name="profiler", daemon=True
+        )
+        self._sampler.start()
+        return self
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """cProfile the calling thread while it works on a stage."""
+        profile = self._profile(name) if self._cprofile else None
+        if profile is None:
+            yield
+            return
+        try:
+            profile.enable()
+        except ValueError as error:
+            # Python 3.12+ allows a single active profiler per process.
+            self._cprofile = False
+            self.logger.warning(f"cProfile unavailable, only sampling: {error}")
+            yield
+            return
+        try:
+            yield
+        finally:
+            profile.disable()
+
+    def stage_finished(self, name: str) -> None:
+        """Snapshot the allocations alive at the end of a stage."""
+        if tracemalloc.is_tracing():
+            snapshot = self._take_snapshot()
+            with self._lock:
+                self._snapshots[name] = snapshot
+
+    def stop(self) -> None:
+        """Stop profiling and write every profile and the summary."""
+        self._stopped.set()
+        if self._sampler:
+            self._sampler.join()
+        if tracemalloc.is_tracing():
+            snapshot = self._take_snapshot()
+            tracemalloc.stop()
+            with self._lock:
+                self._snapshots.setdefault(OTHER, snapshot)
+
+        stats = self._write_pstats()
+        self._write_folded()
+        allocations = self._write_snapshots()
+        summary = os.path.join(self.directory, "summary.txt")
+        with open(summary, "w") as file:
+            file.write(self._summary(stats, allocations))
+        self.logger.info(f"Profiles written to {self.directory}")
+
+    def _profile(self, name: str) -> cProfile.Profile:
+        # One profile per thread and stage; threads never share one.
+        key = (name, threading.get_ident())
+        with self._lock:
+            if key not in self._profiles:
+                self._profiles[key] = cProfile.Profile()
+            return self._profiles[key]
+
+    def _take_snapshot(self) -> tracemalloc.Snapshot:
+        # Leave out what profiling itself allocates.
+        return tracemalloc.take_snapshot().filter_traces(
+            [
+                tracemalloc.Filter(False, __file__),
+                tracemalloc.Filter(False, tracemalloc.__file__),
+            ]
+        )
+
+    def _sample(self) -> None:
+        me = threading.get_ident()
+        while not self._stopped.wait(self.sample_interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = []
+                stage = None
+                while frame is not None:
+                    code = frame.f_code
+                    stage = stage or self._stage_of.get(code)
+                    stack.append(
+                        f"{code.co_name} "
+                        f"({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+                    )
+                    frame = frame.f_back
+                stack.append(names.get(ident, "thread"))
+                self._samples[stage or OTHER][";".join(reversed(stack))] += 1
+
+    def _stage_of_traceback(self, traceback: tracemalloc.Traceback) -> str:
+        # Frames are stored oldest first; the innermost stage wins.
+        for frame in reversed(traceback):
+            for first, last, stage in self._stage_lines.get(frame.filename, ()):
+                if first <= frame.lineno <= last:
+                    return stage
+        return OTHER
+
+    def _write_pstats(self) -> dict[str, pstats.Stats]:
+        merged = {}
+        for (name, _), profile in self._profiles.items():
+            profile.create_stats()
+            if not profile.stats:
+                continue
+            if name in merged:
+                merged[name].add(profile)
+            else:
+                merged[name] = pstats.Stats(profile)
+        for name, stats in merged.items():
+            stats.dump_stats(os.path.join(self.directory, f"{name}.pstats"))
+        return merged
+
+    def _write_folded(self) -> None:
+        with open(os.path.join(self.directory, "all.folded"), "w") as everything:
+            for stage, samples in self._samples.items():
+                with open(os.path.join(self.directory, f"{stage}.folded"), "w") as file:
+                    for stack, count in samples.most_common():
+                        file.write(f"{stack} {count}\n")
+                        everything.write(f"{stage};{stack} {count}\n")
+
+    def _write_snapshots(self) -> dict[str, list[tuple[str, int, int]]]:
+        """Dump the snapshots and return the top allocation sites per stage."""
+        allocations = {}
+        for name, snapshot in self._snapshots.items():
+            snapshot.dump(os.path.join(self.directory, f"{name}.tracemalloc"))
+            sites = defaultdict(lambda: [0, 0])
+            for trace in snapshot.traces:
+                if self._stage_of_traceback(trace.traceback) != name:
+                    continue
+                site = trace.traceback[-1]
+                sites[f"{site.filename}:{site.lineno}"][0] += trace.size
+                sites[f"{site.filename}:{site.lineno}"][1] += 1
+            allocations[name] = sorted(
+                ((site, size, count) for site, (size, count) in sites.items()),
+                key=lambda entry: entry[1],
+                reverse=True,
+            )[: self.top]
+        return allocations
+
+    def _summary(
+        self,
+        stats: dict[str, pstats.Stats],
+        allocations: dict[str, list[tuple[str, int, int]]],
+    ) -> str:
+        lines = []
+        for stage in [*self.stages, OTHER]:
+            samples = sum(self._samples[stage].values())
+            if stage not in stats and stage not in allocations and not samples:
+                continue
+            lines.append(f"== {stage} ==")
+            lines.append(f"Stack samples: {samples}")
+            if stage in stats:
+                lines.append("Hot functions (own time, cumulative time, calls):")
+                functions = sorted(
+                    stats[stage].stats.items(), key=lambda entry: entry[1][2], reverse=True
+                )
+                for (filename, lineno, function), (_, calls, own, total, _) in functions[
+                    : self.top
+                ]:
+                    lines.append(
+                        f"  {own:9.3f}s {total:9.3f}s {calls:>9}  "
+                        f"{function} ({os.path.basename(filename)}:{lineno})"
+                    )
+            if allocations.get(stage):
+                lines.append("Allocation sites alive at the end (size, blocks):")
+                for site, size, count in allocations[stage]:
+                    lines.append(f"  {size / 1024:9.1f} KiB {count:>9}  {site}")
+            lines.append("")
+        return "\n".join(lines)
@@ -0,0 +1,196 @@
+import threading
+import time
+from typing import Callable, TYPE_CHECKING
+from tools.app_logger import setup_logger
+
+if TYPE_CHECKING:
+    import requests
+
+
+DEFAULT_RATE = 20.0
+DEFAULT_MAX_RETRIES = 5
+# Responses slower than this stop the concurrency limit from growing.
+DEFAULT_LATENCY_TARGET = 2.0
+# Wait used when a 429 response carries no usable Retry-After header.
+DEFAULT_RETRY_AFTER = 1.0
+
+
+class RateLimitedError(Exception):
+    """Raised when a request is still rate limited after every retry"""
+
+    pass
+
+
+def retry_after_seconds(response: "requests.Response", attempt: int) -> float:
+    """Return how long to wait before retrying a 429 response.
+
+    Args:
+        response (requests.Response): The rate limited response.
+        attempt (int): Number of the attempt that was throttled, from 0.
+
+    Returns:
+        float: The Retry-After value, or an exponential fallback.
+    """
+    try:
+        return max(float(response.headers["Retry-After"]), 0.0)
+    except (KeyError, TypeError, ValueError):
+        return DEFAULT_RETRY_AFTER * 2**attempt
+
+
+class TokenBucket:
+    """Thread-safe token bucket shared by every request of a client.
+
+    Args:
+        rate (float): Tokens added per second.
+        capacity (float, optional): Maximum burst size. Defaults to ``rate``.
+    """
+
+    def __init__(self, rate: float, capacity: float | None = None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """Block until a token is available, then take it."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.capacity, self.tokens + (now - self.updated_at) * self.rate
+                )
+                self.updated_at = now
+                if now < self.paused_until:
+                    wait = self.paused_until - now
+                elif self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                else:
+                    wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def pause(self, seconds: float) -> None:
+        """Hold back every caller for ``seconds``, e.g. after a Retry-After."""
+        with self._lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            self.tokens = 0
+
+
+class AdaptiveLimiter:
+    """Concurrency limit adjusted with additive increase, multiplicative decrease.
+
+    The limit halves on every throttled response and grows by roughly one per
+    window of successful, fast responses. ``throttled`` counts the throttled
+    responses.
+
+    Args:
+        maximum (int): Upper bound of requests in flight.
+        minimum (int, optional): Lower bound of requests in flight.
+        latency_target (float, optional): Latency in seconds above which the
+            limit stops growing.
+    """
+
+    def __init__(
+        self,
+        maximum: int,
+        minimum: int = 1,
+        latency_target: float = DEFAULT_LATENCY_TARGET,
+    ):
+        self.maximum = max(maximum, minimum)
+        self.minimum = minimum
+        self.latency_target = latency_target
+        self.limit = float(self.maximum)
+        self.in_flight = 0
+        self.throttled = 0
+        self._condition = threading.Condition()
+
+    def acquire(self) -> None:
+        with self._condition:
+            while self.in_flight >= int(self.limit):
+                self._condition.wait()
+            self.in_flight += 1
+
+    def release(self, throttled: bool = False, latency: float = 0.0) -> None:
+        with self._condition:
+            self.in_flight -= 1
+            if throttled:
+                self.throttled += 1
+                self.limit = max(self.minimum, self.limit / 2)
+            elif latency <= self.latency_target:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            self._condition.notify_all()
+
+
+class RequestScheduler:
+    """Paces requests to stay under an API rate limit without losing any.
+
+    Every request takes a token from a shared bucket and a slot from an
+    adaptive concurrency limiter. A 429 response pauses the whole bucket for
+    the server's Retry-After and the request is retried; only when the
+    retries run out is ``RateLimitedError`` raised.
+
+    Args:
+        rate (float, optional): Requests per second allowed across all threads.
+        max_concurrency (int, optional): Upper bound of requests in flight.
+        max_retries (int, optional): Retries for a throttled request.
+        latency_target (float, optional): See ``AdaptiveLimiter``.
+    """
+
+    def __init__(
+        self,
+        rate: float = DEFAULT_RATE,
+        max_concurrency: int = 10,
+        max_retries: int = DEFAULT_MAX_RETRIES,
+        latency_target: float = DEFAULT_LATENCY_TARGET,
+    ):
+        self.bucket = TokenBucket(rate)
+        self.limiter = AdaptiveLimiter(max_concurrency, latency_target=latency_target)
+        self.max_retries = max_retries
+        self.logger = setup_logger(__name__)
+
+    @property
+    def throttled(self) -> int:
+        """Number of 429 responses received so far, retried ones included."""
+        return self.limiter.throttled
+
+    def send(
+        self, send_request: Callable[[], "requests.Response"]
+    ) -> "requests.Response":
+        """Send a request, waiting out rate limits.
+
+        Args:
+            send_request (Callable[[], requests.Response]): Performs the request.
+
+        Raises:
+            RateLimitedError: The request was throttled on every attempt.
+
+        Returns:
+            requests.Response: The first response that was not a 429.
+        """
+        for attempt in range(self.max_retries + 1):
+            self.bucket.acquire()
+            self.limiter.acquire()
+            started = time.monotonic()
+            try:
+                response = send_request()
+            except Exception:
+                self.limiter.release()
+                raise
+
+            if response.status_code != 429:
+                self.limiter.release(latency=time.monotonic() - started)
+                return response
+
+            response.close()
+            # Counted under the limiter's lock; many workers share a scheduler.
+            self.limiter.release(throttled=True)
+            delay = retry_after_seconds(response, attempt)
+            self.logger.warning(
+                f"Rate limited, retrying in {delay:.1f}s "
+                f"(concurrency limit {int(self.limiter.limit)})"
+            )
+            self.bucket.pause(delay)
+
+        raise RateLimitedError(f"Still rate limited after {self.max_retries} retries")
@@ -1,44 +1,170 @@
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from dotenv import load_dotenv
 import os
-import requests
-from spotipy import util
+import threading
+import time
 from tools.app_logger import setup_logger
-from tools.utils import fuzzy_match_artist, artist_names_from_tracks
+from tools.cache import SearchCache
+from tools.catalog import CatalogIndex
+from tools.ratelimit import DEFAULT_RATE, RateLimitedError, RequestScheduler
+from tools.transport import BearerAuth, DEFAULT_POOL_SIZE, HttpTransport
+from tools.utils import DEFAULT_MATCH_THRESHOLD, Match, rank_candidates
 from typing import Literal, Any
-from urllib.parse import quote
 
 
 # Load the environment variables from the .env file (if present)
 load_dotenv()
 
+# Spotify accepts at most 100 URIs per "Add Items to Playlist" request, and
+# returns at most 100 items per page of a playlist.
+MAX_TRACKS_PER_REQUEST = 100
+PLAYLIST_TRACK_FIELDS = "items(track(uri)),next"
+SPOTIFY_API_URL = "https://api.spotify.com/v1"
+# Access tokens are refreshed this many seconds before they expire.
+TOKEN_REFRESH_MARGIN = 120
+# Lifetime assumed for tokens whose expiry is unknown (Spotify issues 1h tokens).
+DEFAULT_TOKEN_LIFETIME = 3600
+
+
+class SearchFailedError(Exception):
+    """Raised when a search request failed, e.g. a 401 or a 5xx after every retry"""
+
+    def __init__(self, status_code: int):
+        super().__init__(f"Spotify search failed with status {status_code}")
+        self.status_code = status_code
+
+
+# Search outcomes that say nothing about the song; later runs search it again.
+SEARCH_ERRORS = (RateLimitedError, SearchFailedError)
+
+
+@dataclass
+class AddResult:
+    """Outcome of a single playlist insert request."""
+
+    uris: list[str]
+    added: bool
+    status_code: int
+
+
+def compact_track(track: dict) -> dict:
+    """Reduce a Spotify track object to the fields used for matching.
+
+    The result keeps the shape of the full track object, so it can be used
+    wherever search results are expected.
+    """
+    return {
+        "uri": track["uri"],
+        "name": track.get("name"),
+        "artists": [{"name": artist["name"]} for artist in track.get("artists", [])],
+        "duration_ms": track.get("duration_ms"),
+    }
+
 
 class SpotifyClientManager:
-    def __init__(self):
-        self.scope = "playlist-modify-private"
+    """Holds Spotify credentials and an in-memory access token.
+
+    The token is fetched on first use and refreshed shortly before it expires.
+    Access is serialized, so one manager can be shared by concurrent workers.
+
+    Args:
+        auth_mode (str, optional): "user" for the authorization code flow
+            (required to modify playlists) or "client" for the client
+            credentials flow, which only allows catalog calls such as search.
+    """
+
+    def __init__(self, auth_mode: Literal["user", "client"] = "user"):
+        # Reading private playlists lets find_playlist see the ones this tool creates.
+        self.scope = "playlist-modify-private playlist-read-private"
+        self.auth_mode = auth_mode
         self.user_id = os.getenv("SPOTIFY_USER_ID")
         self.client_id = os.getenv("SPOTIFY_CLIENT_ID")
         self.client_secret = os.getenv("SPOTIFY_CLIENT_SECRET")
         self.redirect_uri = os.getenv("SPOTIFY_REDIRECT_URI")
+        self._token_info = None
+        self._token_lock = threading.Lock()
 
     @property
     def token(self):
         """
-        Return the access token
+        Return the access token, refreshing it if it is about to expire
         """
-        return util.prompt_for_user_token(
+        with self._token_lock:
+            if self._token_info is None or self._expires_soon():
+                self._token_info = self._request_token_info()
+            return self._token_info["access_token"]
+
+    def _expires_soon(self) -> bool:
+        return self._token_info["expires_at"] - time.time() < TOKEN_REFRESH_MARGIN
+
+    def _request_token_info(self) -> dict:
+        # spotipy is only needed to log in, which most runs do once.
+        from spotipy import util
+        from spotipy.cache_handler import CacheFileHandler, MemoryCacheHandler
+        from spotipy.oauth2 import SpotifyClientCredentials, SpotifyOAuth
+
+        if self.auth_mode == "client":
+            credentials = SpotifyClientCredentials(
+                client_id=self.client_id,
+                client_secret=self.client_secret,
+                cache_handler=MemoryCacheHandler(),
+            )
+            credentials.get_access_token(as_dict=False, check_cache=False)
+            return credentials.cache_handler.get_cached_token()
+
+        if self._token_info and self._token_info.get("refresh_token"):
+            oauth = SpotifyOAuth(
+                client_id=self.client_id,
+                client_secret=self.client_secret,
+                redirect_uri=self.redirect_uri,
+                scope=self.scope,
+                username=self.user_id,
+            )
+            return oauth.refresh_access_token(self._token_info["refresh_token"])
+
+        access_token = util.prompt_for_user_token(
             self.user_id,
             scope=self.scope,
             client_id=self.client_id,
             client_secret=self.client_secret,
             redirect_uri=self.redirect_uri,
         )
+        # prompt_for_user_token only returns the token; its expiry and refresh
+        # token live in spotipy's cache file.
+        token_info = CacheFileHandler(username=self.user_id).get_cached_token()
+        if not token_info or token_info.get("access_token") != access_token:
+            token_info = {
+                "access_token": access_token,
+                "expires_at": int(time.time()) + DEFAULT_TOKEN_LIFETIME,
+            }
+        return token_info
 
 
 class Spotify:
-    def __init__(self):
-        self.spotify = SpotifyClientManager()
+    def __init__(
+        self,
+        cache: SearchCache | None = None,
+        auth_mode: Literal["user", "client"] = "user",
+        pool_size: int = DEFAULT_POOL_SIZE,
+        base_url: str | None = None,
+        rate_limit: float = DEFAULT_RATE,
+        match_threshold: float = DEFAULT_MATCH_THRESHOLD,
+        catalog: CatalogIndex | None = None,
+    ):
+        self.spotify = SpotifyClientManager(auth_mode=auth_mode)
+        self.cache = cache
+        self.catalog = catalog
+        self.match_threshold = match_threshold
+        self.scheduler = RequestScheduler(rate=rate_limit, max_concurrency=pool_size)
+        self.http = HttpTransport(
+            base_url or os.getenv("SPOTIFY_API_URL", SPOTIFY_API_URL),
+            auth=BearerAuth(self.spotify),
+            pool_size=pool_size,
+            scheduler=self.scheduler,
+            name="spotify",
+        )
         self.spotify_logger = setup_logger(__name__)
-        print(self.spotify.token)
 
     def create_playlist(self, playlist_name: str, playlist_description: str) -> str:
         request_body = {
@@ -47,77 +173,287 @@ class Spotify:
             "public": False,
         }
 
-        query = f"https://api.spotify.com/v1/users/{self.spotify.user_id}/playlists"
-
-        response = requests.post(
-            query,
-            json=request_body,
-            headers={
-                "Content-Type": "application/json",
-                "Authorization": f"Bearer {self.spotify.token}",
-            },
+        response = self.http.post(
+            f"/users/{self.spotify.user_id}/playlists", json=request_body
         )
 
         playlist = response.json()
-        print(response.json())
+        self.spotify_logger.debug("Created playlist: %s", playlist)
         return playlist["id"]
 
-    def get_song_uri(self, artist: str, song_name: str) -> "str":
-        track_request = quote(
-            f"{song_name} {artist}"
-        )  # TODO: intercept None types as nulls and exit search.
-        query = (
-            f"https://api.spotify.com/v1/search?q={track_request}&type=track&limit=10"
-        )
-        self.spotify_logger.debug(f"Query arguments: {query}")
-
-        response = requests.get(
-            query,
-            headers={
-                "Content-Type": "application/json",
-                "Authorization": f"Bearer {self.spotify.token}",
-            },
-        )
+    def find_playlist(self, playlist_name: str) -> str | None:
+        """Find a playlist owned by the current user by its name.
+
+        Args:
+            playlist_name (str): Exact name of the playlist.
+
+        Returns:
+            str | None: ID of the first matching playlist, or None.
+        """
+        url = "/me/playlists"
+        params = {"limit": 50}
+        while url:
+            response = self.http.get(url, params=params)
+            if not response.ok:
+                self.spotify_logger.error("Bad API Response")
+                return None
+            page = response.json()
+            for playlist in page["items"]:
+                if (
+                    playlist["name"] == playlist_name
+                    and playlist["owner"]["id"] == self.spotify.user_id
+                ):
+                    return playlist["id"]
+            url, params = page.get("next"), None
+        return None
+
+    def get_playlist_track_uris(self, playlist_id: str) -> set[str]:
+        """Return the URIs of every track already in a playlist.
+
+        Pages are read 100 items at a time and only the track URIs are
+        requested.
+
+        Args:
+            playlist_id (str): Spotify playlist ID.
+
+        Returns:
+            set[str]: Track URIs; local files and unavailable tracks are left out.
+        """
+        url = f"/playlists/{playlist_id}/tracks"
+        params = {"fields": PLAYLIST_TRACK_FIELDS, "limit": MAX_TRACKS_PER_REQUEST}
+        uris = set()
+        while url:
+            response = self.http.get(url, params=params)
+            if not response.ok:
+                self.spotify_logger.error(
+                    f"Could not read playlist tracks. Response Code: {response.status_code}"
+                )
+                break
+            page = response.json()
+            uris.update(
+                item["track"]["uri"]
+                for item in page.get("items", [])
+                if item.get("track") and item["track"].get("uri")
+            )
+            # "next" already carries the query parameters of the first request.
+            url, params = page.get("next"), None
+        return uris
+
+    def search_tracks(self, artist: str, song_name: str) -> list[dict]:
+        """Search Spotify for a track, answering from the cache when possible.
+
+        Args:
+            artist (str): Artist name.
+            song_name (str): Track title.
+
+        Raises:
+            RateLimitedError: Spotify kept throttling the search.
+            SearchFailedError: The search request failed.
+
+        Returns:
+            list[dict]: Compact candidate tracks.
+        """
+        if not artist or not song_name:
+            return []
+        if self.cache:
+            cached = self.cache.get(artist, song_name)
+            if cached is not None:
+                return cached
+
+        query = {
+            "q": f"{song_name} {artist}",
+            "type": "track",
+            "limit": 10,
+        }
+        self.spotify_logger.debug("Query arguments: %s", query)
+
+        response = self.http.get("/search", params=query)
 
         if not response.ok:
-            self.spotify_logger.debug(f"Response Code: {response.ok}")
-            return None
+            self.spotify_logger.debug("Response Code: %s", response.status_code)
+            raise SearchFailedError(response.status_code)
 
         results = response.json()
 
-        tracks_found = results["tracks"]["items"]
+        tracks_found = [compact_track(track) for track in results["tracks"]["items"]]
+        if self.cache:
+            self.cache.set(artist, song_name, tracks_found)
+        if self.catalog:
+            self.catalog.add(tracks_found)
+        return tracks_found
 
-        artist_names = artist_names_from_tracks(tracks_found)
-        track_name = f"{artist}"
-        fuzzy_match_artist(artist_names=artist_names, track_input=track_name)
+    def get_song_uri(
+        self, artist: str, song_name: str, duration: float | None = None
+    ) -> str | None:
+        """Search for a song and return the URI of the best match.
 
-        if not tracks_found:
-            return None
+        Raises:
+            RateLimitedError: Spotify kept throttling the search.
+            SearchFailedError: The search request failed.
+
+        Returns:
+            str | None: URI of the match, or None when nothing matched.
+        """
+        return self.match_song(artist, song_name, duration).uri
+
+    def match_song(
+        self, artist: str, song_name: str, duration: float | None = None
+    ) -> Match:
+        """Search for a song and pick the best scoring candidate.
+
+        Raises:
+            RateLimitedError: Spotify kept throttling the search.
+            SearchFailedError: The search request failed.
+
+        Returns:
+            Match: The best candidate, with ``uri`` None when nothing was
+                found or its confidence is below ``match_threshold``.
+        """
+        local = self._match_local([(artist, song_name, duration)])[0]
+        if local is not None:
+            return local
+        tracks_found = self.search_tracks(artist, song_name)
+        return self._accept(
+            rank_candidates([(artist, song_name, duration)], [tracks_found or []])[0]
+        )
+
+    def match_songs(
+        self, songs: list, concurrency: int = 1
+    ) -> list[Match | RateLimitedError | SearchFailedError]:
+        """Search for many songs concurrently, then rank all results at once.
+
+        Songs with a confident match in the local catalog are not searched.
+
+        Args:
+            songs (list): Songs exposing ``artist``, ``title`` and ``duration``.
+            concurrency (int, optional): Number of searches in flight at once.
+                Defaults to 1 (serial).
+
+        Returns:
+            list[Match | RateLimitedError | SearchFailedError]: One entry per
+                song, in the same order as ``songs``, or the error if the
+                search was rate limited or failed.
+        """
+        local = self._match_local(
+            [(song.artist, song.title, song.duration) for song in songs]
+        )
+        remote = iter(
+            self._match_remote(
+                [song for song, match in zip(songs, local) if match is None],
+                concurrency,
+            )
+        )
+        return [match if match is not None else next(remote) for match in local]
+
+    def _match_remote(
+        self, songs: list, concurrency: int
+    ) -> list[Match | RateLimitedError | SearchFailedError]:
+        if not songs:
+            return []
+        if concurrency <= 1:
+            results = [self._search(song) for song in songs]
         else:
-            return tracks_found[0]["uri"]
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                results = list(executor.map(self._search, songs))
 
-    def add_song_to_playlist(self, song_uri: str, playlist_id: str) -> bool:
-        url = f"https://api.spotify.com/v1/playlists/{playlist_id}/tracks"
-        response = requests.post(
-            url,
-            json={"uris": [song_uri]},
-            headers={
-                "Authorization": f"Bearer {self.spotify.token}",
-                "Content-Type": "application/json",
-            },
+        ranked = [
+            (song, tracks_found)
+            for song, tracks_found in zip(songs, results)
+            if not isinstance(tracks_found, SEARCH_ERRORS)
+        ]
+        matches = iter(
+            rank_candidates(
+                [(song.artist, song.title, song.duration) for song, _ in ranked],
+                [tracks_found or [] for _, tracks_found in ranked],
+            )
         )
-        return response.ok
+        return [
+            result
+            if isinstance(result, SEARCH_ERRORS)
+            else self._accept(next(matches))
+            for result in results
+        ]
+
+    def get_song_uris(
+        self, songs: list, concurrency: int = 1
+    ) -> list[str | RateLimitedError | SearchFailedError | None]:
+        """Resolve many songs to Spotify URIs, searching concurrently.
+
+        Args:
+            songs (list): Songs exposing ``artist``, ``title`` and ``duration``.
+            concurrency (int, optional): Number of searches in flight at once.
+                Defaults to 1 (serial).
+
+        Returns:
+            list[str | RateLimitedError | SearchFailedError | None]: One entry
+                per song, in the same order as ``songs``: the URI, None if no
+                track was found, or the error if the search was rate limited
+                or failed.
+        """
+        return [
+            match if isinstance(match, SEARCH_ERRORS) else match.uri
+            for match in self.match_songs(songs, concurrency)
+        ]
+
+    def _match_local(self, queries: list[tuple]) -> list[Match | None]:
+        """Match ``(artist, title, duration)`` queries against the catalog.
+
+        Returns:
+            list[Match | None]: The local match of each query, or None when
+                the catalog has no match confident enough to skip the search.
+        """
+        if not self.catalog:
+            return [None] * len(queries)
+        candidates = [self.catalog.lookup(artist, title) for artist, title, _ in queries]
+        matches = []
+        for match in rank_candidates(queries, candidates):
+            hit = match.uri is not None and match.confidence >= self.catalog.min_confidence
+            self.catalog.record(hit)
+            matches.append(match if hit else None)
+        return matches
+
+    def _search(self, song) -> list[dict] | RateLimitedError | SearchFailedError:
+        try:
+            return self.search_tracks(song.artist, song.title)
+        except SEARCH_ERRORS as error:
+            return error
+
+    def _accept(self, match: Match) -> Match:
+        if match.confidence < self.match_threshold:
+            self.spotify_logger.debug("Rejected low confidence match: %s", match)
+            return Match(None, match.confidence)
+        return match
+
+    def add_song_to_playlist(self, song_uri: str, playlist_id: str) -> bool:
+        return self.add_songs_to_playlist([song_uri], playlist_id)[0].added
+
+    def add_songs_to_playlist(
+        self, song_uris: list[str], playlist_id: str
+    ) -> list[AddResult]:
+        """Add tracks to a playlist using as few requests as possible.
+
+        Args:
+            song_uris (list[str]): Spotify track URIs, in playlist order.
+            playlist_id (str): Spotify playlist ID.
+
+        Returns:
+            list[AddResult]: One result per request of up to 100 URIs.
+        """
+        url = f"/playlists/{playlist_id}/tracks"
+        results = []
+        for start in range(0, len(song_uris), MAX_TRACKS_PER_REQUEST):
+            chunk = song_uris[start : start + MAX_TRACKS_PER_REQUEST]
+            response = self.http.post(url, json={"uris": chunk})
+            if not response.ok:
+                self.spotify_logger.error(
+                    f"Failed to add {len(chunk)} tracks. "
+                    f"Response Code: {response.status_code}"
+                )
+            results.append(AddResult(chunk, response.ok, response.status_code))
+        return results
 
     def _num_playlist_songs(self, playlist_id) -> Any | Literal[False] | None:
-        url = f"https://api.spotify.com/v1/playlists/{playlist_id}/tracks"
-
-        response = requests.get(
-            url,
-            headers={
-                "Content-Type": "application/json",
-                "Authorization": f"Bearer {self.spotify.token}",
-            },
-        )
+        response = self.http.get(f"/playlists/{playlist_id}/tracks")
 
         if not response.ok:
             self.spotify_logger.error("Bad API Response")
@@ -127,3 +463,67 @@ class Spotify:
         if "total" in results:
             return results["total"]
         return None
+
+
+class PlaylistWriter:
+    """Buffers resolved tracks and adds them to a playlist in batches.
+
+    Tracks are written in the order they were buffered. Every flush returns
+    one ``(item, uri, added)`` tuple per buffered track so callers can report
+    which songs made it into the playlist.
+
+    The writer also tracks which URIs the playlist holds: the ``existing_uris``
+    it was created with plus everything buffered since. Use ``uri in writer``
+    to skip tracks that are already present.
+    """
+
+    def __init__(
+        self,
+        spotify: Spotify,
+        playlist_id: str,
+        batch_size: int = MAX_TRACKS_PER_REQUEST,
+        existing_uris: set[str] | None = None,
+    ):
+        self.spotify = spotify
+        self.playlist_id = playlist_id
+        self.batch_size = min(batch_size, MAX_TRACKS_PER_REQUEST)
+        self.buffer: list[tuple[Any, str]] = []
+        self.present = set(existing_uris or ())
+
+    def __contains__(self, song_uri: str) -> bool:
+        return song_uri in self.present
+
+    def add(self, song_uri: str, item: Any = None) -> list[tuple[Any, str, bool]]:
+        """Buffer a track, flushing when a full batch is ready.
+
+        Args:
+            song_uri (str): Spotify track URI.
+            item (Any, optional): Object reported back with the outcome.
+
+        Returns:
+            list[tuple[Any, str, bool]]: Outcomes of any tracks written.
+        """
+        self.buffer.append((item, song_uri))
+        self.present.add(song_uri)
+        if len(self.buffer) >= self.batch_size:
+            return self.flush()
+        return []
+
+    def flush(self) -> list[tuple[Any, str, bool]]:
+        """Write every buffered track to the playlist."""
+        if not self.buffer:
+            return []
+        pending, self.buffer = self.buffer, []
+        results = self.spotify.add_songs_to_playlist(
+            [uri for _, uri in pending], self.playlist_id
+        )
+        outcomes = []
+        entries = iter(pending)
+        for result in results:
+            for _ in result.uris:
+                item, uri = next(entries)
+                outcomes.append((item, uri, result.added))
+                if not result.added:
+                    # Not in the playlist after all; a later duplicate may retry.
+                    self.present.discard(uri)
+        return outcomes
@@ -0,0 +1,99 @@
+import os
+import sqlite3
+import threading
+import time
+from typing import Iterable
+
+
+class SyncState:
+    """Remembers which YouTube videos have been synced to which playlist.
+
+    Backs the ``--sync`` mode: each YouTube playlist maps to one Spotify
+    playlist, and every video that was added (or could not be matched) is
+    recorded so later runs only handle new items.
+
+    Args:
+        path (str): Location of the SQLite database file.
+    """
+
+    def __init__(self, path: str):
+        self.path = os.path.expanduser(path)
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+
+        self.connection = sqlite3.connect(
+            self.path, check_same_thread=False, isolation_level=None
+        )
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS playlists (
+                youtube_playlist_id TEXT PRIMARY KEY,
+                spotify_playlist_id TEXT NOT NULL
+            )
+            """
+        )
+        self.connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS handled_videos (
+                youtube_playlist_id TEXT NOT NULL,
+                video_id TEXT NOT NULL,
+                status TEXT NOT NULL,
+                handled_at REAL NOT NULL,
+                PRIMARY KEY (youtube_playlist_id, video_id)
+            )
+            """
+        )
+
+    def get_spotify_playlist(self, youtube_playlist_id: str) -> str | None:
+        """Return the Spotify playlist a YouTube playlist was synced to."""
+        with self._lock:
+            row = self.connection.execute(
+                "SELECT spotify_playlist_id FROM playlists WHERE youtube_playlist_id = ?",
+                (youtube_playlist_id,),
+            ).fetchone()
+        return row[0] if row else None
+
+    def set_spotify_playlist(
+        self, youtube_playlist_id: str, spotify_playlist_id: str
+    ) -> None:
+        with self._lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO playlists VALUES (?, ?)",
+                (youtube_playlist_id, spotify_playlist_id),
+            )
+
+    def handled_video_ids(self, youtube_playlist_id: str) -> set[str]:
+        """Return the IDs of every video already handled for a playlist."""
+        with self._lock:
+            rows = self.connection.execute(
+                "SELECT video_id FROM handled_videos WHERE youtube_playlist_id = ?",
+                (youtube_playlist_id,),
+            ).fetchall()
+        return {row[0] for row in rows}
+
+    def mark_handled(
+        self, youtube_playlist_id: str, video_ids: Iterable[str], status: str
+    ) -> None:
+        """Record videos as handled.
+
+        Args:
+            youtube_playlist_id (str): Youtube Playlist ID
+            video_ids (Iterable[str]): Videos to record.
+            status (str): Outcome, e.g. "added", "duplicate", "not_found" or
+                "unparsed".
+        """
+        now = time.time()
+        rows = [(youtube_playlist_id, video_id, status, now) for video_id in video_ids]
+        with self._lock:
+            self.connection.execute("BEGIN")
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO handled_videos VALUES (?, ?, ?, ?)", rows
+            )
+            self.connection.execute("COMMIT")
+
+    def close(self) -> None:
+        self.connection.close()
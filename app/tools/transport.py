@@ -0,0 +1,131 @@
+from typing import Callable, TYPE_CHECKING
+from tools.metrics import metrics
+from tools.ratelimit import RequestScheduler
+
+if TYPE_CHECKING:
+    import requests
+
+
+DEFAULT_POOL_SIZE = 10
+DEFAULT_RETRIES = 3
+DEFAULT_BACKOFF_FACTOR = 0.5
+DEFAULT_TIMEOUT = 30
+# Transient server errors worth retrying.
+RETRY_STATUSES = (500, 502, 503, 504)
+
+
+class BearerAuth:
+    """Attach the current access token of a client manager to each request.
+
+    requests accepts any callable as ``auth``, so this does not subclass
+    ``requests.auth.AuthBase`` and requests is not imported until a session
+    is created.
+    """
+
+    def __init__(self, client_manager):
+        self.client_manager = client_manager
+
+    def __call__(
+        self, request: "requests.PreparedRequest"
+    ) -> "requests.PreparedRequest":
+        request.headers["Authorization"] = f"Bearer {self.client_manager.token}"
+        return request
+
+
+class HttpTransport:
+    """Pooled HTTP session bound to a single API base URL.
+
+    Connections are kept alive and shared between threads, responses are
+    requested compressed, and connection errors and transient 5xx responses
+    are retried with exponential backoff. Non-idempotent requests (POST) are
+    only retried when the connection could not be made.
+
+    Args:
+        base_url (str): Prefix for relative request paths, e.g.
+            "https://api.spotify.com/v1". Point it at a local server in tests.
+        auth (Callable, optional): Authentication applied to every request,
+            e.g. ``BearerAuth``.
+        pool_size (int, optional): Connections kept open per host.
+        retries (int, optional): Retries for connection errors and, for
+            idempotent methods, 5xx and read errors.
+        backoff_factor (float, optional): Base delay of the exponential backoff.
+        timeout (float, optional): Default timeout in seconds per request.
+        scheduler (RequestScheduler, optional): Paces requests and handles
+            429 responses. Without one, 429s are returned to the caller.
+        name (str, optional): ``api`` label of the request metrics.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        auth: Callable | None = None,
+        pool_size: int = DEFAULT_POOL_SIZE,
+        retries: int = DEFAULT_RETRIES,
+        backoff_factor: float = DEFAULT_BACKOFF_FACTOR,
+        timeout: float = DEFAULT_TIMEOUT,
+        scheduler: RequestScheduler | None = None,
+        name: str = "http",
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.name = name
+        self.timeout = timeout
+        self.scheduler = scheduler
+
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+
+        retry = Retry(
+            total=retries,
+            connect=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=RETRY_STATUSES,
+            # A POST that reached the server may have been applied, so only
+            # idempotent methods are retried on 5xx and read errors. Connect
+            # errors, where nothing was sent, are retried for every method.
+            allowed_methods=Retry.DEFAULT_ALLOWED_METHODS,
+            raise_on_status=False,
+            respect_retry_after_header=False,  # 429s are left to the scheduler.
+        )
+        adapter = HTTPAdapter(
+            pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry
+        )
+
+        self.session = requests.Session()
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update(
+            {"Accept": "application/json", "Accept-Encoding": "gzip, deflate"}
+        )
+        self.session.auth = auth
+
+    def request(self, method: str, path: str, **kwargs) -> "requests.Response":
+        """Send a request to ``path``, relative to the base URL unless absolute."""
+        url = path if path.startswith("http") else f"{self.base_url}{path}"
+        kwargs.setdefault("timeout", self.timeout)
+        if self.scheduler:
+            return self.scheduler.send(lambda: self._send(method, url, **kwargs))
+        return self._send(method, url, **kwargs)
+
+    def _send(self, method: str, url: str, **kwargs) -> "requests.Response":
+        with metrics.time("api_request_seconds", api=self.name, method=method):
+            response = self.session.request(method, url, **kwargs)
+        metrics.inc(
+            "api_requests_total",
+            api=self.name,
+            method=method,
+            status=response.status_code,
+        )
+        retries = getattr(response.raw, "retries", None)
+        if retries is not None and retries.history:
+            metrics.inc("api_retries_total", len(retries.history), api=self.name)
+        return response
+
+    def get(self, path: str, **kwargs) -> "requests.Response":
+        return self.request("GET", path, **kwargs)
+
+    def post(self, path: str, **kwargs) -> "requests.Response":
+        return self.request("POST", path, **kwargs)
+
+    def close(self) -> None:
+        self.session.close()
@@ -1,40 +1,122 @@
-from thefuzz import process, fuzz
-from tools.app_logger import setup_logger
+from dataclasses import dataclass
+from rapidfuzz import fuzz, process
+from rapidfuzz.utils import default_process
 
+# Minimum confidence (0-100) for a candidate to be accepted as a match.
+DEFAULT_MATCH_THRESHOLD = 60
+ARTIST_WEIGHT = 0.45
+TITLE_WEIGHT = 0.45
+DURATION_WEIGHT = 0.10
+# Duration difference (seconds) still scored as a perfect match, and the one
+# at which the duration score reaches zero.
+DURATION_TOLERANCE = 3
+DURATION_CUTOFF = 30
+# Titles that only contain the query (e.g. "Song - Instrumental") score below
+# an exact title.
+SUBSET_TITLE_FACTOR = 0.9
 
-utils_logger = setup_logger(__name__)
 
+@dataclass(slots=True)
+class Match:
+    """Best candidate of a search and how confident the ranking is in it."""
 
-def artist_names_from_tracks(items: dict):
-    """Obtain name from artist in list of tracks
+    uri: str | None
+    confidence: float
+
+
+def duration_score(query_seconds: float | None, candidate_ms: int | None) -> float | None:
+    """Score how close a candidate's length is to the video's (0-100).
+
+    Returns None when either duration is unknown.
+    """
+    if not query_seconds or not candidate_ms:
+        return None
+    difference = abs(query_seconds - candidate_ms / 1000)
+    if difference <= DURATION_TOLERANCE:
+        return 100.0
+    return max(
+        0.0,
+        100.0 * (DURATION_CUTOFF - difference) / (DURATION_CUTOFF - DURATION_TOLERANCE),
+    )
+
+
+def rank_candidates(
+    queries: list[tuple], candidate_lists: list[list[dict]]
+) -> list[Match]:
+    """Pick the best candidate of many searches in a single scoring pass.
+
+    Every candidate is scored against its query on artist (best of all the
+    track's artists), title and, when both are known, duration. The artist
+    and title pairs of the whole batch are each scored by one
+    ``rapidfuzz.process.cpdist`` call, and the weighting is done on arrays.
 
     Args:
-        tracks (dict): tracks returned from Spotify Search API.
+        queries (list[tuple]): ``(artist, title, duration_seconds)`` per search.
+        candidate_lists (list[list[dict]]): Candidate tracks of each search,
+            with ``uri``, ``name``, ``artists`` and optionally ``duration_ms``.
 
     Returns:
-        artist_names(set): set of item names.
+        list[Match]: Best candidate of each search with its confidence (0-100).
+            Searches without candidates give ``Match(None, 0.0)``.
     """
-    artist_names = set()
-
-    for idx, track in enumerate(items):
-        artist_names.add(track["artists"][0]["name"])
-    return artist_names
+    # numpy is slow to import and only needed once a search is ranked.
+    import numpy as np
 
+    artist_left, artist_right, artist_owner = [], [], []
+    title_left, title_right = [], []
+    lengths = []
+    for (artist, title, duration), candidates in zip(queries, candidate_lists):
+        artist, title = default_process(str(artist or "")), default_process(str(title or ""))
+        for candidate in candidates:
+            for name in candidate.get("artists", []):
+                artist_left.append(artist)
+                artist_right.append(default_process(str(name["name"] or "")))
+                artist_owner.append(len(title_left))
+            title_left.append(title)
+            title_right.append(default_process(str(candidate.get("name") or "")))
+            lengths.append(duration_score(duration, candidate.get("duration_ms")))
 
-def fuzzy_match_artist(artist_names: set, track_input: str) -> bool:
-    match_grade = process.extract(
-        track_input, artist_names, limit=3, scorer=fuzz.token_sort_ratio
+    artist_scores = np.zeros(len(title_left))
+    if artist_left:
+        np.maximum.at(
+            artist_scores,
+            np.array(artist_owner),
+            _pair_scores(fuzz.token_sort_ratio, artist_left, artist_right),
+        )
+    # Titles that only contain the query rank below exact titles.
+    title_scores = np.maximum(
+        _pair_scores(fuzz.token_sort_ratio, title_left, title_right),
+        SUBSET_TITLE_FACTOR * _pair_scores(fuzz.token_set_ratio, title_left, title_right),
     )
-    try:
-        if match_grade[0][1] > 70:
-            print(f"Fuzy match found {match_grade}")
-            return True
-        else:
-            print(f"Fuzy match not found {match_grade}")
-            return False
-    except IndexError:
-        utils_logger.debug(f"Issue with ingest to fuzzmatch with data")
-        utils_logger.debug(f"Track {track_input}")
-        utils_logger.debug(f"{artist_names}")
-        print("No data provided to matching process")
-        return False
+    known = np.array([length is not None for length in lengths], dtype=bool)
+    length_scores = np.array([length or 0.0 for length in lengths])
+    confidences = (
+        ARTIST_WEIGHT * artist_scores
+        + TITLE_WEIGHT * title_scores
+        + np.where(known, DURATION_WEIGHT * length_scores, 0.0)
+    ) / (ARTIST_WEIGHT + TITLE_WEIGHT + np.where(known, DURATION_WEIGHT, 0.0))
+
+    matches = []
+    start = 0
+    for candidates in candidate_lists:
+        end = start + len(candidates)
+        best = Match(None, 0.0)
+        if end > start:
+            index = int(np.argmax(confidences[start:end]))
+            if confidences[start + index] > 0:
+                best = Match(candidates[index]["uri"], float(confidences[start + index]))
+        matches.append(best)
+        start = end
+    return matches
+
+
+def _pair_scores(scorer, left: list[str], right: list[str]):
+    """Score ``left[i]`` against ``right[i]`` for every i; empty strings score 0."""
+    import numpy as np
+
+    if not left:
+        return np.zeros(0)
+    # Whole points, as the scores were before; keeps thresholds comparable.
+    scores = np.rint(process.cpdist(left, right, scorer=scorer, dtype=np.float64))
+    empty = np.array([not a or not b for a, b in zip(left, right)], dtype=bool)
+    return np.where(empty, 0.0, scores)
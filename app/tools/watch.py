@@ -0,0 +1,257 @@
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import random
+import threading
+import time
+from typing import Callable
+from urllib.parse import parse_qs, urlparse
+from tools.app_logger import setup_logger
+from tools.metrics import metrics
+
+
+DEFAULT_POLL_INTERVAL = 15 * 60
+# Share of the interval each poll is moved by at random, so playlists do not
+# all come due at once.
+DEFAULT_JITTER = 0.1
+# Longest delay before a request made from a signal handler is acted on.
+SIGNAL_CHECK_INTERVAL = 1.0
+
+
+@dataclass
+class WatchedPlaylist:
+    playlist: str
+    version: str | None = None
+    due_at: float = 0.0
+    forced: bool = False
+    synced_at: float | None = None
+    syncs: int = 0
+    failures: int = 0
+
+
+class PlaylistWatcher:
+    """Polls playlists on a jittered schedule and syncs the ones that changed.
+
+    Every poll first asks ``check_versions`` for a cheap version of each due
+    playlist (item count and ETag) and only calls ``sync`` for playlists
+    whose version changed since their last successful sync, or that were
+    triggered by hand.
+
+    Args:
+        playlists (list[str]): Playlists to watch, as passed to the callbacks.
+        check_versions (Callable[[list[str]], dict[str, str]]): Version of
+            each playlist; unavailable playlists are left out.
+        sync (Callable[[list[str]], dict[str, bool]]): Syncs playlists and
+            tells which ones completed.
+        interval (float, optional): Seconds between two polls of a playlist.
+        jitter (float, optional): Share of ``interval`` polls are moved by.
+    """
+
+    def __init__(
+        self,
+        playlists: list[str],
+        check_versions: Callable[[list[str]], dict[str, str]],
+        sync: Callable[[list[str]], dict[str, bool]],
+        interval: float = DEFAULT_POLL_INTERVAL,
+        jitter: float = DEFAULT_JITTER,
+    ):
+        self.playlists = {playlist: WatchedPlaylist(playlist) for playlist in playlists}
+        self.check_versions = check_versions
+        self.sync = sync
+        self.interval = interval
+        self.jitter = jitter
+        self.logger = setup_logger(__name__)
+        self._random = random.Random()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        # Set from signal handlers, which must not take locks.
+        self._trigger_requested = False
+        self._stop_requested = False
+
+    def run(self) -> None:
+        """Poll until ``stop`` is called. The first poll syncs every playlist."""
+        self.logger.info(
+            f"Watching {len(self.playlists)} playlists every {self.interval:g}s"
+        )
+        while True:
+            if self._stop_requested:
+                self._stopped.set()
+            if self._stopped.is_set():
+                break
+            if self._trigger_requested:
+                self._trigger_requested = False
+                self.trigger()
+            due = self._take_due()
+            if due:
+                self.poll(due)
+            self._wake.wait(min(self._until_next_due(), SIGNAL_CHECK_INTERVAL))
+            self._wake.clear()
+        self.logger.info("Stopped watching playlists")
+
+    def poll(self, due: list[WatchedPlaylist]) -> None:
+        """Check the versions of due playlists and sync the changed ones."""
+        with self._lock:
+            forced = {watched.playlist for watched in due if watched.forced}
+            for watched in due:
+                watched.forced = False
+        try:
+            versions = self.check_versions([watched.playlist for watched in due])
+        except Exception as error:
+            self.logger.error(f"Could not check playlist versions: {error!r}")
+            self._schedule(due)
+            return
+
+        to_sync = []
+        for watched in due:
+            version = versions.get(watched.playlist)
+            triggered = watched.playlist in forced
+            if version is None and not triggered:
+                self.logger.warning(f"{watched.playlist} is unavailable, skipping")
+                metrics.inc("watch_polls_total", result="unavailable")
+            elif triggered or version != watched.version:
+                result = "triggered" if triggered else "changed"
+                metrics.inc("watch_polls_total", result=result)
+                to_sync.append(watched)
+            else:
+                metrics.inc("watch_polls_total", result="unchanged")
+
+        if to_sync:
+            self.logger.info(f"Syncing {len(to_sync)} of {len(due)} polled playlists")
+            try:
+                completed = self.sync([watched.playlist for watched in to_sync])
+            except Exception as error:
+                self.logger.error(f"Sync failed: {error!r}")
+                completed = {}
+            now = time.time()
+            for watched in to_sync:
+                if completed.get(watched.playlist):
+                    # A failed or partial sync keeps the old version, so the
+                    # next poll tries again.
+                    watched.version = versions.get(watched.playlist)
+                    watched.synced_at = now
+                    watched.syncs += 1
+                else:
+                    watched.failures += 1
+        self._schedule(due)
+
+    def trigger(self, playlist: str | None = None) -> list[str]:
+        """Sync a playlist, or every playlist, now, even if it did not change.
+
+        Safe to call from other threads; signal handlers use ``request_trigger``.
+
+        Returns:
+            list[str]: The triggered playlists; empty for an unknown playlist.
+        """
+        with self._lock:
+            targets = [
+                watched
+                for watched in self.playlists.values()
+                if playlist in (None, watched.playlist)
+            ]
+            for watched in targets:
+                watched.forced = True
+                watched.due_at = 0.0
+        self._wake.set()
+        return [watched.playlist for watched in targets]
+
+    def stop(self) -> None:
+        """Stop after the current sync, if any."""
+        self._stopped.set()
+        self._wake.set()
+
+    def request_trigger(self) -> None:
+        """Like ``trigger()``, but takes no lock, so signal handlers can call it."""
+        self._trigger_requested = True
+
+    def request_stop(self) -> None:
+        """Like ``stop()``, but takes no lock, so signal handlers can call it."""
+        self._stop_requested = True
+
+    def status(self) -> list[dict]:
+        """State of every watched playlist, for the control endpoint."""
+        now = time.monotonic()
+        with self._lock:
+            return [
+                {
+                    "playlist": watched.playlist,
+                    "version": watched.version,
+                    "synced_at": watched.synced_at,
+                    "syncs": watched.syncs,
+                    "failures": watched.failures,
+                    "next_poll_in": max(watched.due_at - now, 0.0),
+                }
+                for watched in self.playlists.values()
+            ]
+
+    def _take_due(self) -> list[WatchedPlaylist]:
+        now = time.monotonic()
+        with self._lock:
+            return [
+                watched for watched in self.playlists.values() if watched.due_at <= now
+            ]
+
+    def _schedule(self, polled: list[WatchedPlaylist]) -> None:
+        now = time.monotonic()
+        with self._lock:
+            for watched in polled:
+                # A trigger during the sync keeps the playlist due right away.
+                if not watched.forced:
+                    spread = self._random.uniform(-self.jitter, self.jitter)
+                    watched.due_at = now + self.interval * (1 + spread)
+
+    def _until_next_due(self) -> float:
+        with self._lock:
+            next_due = min(watched.due_at for watched in self.playlists.values())
+        return max(next_due - time.monotonic(), 0.0)
+
+
+class ControlHandler(BaseHTTPRequestHandler):
+    """``POST /sync[?playlist=<playlist>]`` triggers syncs, ``GET /status`` reports."""
+
+    watcher: PlaylistWatcher
+
+    def do_GET(self):
+        if urlparse(self.path).path == "/status":
+            return self._send(200, {"playlists": self.watcher.status()})
+        return self._send(404, {"error": "not found"})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path != "/sync":
+            return self._send(404, {"error": "not found"})
+        playlist = parse_qs(url.query).get("playlist", [None])[0]
+        triggered = self.watcher.trigger(playlist)
+        if not triggered:
+            return self._send(404, {"error": f"not watching {playlist}"})
+        return self._send(202, {"triggered": triggered})
+
+    def _send(self, status: int, body: dict):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_control_server(
+    watcher: PlaylistWatcher, port: int, host: str = "127.0.0.1"
+) -> ThreadingHTTPServer:
+    """Serve the control endpoint of a watcher in a daemon thread.
+
+    Binds to localhost by default: the endpoint has no authentication.
+
+    Returns:
+        ThreadingHTTPServer: The server; ``shutdown`` stops it.
+    """
+    handler = type("BoundControlHandler", (ControlHandler,), {"watcher": watcher})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(
+        target=server.serve_forever, name="watch-control", daemon=True
+    ).start()
+    return server
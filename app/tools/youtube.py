@@ -1,40 +1,60 @@
 from dataclasses import dataclass
 from dotenv import load_dotenv
-from googleapiclient.discovery import build, Resource
 import os
 from pprint import pprint
 import re
+import threading
 from tools.app_logger import setup_logger
+from tools.cache import PageCache
+from tools.metadata import MetadataStore
+from tools.metrics import metrics
+from tools.normalize import normalize_artist_title, parse_title
 from tools.ytdlp import VideoTitleExtractor
-from youtube_title_parse import get_artist_title
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from googleapiclient.discovery import Resource
 
 
 # Load the environment variables from the .env file (if present)
 load_dotenv()
 
-
-@dataclass
+# videos.list accepts up to 50 IDs per call.
+VIDEOS_PER_REQUEST = 50
+TOPIC_CHANNEL_SUFFIX = " - Topic"
+PROVIDED_TO_YOUTUBE = "Provided to YouTube by"
+# Only the fields the archiver reads are requested from the Data API.
+PLAYLIST_FIELDS = "etag,items(snippet(title,description))"
+VIDEOS_FIELDS = (
+    "items(id,snippet(title,description,channelTitle,tags),contentDetails/duration)"
+)
+PLAYLIST_ITEMS_FIELDS = "etag,nextPageToken,items(snippet(title,resourceId/videoId))"
+# playlistItems.list returns at most 50 items per page.
+PLAYLIST_ITEMS_PER_REQUEST = 50
+# playlists.list accepts up to 50 IDs per call.
+PLAYLISTS_PER_REQUEST = 50
+PLAYLIST_VERSION_FIELDS = "items(id,etag,contentDetails/itemCount)"
+
+# How extract_songs resolves items that videos.list could not: yt-dlp first,
+# or the playlist item title first with yt-dlp only for unparsable titles.
+YTDLP_FIRST = "ytdlp-first"
+PARSE_FIRST = "parse-first"
+STRATEGIES = (YTDLP_FIRST, PARSE_FIRST)
+
+
+@dataclass(slots=True)
 class Song:
     artist: str
     title: str
+    video_id: str | None = None
+    duration: float | None = None  # seconds
+    source: str | None = None  # "videos_list", "ytdlp" or "title"
 
 
-class Error(Exception):
-    """Base class for other exceptions"""
-
-    pass
-
-
-class YtDlpParseError(Error):
-    """Raised when yt-dlp library does not contain information needed"""
-
-    pass
-
-
-class SongInfoNotFoundError(Error):
-    """Raised when no artist or song info is found"""
-
-    pass
+@dataclass(slots=True)
+class PlaylistItem:
+    video_id: str
+    title: str
 
 
 def clean_song_info(song: Song) -> type(Song):
@@ -50,17 +70,59 @@ def clean_song_info(song: Song) -> type(Song):
                  Song.artist('Macroblank')
                  Song.title('痛みの永 Kamo')
     """
-    artist, title = song.artist, song.title
-    title = re.sub("\(.*", "", title)  # Remove everything after '(' including '('
-    title = re.sub("ft.*", "", title)  # Remove everything after 'ft' including 'ft'
-    title = re.sub(",.*", "", title)  # Remove everything after ',' including ','
-    artist = re.sub(
-        "\sx\s.*", "", artist
-    )  # Remove everything after ' x ' including ' x '
-    artist = re.sub("\(.*", "", artist)  # Remove everything after '(' including '('
-    artist = re.sub("ft.*", "", artist)  # Remove everything after 'ft' including 'ft'
-    artist = re.sub(",.*", "", artist)  # Remove everything after ',' including ','
-    return Song(artist.strip(), title.strip())  # Remove whitespaces from start and end
+    artist, title = normalize_artist_title(song.artist, song.title)
+    return Song(artist, title, song.video_id, song.duration, song.source)
+
+
+def parse_iso8601_duration(duration: str | None) -> float | None:
+    """Convert a videos.list duration such as "PT1H2M3S" to seconds."""
+    match = re.fullmatch(
+        r"P(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?(?:(\d+)S)?)?", duration or ""
+    )
+    if not match or not any(match.groups()):
+        return None
+    days, hours, minutes, seconds = (int(group or 0) for group in match.groups())
+    return float(((days * 24 + hours) * 60 + minutes) * 60 + seconds)
+
+
+def track_from_video_snippet(snippet: dict) -> Song | None:
+    """Derive artist and title from a videos.list snippet when it is reliable.
+
+    Uses, in order: the "Provided to YouTube by" block of auto-generated
+    uploads ("Title · Artist · ..."), the channel of "Artist - Topic"
+    channels, and an "Artist - Title" video title whose artist is also one
+    of the video tags.
+
+    Args:
+        snippet (dict): ``snippet`` of a videos.list item, with the video
+            ``duration`` in seconds added when known.
+
+    Returns:
+        Song | None: Artist and title, or None when no field is conclusive.
+    """
+    description = snippet.get("description") or ""
+    if PROVIDED_TO_YOUTUBE in description:
+        lines = description.split(PROVIDED_TO_YOUTUBE, 1)[1].splitlines()[1:]
+        track_line = next((line for line in lines if line.strip()), "")
+        parts = [part.strip() for part in track_line.split("·")]
+        if len(parts) >= 2 and parts[0] and parts[1]:
+            return Song(parts[1], parts[0], duration=snippet.get("duration"))
+
+    title = snippet.get("title") or ""
+    channel = snippet.get("channelTitle") or ""
+    if channel.endswith(TOPIC_CHANNEL_SUFFIX) and title:
+        return Song(
+            channel[: -len(TOPIC_CHANNEL_SUFFIX)],
+            title,
+            duration=snippet.get("duration"),
+        )
+
+    tags = {tag.casefold() for tag in snippet.get("tags", [])}
+    if " - " in title:
+        artist, track = (part.strip() for part in title.split(" - ", 1))
+        if artist and track and artist.casefold() in tags:
+            return Song(artist, track, duration=snippet.get("duration"))
+    return None
 
 
 class Youtube:
@@ -69,29 +131,33 @@ class Youtube:
         DEVELOPER_KEY,
         YOUTUBE_API_SERVICE_NAME,
         YOUTUBE_API_VERSION
-
-    Raises:
-        YtDlpParseError: _description_
-        SongInfoNotFound: _description_
-
     """
 
     DEVELOPER_KEY = os.getenv("YOUTUBE_API_KEY")
     YOUTUBE_API_SERVICE_NAME = "youtube"
     YOUTUBE_API_VERSION = "v3"
 
-    def __init__(self, ydl_input_ops: dict):
-        self.songs = []
-        self.youtube = build(
-            Youtube.YOUTUBE_API_SERVICE_NAME,
-            Youtube.YOUTUBE_API_VERSION,
-            developerKey=Youtube.DEVELOPER_KEY,
+    def __init__(
+        self,
+        ydl_input_ops: dict,
+        ytdlp_workers: int = 1,
+        page_cache: PageCache | None = None,
+        api_endpoint: str | None = None,
+        metadata_store: MetadataStore | None = None,
+    ):
+        self.page_cache = page_cache
+        self._playlist_snippets = {}
+        self._local = threading.local()
+        # A local stand-in of the Data API can be used instead, e.g. in benchmarks.
+        self._api_endpoint = api_endpoint or os.getenv("YOUTUBE_API_URL")
+        self._youtube = None
+        self._youtube_lock = threading.Lock()
+        self.ytdl = VideoTitleExtractor(
+            ydl_input_ops, workers=ytdlp_workers, store=metadata_store
         )
-        self.ytdl = VideoTitleExtractor(ydl_input_ops)
         self.yt_logger = setup_logger(__name__)
 
-    def __get_artist_title_ytdlp(self, video_id):
-        video_info = self.ytdl.get_yt_metadata(video_id)
+    def __get_artist_title_ytdlp(self, video_info):
         track_info = {}
 
         track_info["artist"], track_info["title"] = self.ytdl.process_video_track(
@@ -103,135 +169,337 @@ class Youtube:
             return None
 
 
-    def __fetch_playlist_name(
-        self, youtube: Resource, playlist_id, page_token=None
-    ) -> str:
+    @property
+    def youtube(self) -> "Resource":
+        """Data API client, built on first use.
+
+        googleapiclient takes longer to import than the rest of the archiver,
+        so runs that never reach the API (``--help``, bad arguments, a fully
+        cached sync) do not pay for it. The discovery document bundled with
+        googleapiclient is used, so building the client needs no request.
+        """
+        with self._youtube_lock:
+            if self._youtube is None:
+                from googleapiclient.discovery import build
+
+                self._youtube = build(
+                    Youtube.YOUTUBE_API_SERVICE_NAME,
+                    Youtube.YOUTUBE_API_VERSION,
+                    developerKey=Youtube.DEVELOPER_KEY,
+                    static_discovery=True,
+                    client_options=(
+                        {"api_endpoint": self._api_endpoint}
+                        if self._api_endpoint
+                        else None
+                    ),
+                )
+            return self._youtube
+
+    def __http(self):
+        """httplib2 connection of the calling thread.
+
+        httplib2 is not thread-safe, and pipeline stages call the API from
+        different threads.
+        """
+        if not hasattr(self._local, "http"):
+            from googleapiclient.http import build_http
+
+            self._local.http = build_http()
+        return self._local.http
+
+    def __execute(self, request, cache_key: str | None = None) -> dict:
+        """
+        Executes an API request, revalidating a stored copy with its ETag.
+
+        Every call costs one unit of YouTube Data API quota, which is counted
+        in the run metrics.
+
+        Args:
+            request (HttpRequest): Request built from the Youtube API Class.
+            cache_key (str, optional): Key of the stored copy in the page cache.
+                Responses without a key are not cached.
+
+        Returns:
+            result: the response body, from the page cache if it was unchanged.
         """
+        from googleapiclient.errors import HttpError
+
+        cache = self.page_cache if cache_key else None
+        cached = cache.get(cache_key) if cache else None
+        if cached:
+            request.headers["If-None-Match"] = cached[0]
+        method = getattr(request, "methodId", "youtube")
+        metrics.inc("youtube_quota_units_total", method=method)
+        try:
+            with metrics.time("api_request_seconds", api="youtube", method=method):
+                result = request.execute(http=self.__http())
+        except HttpError as error:
+            metrics.inc(
+                "api_requests_total",
+                api="youtube",
+                method=method,
+                status=error.resp.status,
+            )
+            if cached and error.resp.status == 304:
+                self.yt_logger.debug(f"Not modified, using stored page: {cache_key}")
+                cache.revalidated += 1
+                metrics.inc("cache_requests_total", cache="youtube_pages", result="hit")
+                return cached[1]
+            raise
+        metrics.inc("api_requests_total", api="youtube", method=method, status=200)
+        if cache:
+            metrics.inc("cache_requests_total", cache="youtube_pages", result="miss")
+        if cache and "etag" in result:
+            cache.set(cache_key, result["etag"], result)
+        return result
+
+    def __fetch_playlist_snippet(self, youtube: "Resource", playlist_id) -> dict:
+        """
+        Calls Youtube API playlists.list once per playlist and keeps the snippet.
+
         Args:
             youtube (Youtube): Youtube API Class
             playlist_id (string): String identifier of playlist.
-            page_token (_type_, optional): _description_. Defaults to None.
 
         Returns:
-            result: contains nextPageToken if more than 300 items were found.
+            snippet: title and description of the playlist.
         """
-        self.yt_logger.debug(f"Fetching playlist name for ID: {playlist_id}")
-        result = (
-            youtube.playlists()
-            .list(
-                part="snippet", id=playlist_id, maxResults="300", pageToken=page_token
+        if playlist_id not in self._playlist_snippets:
+            self.yt_logger.debug(f"Fetching playlist snippet for ID: {playlist_id}")
+            request = youtube.playlists().list(
+                part="snippet", id=playlist_id, fields=PLAYLIST_FIELDS
             )
-            .execute()
-        )
-        self.yt_logger.debug(
-            f"Playlist name result: {result['items'][0]['snippet']['title']}"
-        )
-        return result["items"][0]["snippet"]["title"]
-    
+            result = self.__execute(request, f"playlists:{playlist_id}")
+            self._playlist_snippets[playlist_id] = result["items"][0]["snippet"]
+        return self._playlist_snippets[playlist_id]
 
-    def __fetch_playlist_description(
-        self, youtube: Resource, playlist_id, page_token=None
-    ) -> str:
+    def __fetch_playlist_name(self, youtube: "Resource", playlist_id) -> str:
         """
         Args:
             youtube (Youtube): Youtube API Class
             playlist_id (string): String identifier of playlist.
-            page_token (_type_, optional): _description_. Defaults to None.
 
         Returns:
-            result: contains nextPageToken if more than 300 items were found.
+            title: the playlist's title.
         """
-        self.yt_logger.debug(f"Fetching playlist description for ID: {playlist_id}")
-        result = (
-            youtube.playlists()
-            .list(
-                part="snippet", id=playlist_id, maxResults="300", pageToken=page_token
-            )
-            .execute()
-        )
-        self.yt_logger.debug(
-            f"Playlist description result: {result['items'][0]['snippet']['description']}"
-        )
-        return result["items"][0]["snippet"]["description"]
+        title = self.__fetch_playlist_snippet(youtube, playlist_id)["title"]
+        self.yt_logger.debug(f"Playlist name result: {title}")
+        return title
+
+    def __fetch_playlist_description(self, youtube: "Resource", playlist_id) -> str:
+        """
+        Args:
+            youtube (Youtube): Youtube API Class
+            playlist_id (string): String identifier of playlist.
 
+        Returns:
+            description: the playlist's description.
+        """
+        description = self.__fetch_playlist_snippet(youtube, playlist_id)["description"]
+        self.yt_logger.debug(f"Playlist description result: {description}")
+        return description
+
+    def __fetch_video_snippets(self, youtube: "Resource", video_ids: list) -> dict:
+        """
+        Calls Youtube API videos.list for up to 50 videos per request.
+
+        Args:
+            youtube (Youtube): Youtube API Class
+            video_ids (list): Video IDs of a playlist page.
 
-    def __fetch_songs(self, youtube: Resource, playlist_id, page_token=None):
+        Returns:
+            dict: snippet of each video with its duration, keyed by video ID.
         """
-        Calls Youtube API playlistItems to obtain title and video id and populate song list (@ Youtube.songs)
-        Parses the title to obtain artist and song name.
-        Priority via yt-dlp first for song and artist metadata.
-        Fallback to youtube_title_parser libary to obtain song,artist
+        snippets = {}
+        for start in range(0, len(video_ids), VIDEOS_PER_REQUEST):
+            request = youtube.videos().list(
+                part="snippet,contentDetails",
+                id=",".join(video_ids[start : start + VIDEOS_PER_REQUEST]),
+                fields=VIDEOS_FIELDS,
+                maxResults=VIDEOS_PER_REQUEST,
+            )
+            result = self.__execute(request)
+            for item in result.get("items", []):
+                snippets[item["id"]] = dict(
+                    item["snippet"],
+                    duration=parse_iso8601_duration(
+                        item.get("contentDetails", {}).get("duration")
+                    ),
+                )
+        return snippets
+
+    def __fetch_items(self, youtube: "Resource", playlist_id, page_token=None):
+        """
+        Calls Youtube API playlistItems to obtain title and video id of one page.
 
         Args:
             youtube (Youtube): Youtube API Class
             playlist_id (string): String identifier of playlist.
-            ydl_input_ops (Dict): Arguments of yt-dlp command line call.
             page_token (_type_, optional): _description_. Defaults to None.
 
         Returns:
-            result: contains nextPageToken if more than 300 items were found.
+            result: contains nextPageToken if the playlist has more pages.
         """
         self.yt_logger.debug(
             f"Fetching songs for playlist: {playlist_id} PageToken: {page_token}"
         )
-        result = (
-            youtube.playlistItems()
-            .list(
-                part="snippet",
-                playlistId=playlist_id,
-                maxResults="300",
-                pageToken=page_token,
-            )
-            .execute()
+        request = youtube.playlistItems().list(
+            part="snippet",
+            playlistId=playlist_id,
+            maxResults=PLAYLIST_ITEMS_PER_REQUEST,
+            pageToken=page_token,
+            fields=PLAYLIST_ITEMS_FIELDS,
+        )
+        result = self.__execute(
+            request, f"playlistItems:{playlist_id}:{page_token or ''}"
         )
-        for item in result["items"]:
-            api_song_title = item["snippet"]["title"]
-            video_id = item["snippet"]["resourceId"]["videoId"]
-            self.yt_logger.debug(f"API Title: {api_song_title}, Video ID: {video_id}")
-            print(f"Youtube API - Title {api_song_title} Video ID {video_id}")
-            try:
-                track_info = self.__get_artist_title_ytdlp(
-                    video_id,
-                )
-                if not track_info:
-                    self.yt_logger.debug(
-                        f"No track info found - Title {api_song_title} - Video ID {video_id}"
-                    )
-                    raise YtDlpParseError
-                else:
-                    self.songs.append(
-                        clean_song_info(
-                            Song(str(track_info["artist"]), str(track_info["title"]))
-                        )
-                    )
-
-            except YtDlpParseError:
-                try:  # TODO: Handle none for artist.
-                    artist, title = get_artist_title(api_song_title)
-                    if not artist or not title:
-                        raise SongInfoNotFoundError
-                    else:
-                        self.songs.append(
-                            clean_song_info(Song(str(artist), str(title)))
-                        )
-                except (TypeError, SongInfoNotFoundError):
-                    print(f"Error parsing Track and Title {api_song_title}")
         self.yt_logger.debug(f"Fetched {len(result['items'])} items from playlist.")
         return result
 
-    def get_songs_from_playlist(self, playlist_id: str):
+    def iter_playlist_pages(
+        self, playlist_id: str, skip_video_ids=(), page_token=None, on_page=None
+    ):
+        """Yield the items of a playlist one page at a time.
+
+        Args:
+            playlist_id (str): Youtube Playlist ID
+            skip_video_ids (Collection, optional): Video IDs to leave out, e.g. already synced ones.
+            page_token (str, optional): Token of the page to start from, e.g. to resume a run.
+            on_page (Callable, optional): Called with the token of each page,
+                the token of the next one (None on the last page) and the IDs
+                of the yielded items, before the page is yielded.
+
+        Yields:
+            list[PlaylistItem]: video id and title of each remaining item of a page.
+        """
+        youtube = self.youtube
+        while True:
+            result = self.__fetch_items(youtube, playlist_id, page_token)
+            items = [
+                PlaylistItem(
+                    item["snippet"]["resourceId"]["videoId"], item["snippet"]["title"]
+                )
+                for item in result["items"]
+                if item["snippet"]["resourceId"]["videoId"] not in skip_video_ids
+            ]
+            if on_page:
+                on_page(
+                    page_token,
+                    result.get("nextPageToken"),
+                    [item.video_id for item in items],
+                )
+            yield items
+            if "nextPageToken" not in result:  # Executes until no more pages.
+                break
+            page_token = result["nextPageToken"]
+
+    def extract_songs(
+        self, items: list[PlaylistItem], strategy: str = YTDLP_FIRST
+    ) -> list[Song | None]:
+        """
+        Parses the titles of a page of playlist items to obtain artist and song name.
+        Priority via a batched videos.list lookup (Topic channels, "Provided to YouTube" descriptions, tags).
+        Then, with the ytdlp-first strategy, yt-dlp for the videos it could not
+        resolve and the youtube_title_parser libary as a fallback. With
+        parse-first, the title parser comes first and yt-dlp only extracts the
+        videos whose title could not be parsed.
+
+        Args:
+            items (list[PlaylistItem]): One page of playlist items.
+            strategy (str, optional): YTDLP_FIRST or PARSE_FIRST.
+
+        Returns:
+            list[Song | None]: Raw (not yet cleaned) song of each item, None if it could not be parsed.
+        """
+        video_ids = [item.video_id for item in items]
+        snippets = self.__fetch_video_snippets(self.youtube, video_ids)
+        songs = {}
+        for video_id, snippet in snippets.items():
+            song = track_from_video_snippet(snippet)
+            if song:
+                song.video_id, song.source = video_id, "videos_list"
+                songs[video_id] = song
+        self.yt_logger.debug(
+            f"Resolved {len(songs)} of {len(video_ids)} items from videos.list"
+        )
+
+        # The page is extracted at once so yt-dlp workers can run in parallel.
+        steps = [self.__songs_from_title, self.extract_songs_ytdlp]
+        if strategy == YTDLP_FIRST:
+            steps.reverse()
+        for step in steps:
+            rest = [item for item in items if item.video_id not in songs]
+            if not rest:
+                break
+            for item, song in zip(rest, step(rest)):
+                if song:
+                    songs[item.video_id] = song
+
+        for item in items:
+            song = songs.get(item.video_id)
+            if song:
+                metrics.inc("titles_parsed_total", source=song.source)
+            else:
+                self.yt_logger.debug("Error parsing Track and Title: %s", item.title)
+                metrics.inc("titles_parsed_total", source="failed")
+        return [songs.get(video_id) for video_id in video_ids]
+
+    def extract_songs_ytdlp(self, items: list[PlaylistItem]) -> list[Song | None]:
+        """Extract the songs of playlist items with yt-dlp only.
+
+        Args:
+            items (list[PlaylistItem]): Playlist items, e.g. whose parsed
+                title found no confident match.
+
+        Returns:
+            list[Song | None]: Raw song of each item, None if yt-dlp has no
+                track information.
+        """
+        video_infos = self.ytdl.get_yt_metadata_many([item.video_id for item in items])
+        songs = []
+        for item, video_info in zip(items, video_infos):
+            self.yt_logger.debug("API Title: %s, Video ID: %s", item.title, item.video_id)
+            track_info = self.__get_artist_title_ytdlp(video_info)
+            if not track_info:
+                self.yt_logger.debug(
+                    "No track info found - Title %s - Video ID %s",
+                    item.title,
+                    item.video_id,
+                )
+                songs.append(None)
+                continue
+            songs.append(
+                Song(
+                    str(track_info["artist"]),
+                    str(track_info["title"]),
+                    item.video_id,
+                    video_info.get("duration"),
+                    "ytdlp",
+                )
+            )
+        return songs
+
+    def __songs_from_title(self, items: list[PlaylistItem]) -> list[Song | None]:
+        songs = []
+        for item in items:
+            parsed = parse_title(item.title)
+            songs.append(Song(*parsed, item.video_id, source="title") if parsed else None)
+        return songs
+
+    def get_songs_from_playlist(self, playlist_id: str, skip_video_ids=()):
         """Execute search for video items from playlistItems or YoutubeDLP
         Args:
             playlist_id (str): Youtube Playlist ID
+            skip_video_ids (Collection, optional): Video IDs to leave out, e.g. already synced ones.
         Returns:
             songs (list): list of all songs found using ytldp or Youtube API
         """
-        youtube = self.youtube
-        result = self.__fetch_songs(youtube, playlist_id)
-        while "nextPageToken" in result:  # Executes until no more pages.
-            page_token = result["nextPageToken"]
-            result = self.__fetch_songs(youtube, playlist_id, page_token)
-        return self.songs
+        songs = []
+        for items in self.iter_playlist_pages(playlist_id, skip_video_ids):
+            songs.extend(
+                clean_song_info(song) for song in self.extract_songs(items) if song
+            )
+        return songs
 
     def get_playlist_title(self, playlist_id: str):
         """_summary_
@@ -258,6 +526,36 @@ class Youtube:
         youtube = self.youtube
         return self.__fetch_playlist_description(youtube, playlist_id)
 
+    def get_playlist_versions(self, playlist_ids: list[str]) -> dict[str, str]:
+        """
+        Cheap change detection: one playlists.list call per 50 playlists.
+
+        The version combines the item count with the ETag of the playlist
+        resource, so added, removed or edited items change it without reading
+        any playlist page.
+
+        Args:
+            playlist_ids (list[str]): Youtube Playlist IDs
+
+        Returns:
+            dict[str, str]: Version of each playlist; missing (deleted or
+                private) playlists are left out.
+        """
+        youtube = self.youtube
+        versions = {}
+        for start in range(0, len(playlist_ids), PLAYLISTS_PER_REQUEST):
+            request = youtube.playlists().list(
+                part="contentDetails",
+                id=",".join(playlist_ids[start : start + PLAYLISTS_PER_REQUEST]),
+                fields=PLAYLIST_VERSION_FIELDS,
+                maxResults=PLAYLISTS_PER_REQUEST,
+            )
+            result = self.__execute(request)
+            for item in result.get("items", []):
+                item_count = item.get("contentDetails", {}).get("itemCount")
+                versions[item["id"]] = f"{item_count}:{item.get('etag')}"
+        return versions
+
 
 if __name__ == "__main__":
     yt = Youtube()
@@ -1,5 +1,12 @@
+from concurrent.futures import ThreadPoolExecutor
+import threading
 from tools.app_logger import setup_logger
-import yt_dlp
+from tools.metadata import MetadataStore
+from tools.metrics import metrics
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import yt_dlp
 
 
 class MetaDataNotAvailable(Exception):
@@ -7,11 +14,38 @@ class MetaDataNotAvailable(Exception):
 
 
 class VideoTitleExtractor:
+    """Extracts video metadata with yt-dlp.
+
+    Each worker thread keeps one long-lived YoutubeDL instance, and
+    ``get_yt_metadata_many`` spreads a batch of videos over ``workers``
+    threads while keeping the input order. With a ``store``, videos that
+    were extracted before are answered from it without yt-dlp.
+    """
 
-    def __init__(self, yt_dl_args: dict):
+    def __init__(
+        self, yt_dl_args: dict, workers: int = 1, store: MetadataStore | None = None
+    ):
         self.videoinfo = ""
         self.yt_opts = yt_dl_args
+        self.workers = workers
+        self.store = store
         self.logger = setup_logger(__name__)
+        self._local = threading.local()
+        self._instances = []
+        self._instances_lock = threading.Lock()
+        self._executor = None
+
+    @property
+    def ydl(self) -> "yt_dlp.YoutubeDL":
+        """YoutubeDL instance owned by the calling thread"""
+        if not hasattr(self._local, "ydl"):
+            # yt-dlp is slow to import and many runs never need it.
+            import yt_dlp
+
+            self._local.ydl = yt_dlp.YoutubeDL(self.yt_opts)
+            with self._instances_lock:
+                self._instances.append(self._local.ydl)
+        return self._local.ydl
 
     def process_video_track(self, video_item: dict) -> tuple:
         """Process a dictionary of metadata and return None or song_name, artist"""
@@ -29,16 +63,57 @@ class VideoTitleExtractor:
     def get_yt_metadata(self, video_id: str) -> dict:
         """Run ytdlp library on given Youtube video id and return video metadata
 
+        The metadata store is checked first, and new responses are added to it.
+
         Args:
             video_id (str): Youtube video id
 
         Returns:
-            dict: ytdlp response
+            dict: ytdlp response, or its stored fields
         """
+        if self.store:
+            video_info = self.store.get(video_id)
+            if video_info is not None:
+                return video_info
+
         youtube_url = f"https://www.youtube.com/watch?v={video_id}"
-        self.logger.debug(f"Extracting metadata for video ID: {video_id}")
-        video_info = yt_dlp.YoutubeDL(self.yt_opts).extract_info(
-            youtube_url, download=True
-        )
-        self.logger.debug(f"Metadata extraction complete for: {video_id}")
+        self.logger.debug("Extracting metadata for video ID: %s", video_id)
+        with metrics.time("ytdlp_extract_seconds"):
+            video_info = self.ydl.extract_info(youtube_url, download=True)
+        self.logger.debug("Metadata extraction complete for: %s", video_id)
+        # Failed extractions (None with ignoreerrors) are retried next time.
+        if self.store and video_info:
+            self.store.set(video_id, video_info)
         return video_info
+
+    def get_yt_metadata_many(self, video_ids: list[str]) -> list[dict]:
+        """Run ytdlp on several videos, in parallel when workers > 1
+
+        Args:
+            video_ids (list[str]): Youtube video ids
+
+        Returns:
+            list[dict]: ytdlp responses, in the order of ``video_ids``
+        """
+        if self.workers <= 1:
+            return [self.get_yt_metadata(video_id) for video_id in video_ids]
+
+        # Several pipelines (batch mode) may share one extractor.
+        with self._instances_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.workers, thread_name_prefix="ytdlp"
+                )
+            executor = self._executor
+        return list(executor.map(self.get_yt_metadata, video_ids))
+
+    def close(self):
+        """Stop the worker threads and release their YoutubeDL instances"""
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+        with self._instances_lock:
+            for ydl in self._instances:
+                ydl.close()
+            self._instances.clear()
+        self._local = threading.local()
@@ -0,0 +1,94 @@
+"""Micro-benchmark of YouTube title parsing and normalization.
+
+Compares the original per-call implementation (youtube_title_parse followed by
+seven sequential ``re.sub`` calls) with ``tools.normalize`` over the title
+corpus, checks that both produce identical output, and reports cold (empty
+cache) and warm throughput.
+
+Usage:
+    python benchmarks/bench_normalize.py [--repeat N] [--corpus PATH]
+"""
+import argparse
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+from tools.normalize import normalize_artist_title, parse_title  # noqa: E402
+from youtube_title_parse import get_artist_title  # noqa: E402
+
+CORPUS = os.path.join(os.path.dirname(__file__), "corpus", "titles.txt")
+
+
+def legacy_parse(video_title: str):
+    try:
+        artist, title = get_artist_title(video_title)
+    except TypeError:
+        return None
+    if not artist or not title:
+        return None
+    return str(artist), str(title)
+
+
+def legacy_normalize(artist: str, title: str):
+    title = re.sub(r"\(.*", "", title)
+    title = re.sub(r"ft.*", "", title)
+    title = re.sub(r",.*", "", title)
+    artist = re.sub(r"\sx\s.*", "", artist)
+    artist = re.sub(r"\(.*", "", artist)
+    artist = re.sub(r"ft.*", "", artist)
+    artist = re.sub(r",.*", "", artist)
+    return artist.strip(), title.strip()
+
+
+def run(titles, parse, normalize):
+    results = []
+    for video_title in titles:
+        parsed = parse(video_title)
+        results.append(normalize(*parsed) if parsed else None)
+    return results
+
+
+def timed(titles, parse, normalize, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        results = run(titles, parse, normalize)
+    elapsed = time.perf_counter() - started
+    return results, len(titles) * repeat / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--corpus", default=CORPUS)
+    args = parser.parse_args()
+
+    with open(args.corpus, encoding="utf-8") as corpus:
+        titles = [line.strip() for line in corpus if line.strip()]
+
+    legacy, legacy_rate = timed(titles, legacy_parse, legacy_normalize, args.repeat)
+
+    parse_title.cache_clear()
+    normalize_artist_title.cache_clear()
+    compiled, cold_rate = timed(titles, parse_title, normalize_artist_title, 1)
+    _, warm_rate = timed(titles, parse_title, normalize_artist_title, args.repeat)
+
+    mismatches = [
+        (title, old, new)
+        for title, old, new in zip(titles, legacy, compiled)
+        if old != new
+    ]
+    for title, old, new in mismatches:
+        print(f"MISMATCH {title!r}: {old!r} != {new!r}")
+
+    print(f"corpus:  {len(titles)} titles, {len(mismatches)} mismatches")
+    print(f"legacy:  {legacy_rate:12,.0f} titles/s")
+    print(f"cold:    {cold_rate:12,.0f} titles/s")
+    print(f"warm:    {warm_rate:12,.0f} titles/s ({warm_rate / legacy_rate:.0f}x)")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,205 @@
+"""End-to-end benchmark of the archive pipeline against local stand-ins.
+
+Runs ``ArchivePipeline`` with the real ``Youtube``, ``Spotify`` and
+``PlaylistWriter`` clients, pointed at the stand-in servers of
+``standins.py``, over synthetic playlists of the requested sizes. Every size
+runs in a fresh process, so its peak RSS is measured on its own, and the
+stand-in server runs in another process.
+
+Reports throughput, p50/p99 latency per pipeline stage (per page of 50
+items) and per API, request and 429 counts, and peak RSS.
+
+Usage:
+    python benchmarks/bench_pipeline.py --sizes 100,1000,10000,50000
+    python benchmarks/bench_pipeline.py --sizes 1000 --throttle-ratio 0.05 --json out.json
+    python benchmarks/bench_pipeline.py --sizes 1000 --strategy parse-first
+"""
+import argparse
+from dataclasses import asdict
+import json
+import multiprocessing
+import os
+import queue
+import resource
+import sys
+import time
+
+# The API key only has to be set; the stand-ins do not check it.
+os.environ.setdefault("YOUTUBE_API_KEY", "benchmark")
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+from standins import FakeExtractor, StandInConfig, serve  # noqa: E402
+from tools.app_logger import set_log_level  # noqa: E402
+from tools.metrics import metrics  # noqa: E402
+from tools.pipeline import STAGE_FUNCTIONS, ArchivePipeline  # noqa: E402
+from tools.spotify import PlaylistWriter, Spotify  # noqa: E402
+from tools.transport import DEFAULT_POOL_SIZE  # noqa: E402
+from tools.youtube import STRATEGIES, YTDLP_FIRST, Youtube  # noqa: E402
+
+STAGES = tuple(STAGE_FUNCTIONS)
+
+
+def quantiles(histogram) -> dict:
+    if not histogram:
+        return {"count": 0, "p50_ms": None, "p99_ms": None}
+    return {
+        "count": histogram.count,
+        "p50_ms": histogram.quantile(0.5) * 1000,
+        "p99_ms": histogram.quantile(0.99) * 1000,
+    }
+
+
+def run_size(size: int, base_url: str, options: dict, results) -> None:
+    """Archive one synthetic playlist and put its measurements on ``results``."""
+    set_log_level("ERROR")
+    config = StandInConfig(**options["config"])
+    youtube = Youtube({}, api_endpoint=base_url)
+    youtube.ytdl = FakeExtractor(config, workers=options["ytdlp_workers"])
+    spotify = Spotify(
+        auth_mode="client",
+        pool_size=max(options["concurrency"], DEFAULT_POOL_SIZE),
+        base_url=f"{base_url}/v1",
+        rate_limit=options["rate_limit"],
+    )
+    # The stand-in accepts any token; skip the OAuth flow.
+    spotify.spotify.user_id = "benchmark"
+    spotify.spotify._token_info = {
+        "access_token": "benchmark",
+        "expires_at": time.time() + 24 * 60 * 60,
+    }
+    writer = None if options["dryrun"] else PlaylistWriter(spotify, "benchmark")
+    pipeline = ArchivePipeline(
+        youtube,
+        spotify,
+        writer,
+        concurrency=options["concurrency"],
+        strategy=options["strategy"],
+    )
+
+    started = time.perf_counter()
+    stats = pipeline.run(f"PLbench{size}")
+    elapsed = time.perf_counter() - started
+    youtube.ytdl.close()
+    spotify.http.close()
+
+    results.put(
+        {
+            "size": size,
+            "seconds": elapsed,
+            "items_per_second": stats.items / elapsed,
+            "stats": asdict(stats),
+            "stages": {
+                stage: quantiles(metrics.histogram("stage_seconds", stage=stage))
+                for stage in STAGES
+            },
+            "apis": {
+                "youtube": quantiles(
+                    metrics.histogram(
+                        "api_request_seconds",
+                        api="youtube",
+                        method="youtube.playlistItems.list",
+                    )
+                ),
+                "spotify_search": quantiles(
+                    metrics.histogram("api_request_seconds", api="spotify", method="GET")
+                ),
+                "ytdlp": quantiles(metrics.histogram("ytdlp_extract_seconds")),
+            },
+            "youtube_quota_units": metrics.total("youtube_quota_units_total"),
+            "spotify_requests": metrics.total("api_requests_total", api="spotify"),
+            "spotify_429s": spotify.scheduler.throttled,
+            # ru_maxrss is in KiB on Linux.
+            "peak_rss_mib": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        }
+    )
+
+
+def print_report(result: dict) -> None:
+    stats = result["stats"]
+    print(
+        f"{result['size']:>7} items  {result['seconds']:8.2f}s  "
+        f"{result['items_per_second']:9.1f} items/s  "
+        f"resolved {stats['resolved']}  added {stats['added']}  "
+        f"quota {result['youtube_quota_units']:g}  "
+        f"spotify requests {result['spotify_requests']:g} "
+        f"({result['spotify_429s']} x 429)  "
+        f"yt-dlp extractions {result['apis']['ytdlp']['count']}  "
+        f"peak RSS {result['peak_rss_mib']:.1f} MiB"
+    )
+    for name, latency in list(result["stages"].items()) + list(result["apis"].items()):
+        if latency["count"]:
+            print(
+                f"{'':>9}{name:<15} n={latency['count']:<7} "
+                f"p50 {latency['p50_ms']:9.2f} ms  p99 {latency['p99_ms']:9.2f} ms"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="100,1000,10000")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--ytdlp-workers", type=int, default=4)
+    parser.add_argument("--rate-limit", type=float, default=1000.0)
+    parser.add_argument("--youtube-latency-ms", type=float, default=20.0)
+    parser.add_argument("--spotify-latency-ms", type=float, default=20.0)
+    parser.add_argument("--ytdlp-latency-ms", type=float, default=50.0)
+    parser.add_argument("--throttle-ratio", type=float, default=0.0)
+    parser.add_argument("--retry-after", type=float, default=0.05)
+    parser.add_argument("--snippet-ratio", type=float, default=0.5)
+    parser.add_argument("--ytdlp-hit-ratio", type=float, default=0.5)
+    parser.add_argument("--strategy", choices=STRATEGIES, default=YTDLP_FIRST)
+    parser.add_argument("--dryrun", action="store_true")
+    parser.add_argument("--json", help="Also write the results to this file.")
+    args = parser.parse_args()
+
+    config = StandInConfig(
+        youtube_latency=args.youtube_latency_ms / 1000,
+        spotify_latency=args.spotify_latency_ms / 1000,
+        ytdlp_latency=args.ytdlp_latency_ms / 1000,
+        throttle_ratio=args.throttle_ratio,
+        retry_after=args.retry_after,
+        snippet_ratio=args.snippet_ratio,
+        ytdlp_hit_ratio=args.ytdlp_hit_ratio,
+    )
+    options = {
+        "config": asdict(config),
+        "concurrency": args.concurrency,
+        "ytdlp_workers": args.ytdlp_workers,
+        "rate_limit": args.rate_limit,
+        "strategy": args.strategy,
+        "dryrun": args.dryrun,
+    }
+
+    context = multiprocessing.get_context("spawn")
+    ports = context.Queue()
+    server = context.Process(target=serve, args=(asdict(config), ports), daemon=True)
+    server.start()
+    base_url = f"http://127.0.0.1:{ports.get(timeout=30)}"
+
+    reports = []
+    try:
+        for size in (int(size) for size in args.sizes.split(",")):
+            results = context.Queue()
+            run = context.Process(target=run_size, args=(size, base_url, options, results))
+            run.start()
+            report = None
+            while report is None and (run.is_alive() or not results.empty()):
+                try:
+                    report = results.get(timeout=1)
+                except queue.Empty:
+                    pass
+            run.join()
+            if report is None:
+                sys.exit(f"Benchmark of {size} items failed")
+            print_report(report)
+            reports.append(report)
+    finally:
+        server.terminate()
+
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump({"options": options, "results": reports}, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
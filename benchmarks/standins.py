@@ -0,0 +1,238 @@
+"""Local stand-ins for the YouTube Data API, the Spotify Web API and yt-dlp.
+
+Playlists are synthetic: the ID ``PLbench<N>`` names a playlist of N items.
+Item ``i`` is "Song i" by "Artist <i % ARTISTS>", so every stand-in can answer
+deterministically without shared state:
+
+* ``playlists`` / ``playlistItems`` / ``videos`` serve 50-item pages. A
+  ``snippet_ratio`` share of the videos comes from "Artist - Topic" channels
+  and resolves from videos.list; the rest needs yt-dlp or title parsing.
+* Spotify ``/search`` returns the matching track plus a decoy, and
+  ``/playlists/<id>/tracks`` accepts every insert.
+* ``FakeExtractor`` replaces yt-dlp and answers with the track metadata of
+  a ``ytdlp_hit_ratio`` share of the videos it is asked about.
+
+Latency and the share of Spotify requests answered with 429 are configurable.
+"""
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from urllib.parse import parse_qs, urlparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+from tools.metrics import metrics  # noqa: E402
+from tools.ytdlp import VideoTitleExtractor  # noqa: E402
+
+PAGE_SIZE = 50
+ARTISTS = 997
+QUERY = re.compile(r"(Song \d+) (Artist \d+)")
+
+
+@dataclass
+class StandInConfig:
+    youtube_latency: float = 0.0
+    spotify_latency: float = 0.0
+    ytdlp_latency: float = 0.0
+    throttle_ratio: float = 0.0
+    retry_after: float = 0.05
+    snippet_ratio: float = 0.5
+    ytdlp_hit_ratio: float = 0.5
+
+
+def artist_of(index: int) -> str:
+    return f"Artist {index % ARTISTS}"
+
+
+def video_id_of(index: int) -> str:
+    return f"vid{index:07d}"
+
+
+def index_of(video_id: str) -> int:
+    return int(video_id[3:])
+
+
+def from_snippet(index: int, config: StandInConfig) -> bool:
+    return (index * 7919 % 100) < config.snippet_ratio * 100
+
+
+def playlist_size(playlist_id: str) -> int:
+    return int(playlist_id.removeprefix("PLbench") or 0)
+
+
+class StandInServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    config = StandInConfig()
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        endpoint = url.path.rstrip("/").rsplit("/", 1)[-1]
+        if url.path.startswith("/youtube/"):
+            time.sleep(self.config.youtube_latency)
+            handler = getattr(self, f"_youtube_{endpoint}", None)
+            return self._send(*handler(query)) if handler else self._send(404, {})
+        if self._throttled():
+            return
+        if endpoint == "search":
+            return self._send(200, self._spotify_search(query))
+        if endpoint == "tracks":
+            return self._send(200, {"total": 0, "items": []})
+        if endpoint == "me":
+            return self._send(200, {"id": "bench"})
+        return self._send(404, {})
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self._throttled():
+            return
+        if self.path.endswith("/tracks"):
+            return self._send(201, {"snapshot_id": "bench"})
+        if self.path.endswith("/playlists"):
+            return self._send(201, {"id": "bench-playlist"})
+        return self._send(404, {})
+
+    def _throttled(self) -> bool:
+        time.sleep(self.config.spotify_latency)
+        if random.random() >= self.config.throttle_ratio:
+            return False
+        self._send(429, {}, {"Retry-After": str(self.config.retry_after)})
+        return True
+
+    def _youtube_playlists(self, query):
+        items = [
+            {
+                "id": playlist_id,
+                "etag": f"etag-{playlist_id}",
+                "snippet": {
+                    "title": f"Benchmark {playlist_id}",
+                    "description": "Synthetic playlist",
+                },
+                "contentDetails": {"itemCount": playlist_size(playlist_id)},
+            }
+            for playlist_id in query["id"].split(",")
+        ]
+        return 200, {"etag": query["id"], "items": items}
+
+    def _youtube_playlistItems(self, query):
+        size = playlist_size(query["playlistId"])
+        start = int(query.get("pageToken") or 0)
+        end = min(start + PAGE_SIZE, size)
+        items = [
+            {
+                "snippet": {
+                    "title": f"{artist_of(index)} - Song {index} (Official Video)",
+                    "resourceId": {"videoId": video_id_of(index)},
+                }
+            }
+            for index in range(start, end)
+        ]
+        body = {"etag": f"{start}-{size}", "items": items}
+        if end < size:
+            body["nextPageToken"] = str(end)
+        return 200, body
+
+    def _youtube_videos(self, query):
+        items = []
+        for video_id in query["id"].split(","):
+            index = index_of(video_id)
+            channel = (
+                f"{artist_of(index)} - Topic"
+                if from_snippet(index, self.config)
+                else "Some Channel"
+            )
+            items.append(
+                {
+                    "id": video_id,
+                    "snippet": {
+                        "title": f"Song {index}",
+                        "description": "",
+                        "channelTitle": channel,
+                    },
+                    "contentDetails": {"duration": f"PT3M{index % 60}S"},
+                }
+            )
+        return 200, {"items": items}
+
+    def _spotify_search(self, query):
+        match = QUERY.search(query.get("q", ""))
+        if not match:
+            return {"tracks": {"items": []}}
+        song, artist = match.groups()
+        index = int(song.split()[1])
+        tracks = [
+            {
+                "uri": f"spotify:track:decoy{index}",
+                "name": f"{song} - Instrumental",
+                "artists": [{"name": "Someone Else"}],
+                "duration_ms": 60_000,
+            },
+            {
+                "uri": f"spotify:track:{index}",
+                "name": song,
+                "artists": [{"name": artist}],
+                "duration_ms": (180 + index % 60) * 1000,
+            },
+        ]
+        return {"tracks": {"items": tracks}}
+
+    def _send(self, status: int, body: dict, headers: dict | None = None):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(config: dict, ports) -> None:
+    """Run the stand-in server until the process is terminated.
+
+    Meant to be the target of a separate process, so the memory of the server
+    does not count towards the benchmarked process.
+    """
+    StandInHandler.config = StandInConfig(**config)
+    server = StandInServer(("127.0.0.1", 0), StandInHandler)
+    ports.put(server.server_port)
+    server.serve_forever()
+
+
+def start_in_thread(config: StandInConfig) -> tuple[StandInServer, str]:
+    """Run the stand-in server in a daemon thread and return it with its URL."""
+    StandInHandler.config = config
+    server = StandInServer(("127.0.0.1", 0), StandInHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+class FakeExtractor(VideoTitleExtractor):
+    """yt-dlp stand-in answering from the synthetic playlist."""
+
+    def __init__(self, config: StandInConfig, workers: int = 1):
+        super().__init__({}, workers=workers)
+        self.config = config
+
+    def get_yt_metadata(self, video_id: str) -> dict:
+        with metrics.time("ytdlp_extract_seconds"):
+            time.sleep(self.config.ytdlp_latency)
+        index = index_of(video_id)
+        info = {"id": video_id, "duration": 180 + index % 60}
+        if (index * 104729 % 100) < self.config.ytdlp_hit_ratio * 100:
+            info.update(artist=artist_of(index), track=f"Song {index}")
+        return info
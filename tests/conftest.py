@@ -0,0 +1,13 @@
+import pytest
+from app.tools import app_logger
+from tools import app_logger as tools_app_logger
+
+
+@pytest.fixture(autouse=True, scope="session")
+def log_dir(tmp_path_factory):
+    """Write the log files of the run under a temporary directory, not ./logs."""
+    directory = str(tmp_path_factory.mktemp("logs"))
+    with pytest.MonkeyPatch.context() as patch:
+        for module in (app_logger, tools_app_logger):
+            patch.setattr(module, "LOG_DIR", directory)
+        yield directory
@@ -0,0 +1,31 @@
+import logging
+from app.tools.app_logger import PerLoggerFileHandler, set_log_level, setup_logger
+
+
+def test_repeated_setup_does_not_duplicate_handlers():
+    first = setup_logger("tests.repeated")
+    second = setup_logger("tests.repeated")
+    assert first is second
+    assert len(second.handlers) == 1
+    assert not second.propagate
+
+
+def test_set_log_level_applies_to_existing_loggers():
+    logger = setup_logger("tests.level")
+    try:
+        set_log_level("debug")
+        assert logger.isEnabledFor(logging.DEBUG)
+        set_log_level("WARNING")
+        assert not logger.isEnabledFor(logging.INFO)
+    finally:
+        set_log_level("INFO")
+
+
+def test_records_are_written_per_logger_name(tmp_path):
+    handler = PerLoggerFileHandler(str(tmp_path))
+    handler.setFormatter(logging.Formatter("%(levelname)s - %(message)s"))
+    for name in ("tools.spotify", "tools.youtube"):
+        handler.handle(logging.makeLogRecord({"name": name, "msg": "hello %s", "args": (name,), "levelname": "INFO"}))
+    handler.close()
+    assert (tmp_path / "tools.spotify.log").read_text() == "INFO - hello tools.spotify\n"
+    assert (tmp_path / "tools.youtube.log").exists()
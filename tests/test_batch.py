@@ -0,0 +1,39 @@
+import argparse
+import io
+from app import main
+from app.main import archive_batch, read_batch
+
+
+def test_read_batch_skips_comments_blanks_and_duplicates(tmp_path):
+    batch = tmp_path / "playlists.txt"
+    batch.write_text("# channel playlists\nPL1\n\nhttps://www.youtube.com/playlist?list=PL2\nPL1\n")
+    assert read_batch(str(batch)) == ["PL1", "https://www.youtube.com/playlist?list=PL2"]
+
+
+def test_read_batch_from_stdin(monkeypatch):
+    monkeypatch.setattr("sys.stdin", io.StringIO("PL1\nPL2\n"))
+    assert read_batch("-") == ["PL1", "PL2"]
+
+
+def test_failed_playlist_does_not_stop_the_batch(monkeypatch):
+    seen = []
+
+    def archive_playlist(
+        youtube_url, sp, yt, args, logger, playlist_name=None, state=None, profiler=None
+    ):
+        seen.append((youtube_url, sp, yt))
+        if youtube_url == "PLbroken":
+            raise RuntimeError("quota exceeded")
+        return youtube_url.lower()
+
+    class Logger:
+        def error(self, message):
+            pass
+
+    monkeypatch.setattr(main, "archive_playlist", archive_playlist)
+    args = argparse.Namespace(parallel_playlists=2)
+    outcomes = archive_batch(["PL1", "PLbroken", "PL3"], "sp", "yt", args, Logger())
+    assert list(outcomes) == ["PL1", "PLbroken", "PL3"]
+    assert outcomes["PL1"] == "pl1" and outcomes["PL3"] == "pl3"
+    assert isinstance(outcomes["PLbroken"], RuntimeError)
+    assert {(sp, yt) for _, sp, yt in seen} == {("sp", "yt")}
@@ -0,0 +1,56 @@
+import time
+import pytest
+from app.tools.cache import PageCache, SearchCache, normalize_query
+
+
+@pytest.fixture
+def cache(tmp_path):
+    search_cache = SearchCache(str(tmp_path / "cache.sqlite"))
+    yield search_cache
+    search_cache.connection.close()
+
+
+def test_normalize_query():
+    assert normalize_query("  Daft  Punk ", "One More TIME") == "daft punk|one more time"
+
+
+def test_cache_round_trip(cache):
+    candidates = [{"uri": "spotify:track:1", "name": "Song", "artists": [{"name": "Artist"}]}]
+    assert cache.get("Artist", "Song") is None
+    cache.set("Artist", "Song", candidates)
+    assert cache.get("artist", " song ") == candidates
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_negative_results_expire_sooner(cache):
+    cache.negative_ttl = -1
+    cache.set("Artist", "Missing", [])
+    cache.set("Artist", "Found", [{"uri": "spotify:track:1"}])
+    assert cache.get("Artist", "Missing") is None
+    assert cache.get("Artist", "Found") == [{"uri": "spotify:track:1"}]
+
+
+def test_refresh_skips_reads(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    SearchCache(path).set("Artist", "Song", [])
+    refreshing = SearchCache(path, refresh=True)
+    assert refreshing.get("Artist", "Song") is None
+
+
+def test_evicts_least_recently_used(cache):
+    cache.max_entries = 2
+    for title in ("one", "two", "three"):
+        cache.set("Artist", title, [])
+        time.sleep(0.01)
+    cache.get("Artist", "one")
+    cache.evict()
+    assert cache.get("Artist", "two") is None
+    assert cache.get("Artist", "one") == []
+    assert cache.get("Artist", "three") == []
+
+
+def test_page_cache_round_trip(tmp_path):
+    pages = PageCache(str(tmp_path / "pages.sqlite"))
+    assert pages.get("playlistItems:PL1:") is None
+    pages.set("playlistItems:PL1:", "etag-1", {"items": [], "etag": "etag-1"})
+    assert pages.get("playlistItems:PL1:") == ("etag-1", {"items": [], "etag": "etag-1"})
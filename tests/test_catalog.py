@@ -0,0 +1,113 @@
+import json
+from unittest.mock import MagicMock
+import pytest
+from app.tools.catalog import CatalogIndex, catalog_text
+from app.tools.spotify import Spotify
+from app.tools.youtube import Song
+
+TRACKS = [
+    {
+        "uri": "spotify:track:1",
+        "name": "One More Time",
+        "artists": [{"name": "Daft Punk"}],
+        "duration_ms": 320_000,
+    },
+    {
+        "uri": "spotify:track:2",
+        "name": "One More Time - Radio Edit",
+        "artists": [{"name": "Daft Punk"}],
+        "duration_ms": 230_000,
+    },
+    {
+        "uri": "spotify:track:3",
+        "name": "Harder, Better, Faster, Stronger",
+        "artists": [{"name": "Daft Punk"}],
+        "duration_ms": 224_000,
+    },
+]
+
+
+@pytest.fixture
+def catalog(tmp_path):
+    index = CatalogIndex(str(tmp_path / "catalog.sqlite"))
+    yield index
+    index.close()
+
+
+def test_catalog_text():
+    assert catalog_text(["Daft Punk", "Romanthony"], "One More Time!") == (
+        "daft punk romanthony one more time"
+    )
+
+
+def test_add_skips_known_tracks(catalog):
+    assert catalog.add(TRACKS) == 3
+    assert catalog.add(TRACKS[:1]) == 0
+    assert len(catalog) == 3
+
+
+def test_lookup_needs_every_word(catalog):
+    catalog.add(TRACKS)
+    uris = [track["uri"] for track in catalog.lookup("daft punk", "ONE MORE TIME")]
+    assert sorted(uris) == ["spotify:track:1", "spotify:track:2"]
+    assert catalog.lookup("Daft Punk", "Around the World") == []
+    assert catalog.lookup("Daft Punk", "Harder Better Faster Stronger")[0] == TRACKS[2]
+
+
+def test_import_csv_and_jsonl(tmp_path, catalog):
+    dump = tmp_path / "dump.csv"
+    dump.write_text(
+        "uri,artists,title,duration\n"
+        "spotify:track:9,Simon & Garfunkel;Someone,The Boxer,308\n"
+    )
+    lines = tmp_path / "dump.jsonl"
+    lines.write_text(
+        json.dumps({"uri": "spotify:track:8", "artists": ["Nina Simone"], "name": "Sinnerman"})
+        + "\n"
+    )
+    assert catalog.import_file(str(dump)) == 1
+    assert catalog.import_file(str(lines)) == 1
+    assert catalog.lookup("Simon & Garfunkel", "The Boxer") == [
+        {
+            "uri": "spotify:track:9",
+            "name": "The Boxer",
+            "artists": [{"name": "Simon & Garfunkel"}, {"name": "Someone"}],
+            "duration_ms": 308_000,
+        }
+    ]
+    assert catalog.lookup("Nina Simone", "Sinnerman")[0]["uri"] == "spotify:track:8"
+
+
+def test_lookup_reads_the_closest_tracks_first(tmp_path):
+    catalog = CatalogIndex(str(tmp_path / "catalog.sqlite"), candidates=5)
+    catalog.add(
+        {
+            "uri": f"spotify:track:love{idx}",
+            "name": f"Love Song Number {idx} (Live at the Hall)",
+            "artists": [{"name": "The Band"}],
+        }
+        for idx in range(50)
+    )
+    catalog.add([{"uri": "spotify:track:love", "name": "Love", "artists": [{"name": "The Band"}]}])
+    uris = [track["uri"] for track in catalog.lookup("The Band", "Love")]
+    assert len(uris) == 5
+    assert uris[0] == "spotify:track:love"
+    catalog.close()
+
+
+def test_confident_local_matches_skip_the_search(catalog):
+    catalog.add(TRACKS)
+    spotify = Spotify(auth_mode="client", catalog=catalog)
+    spotify.search_tracks = MagicMock(return_value=[])
+
+    songs = [
+        Song("Daft Punk", "One More Time", duration=320),
+        Song("Daft Punk", "Around the World", duration=429),
+    ]
+    matches = spotify.match_songs(songs)
+
+    assert matches[0].uri == "spotify:track:1"
+    assert matches[1].uri is None
+    spotify.search_tracks.assert_called_once_with("Daft Punk", "Around the World")
+    assert (catalog.hits, catalog.misses) == (1, 1)
+    spotify.http.close()
@@ -0,0 +1,52 @@
+from app.tools.journal import Journal
+
+
+def test_load_finds_first_unfinished_page(tmp_path):
+    path = str(tmp_path / "journal.jsonl")
+    journal = Journal(path)
+    journal.playlist("sp1")
+    journal.page(None, "t1", ["a", "b"])
+    journal.page("t1", "t2", ["c", "d"])
+    journal.song("a", "Artist", "Song A (Official Video)", 200)
+    journal.resolved("a", "Artist", "Song A", 200, "uri:a", 90.0)
+    journal.done("b", "not_found")
+    journal.resolved("c", "Artist", "Song C", None, "uri:c", 80.0)
+    journal.song("d", "Artist", "Song D", None)
+    journal.added(["a"])
+    journal.close()
+
+    point = Journal.load(path)
+    assert point.spotify_playlist_id == "sp1"
+    assert point.final_video_ids == {"a", "b"}
+    assert point.songs["c"]["uri"] == "uri:c"
+    assert "uri" not in point.songs["d"]
+    assert sorted(point.songs) == ["c", "d"]
+    assert point.page_token == "t1"
+    assert not point.finished
+
+
+def test_load_ignores_torn_last_line(tmp_path):
+    path = tmp_path / "journal.jsonl"
+    journal = Journal(str(path))
+    journal.page(None, None, ["a"])
+    journal.done("a", "unparsed")
+    journal.close()
+    with open(path, "a") as file:
+        file.write('{"type": "added", "video_')
+
+    point = Journal.load(str(path))
+    assert point.finished
+    assert point.final_video_ids == {"a"}
+
+
+def test_records_are_batched_until_synced(tmp_path):
+    path = tmp_path / "journal.jsonl"
+    journal = Journal(str(path), sync_every=3, sync_interval=60)
+    journal.done("a", "not_found")
+    journal.done("b", "not_found")
+    assert path.read_text() == ""
+    journal.added(["c"])
+    assert len(path.read_text().splitlines()) == 3
+    journal.close(complete=True)
+    assert not path.exists()
+    assert Journal.load(str(path)) is None
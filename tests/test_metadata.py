@@ -0,0 +1,71 @@
+import json
+from unittest.mock import MagicMock
+from app.tools.metadata import MetadataStore
+from app.tools.ytdlp import VideoTitleExtractor
+
+INFO = {
+    "id": "abc",
+    "title": "Artist - Song (Official Video)",
+    "artist": "Artist",
+    "track": "Song",
+    "duration": 215,
+    "channel": "Artist",
+    "formats": [{"format_id": "18"}] * 50,
+    "description": "x" * 5000,
+}
+
+
+def test_store_keeps_only_used_fields(tmp_path):
+    store = MetadataStore(str(tmp_path / "metadata.sqlite"))
+    store.set("abc", INFO)
+    assert store.get("abc") == {
+        "id": "abc",
+        "title": "Artist - Song (Official Video)",
+        "artist": "Artist",
+        "track": "Song",
+        "duration": 215,
+        "channel": "Artist",
+    }
+    assert store.get("missing") is None
+    assert (store.hits, store.misses) == (1, 1)
+
+
+def test_store_persists_across_instances(tmp_path):
+    path = str(tmp_path / "metadata.sqlite")
+    store = MetadataStore(path)
+    store.set("abc", {"title": "No track info"})
+    store.close()
+    reopened = MetadataStore(path)
+    assert reopened.get("abc")["track"] is None
+    assert len(reopened) == 1
+
+
+def test_import_info_files(tmp_path):
+    playlist = tmp_path / "json" / "My Playlist"
+    playlist.mkdir(parents=True)
+    (playlist / "1_abc_Song.info.json").write_text(json.dumps(INFO))
+    (playlist / "My Playlist.info.json").write_text(
+        json.dumps({"_type": "playlist", "id": "PL1"})
+    )
+    (playlist / "broken.info.json").write_text("{")
+    store = MetadataStore(str(tmp_path / "metadata.sqlite"))
+    assert store.import_info_files(str(tmp_path / "json")) == 1
+    assert store.get("abc")["artist"] == "Artist"
+
+
+def test_extractor_checks_store_before_ytdlp(tmp_path):
+    store = MetadataStore(str(tmp_path / "metadata.sqlite"))
+    store.set("known", INFO)
+    extractor = VideoTitleExtractor({}, store=store)
+    extractor._local.ydl = MagicMock()
+    extractor._local.ydl.extract_info.side_effect = [dict(INFO, id="new"), None]
+
+    assert extractor.get_yt_metadata("known")["track"] == "Song"
+    extractor._local.ydl.extract_info.assert_not_called()
+
+    assert extractor.get_yt_metadata("new")["id"] == "new"
+    assert store.get("new")["track"] == "Song"
+
+    # Failed extractions are not stored, so they are retried next run.
+    assert extractor.get_yt_metadata("private") is None
+    assert store.get("private") is None
@@ -0,0 +1,44 @@
+import json
+import pytest
+from app.tools.metrics import Histogram, MetricsRegistry, MetricsWriter
+
+
+def test_counters_are_summed_per_label_set():
+    registry = MetricsRegistry()
+    registry.inc("api_requests_total", api="spotify", status=200)
+    registry.inc("api_requests_total", 2, api="spotify", status=429)
+    registry.inc("api_requests_total", api="youtube", status=200)
+    assert registry.counter("api_requests_total", api="spotify", status=429) == 2
+    assert registry.total("api_requests_total", api="spotify") == 3
+    assert registry.total("api_requests_total") == 4
+
+
+def test_histogram_quantiles_interpolate_within_buckets():
+    histogram = Histogram(buckets=(1.0, 2.0))
+    for value in (0.5, 1.5, 1.5, 1.5):
+        histogram.observe(value)
+    assert histogram.quantile(0.5) == pytest.approx(4 / 3)
+    assert histogram.quantile(0.25) == 1.0
+    assert Histogram().quantile(0.5) is None
+
+
+def test_prometheus_textfile_format():
+    registry = MetricsRegistry()
+    registry.inc("items_total", outcome="added")
+    registry.set("match_rate", 0.5)
+    with registry.time("stage_seconds", stage="search"):
+        pass
+    text = registry.to_prometheus()
+    assert '# TYPE archiver_items_total counter\narchiver_items_total{outcome="added"} 1\n' in text
+    assert "archiver_match_rate 0.5" in text
+    assert 'archiver_stage_seconds_bucket{stage="search",le="+Inf"} 1' in text
+    assert 'archiver_stage_seconds_count{stage="search"} 1' in text
+
+
+def test_writer_writes_reports_when_stopped(tmp_path):
+    registry = MetricsRegistry()
+    registry.inc("youtube_quota_units_total", method="youtube.playlistItems.list")
+    MetricsWriter(registry, str(tmp_path), interval=0).start().stop()
+    report = json.loads((tmp_path / "archiver_metrics.json").read_text())
+    assert report["counters"][0]["value"] == 1
+    assert (tmp_path / "archiver.prom").read_text().startswith("# TYPE")
@@ -0,0 +1,44 @@
+import os
+import re
+from app.tools.normalize import normalize_artist_title, parse_title
+
+CORPUS = os.path.join(os.path.dirname(__file__), "..", "benchmarks", "corpus", "titles.txt")
+
+
+def legacy_normalize(artist, title):
+    title = re.sub(r"\(.*", "", title)
+    title = re.sub(r"ft.*", "", title)
+    title = re.sub(r",.*", "", title)
+    artist = re.sub(r"\sx\s.*", "", artist)
+    artist = re.sub(r"\(.*", "", artist)
+    artist = re.sub(r"ft.*", "", artist)
+    artist = re.sub(r",.*", "", artist)
+    return artist.strip(), title.strip()
+
+
+def test_matches_sequential_rules_on_corpus():
+    with open(CORPUS, encoding="utf-8") as corpus:
+        titles = [line.strip() for line in corpus if line.strip()]
+    for video_title in titles:
+        parsed = parse_title(video_title)
+        if parsed:
+            assert normalize_artist_title(*parsed) == legacy_normalize(*parsed)
+        assert normalize_artist_title(video_title, video_title) == legacy_normalize(
+            video_title, video_title
+        )
+
+
+def test_docstring_example():
+    assert normalize_artist_title("Macroblank", "痛みの永 ft Kamo (痛)") == ("Macroblank", "痛みの永")
+    assert normalize_artist_title("Kygo x Whitney Houston", "Higher Love") == ("Kygo", "Higher Love")
+
+
+def test_results_are_memoized():
+    normalize_artist_title.cache_clear()
+    normalize_artist_title("Artist", "Song (Official Video)")
+    normalize_artist_title("Artist", "Song (Official Video)")
+    assert normalize_artist_title.cache_info().hits == 1
+
+
+def test_unparseable_title():
+    assert parse_title("Live at Red Rocks 2022 Full Set") is None
@@ -0,0 +1,212 @@
+import pytest
+from app.tools.journal import Journal
+from app.tools.pipeline import SEARCH_ERRORS, ArchivePipeline, RateLimitedError, SearchFailedError
+from app.tools.spotify import AddResult, PlaylistWriter
+from app.tools.utils import Match
+from app.tools.youtube import PlaylistItem, Song
+
+
+class FakeYoutube:
+    def __init__(self, pages):
+        self.pages = pages
+
+    def iter_playlist_pages(self, playlist_id, skip_video_ids=(), page_token=None, on_page=None):
+        for index in range(int(page_token or 0), len(self.pages)):
+            items = [item for item in self.pages[index] if item.video_id not in skip_video_ids]
+            if on_page:
+                next_token = str(index + 1) if index + 1 < len(self.pages) else None
+                on_page(str(index) if index else None, next_token, [item.video_id for item in items])
+            yield items
+
+    def extract_songs(self, items, strategy="ytdlp-first"):
+        return [
+            None if item.title == "unparseable" else Song(*item.title.split(" - "), item.video_id)
+            for item in items
+        ]
+
+
+class FakeSpotify:
+    def __init__(self, uris):
+        self.uris = uris
+        self.added = []
+
+    def match_songs(self, songs, concurrency=1):
+        uris = [self.uris.get(song.title) for song in songs]
+        return [uri if isinstance(uri, SEARCH_ERRORS) else Match(uri, 100.0) for uri in uris]
+
+    def add_songs_to_playlist(self, song_uris, playlist_id):
+        self.added.extend(song_uris)
+        return [AddResult(song_uris, True, 201)]
+
+
+def make_page(start, count):
+    return [PlaylistItem(f"v{idx}", f"Artist - Song {idx}") for idx in range(start, start + count)]
+
+
+def test_pipeline_keeps_playlist_order():
+    pages = [make_page(0, 50), make_page(50, 50), make_page(100, 7)]
+    spotify = FakeSpotify({f"Song {idx}": f"uri:{idx}" for idx in range(107)})
+    results = []
+    pipeline = ArchivePipeline(
+        FakeYoutube(pages), spotify, PlaylistWriter(spotify, "playlist"), on_result=results.append
+    )
+    stats = pipeline.run("PL")
+    assert spotify.added == [f"uri:{idx}" for idx in range(107)]
+    assert [result.item.video_id for result in results] == [f"v{idx}" for idx in range(107)]
+    assert (stats.items, stats.added) == (107, 107)
+
+
+def test_pipeline_reports_every_outcome():
+    page = make_page(0, 3) + [PlaylistItem("bad", "unparseable")]
+    spotify = FakeSpotify({"Song 0": "uri:0", "Song 1": RateLimitedError()})
+    stats = ArchivePipeline(FakeYoutube([page]), spotify).run("PL", skip_video_ids={"v2"})
+    assert (stats.items, stats.resolved, stats.rate_limited, stats.unparsed) == (3, 1, 1, 1)
+    assert spotify.added == []
+
+
+def test_failed_searches_are_not_final(tmp_path):
+    spotify = FakeSpotify({"Song 0": "uri:0", "Song 1": SearchFailedError(503), "Song 2": None})
+    journal = Journal(str(tmp_path / "journal.jsonl"))
+    stats = ArchivePipeline(FakeYoutube([make_page(0, 3)]), spotify, journal=journal).run("PL")
+    journal.close()
+    assert (stats.resolved, stats.search_failed, stats.not_found) == (1, 1, 1)
+    point = Journal.load(str(tmp_path / "journal.jsonl"))
+    assert point.final_video_ids == {"v2"}
+    assert "uri" not in point.songs["v1"]
+
+
+def test_pipeline_surfaces_stage_errors():
+    class BrokenYoutube(FakeYoutube):
+        def extract_songs(self, items, strategy="ytdlp-first"):
+            raise RuntimeError("extraction failed")
+
+    with pytest.raises(RuntimeError):
+        ArchivePipeline(BrokenYoutube([make_page(0, 5)] * 20), FakeSpotify({})).run("PL")
+
+
+def test_duplicate_queries_are_searched_once():
+    class CountingSpotify(FakeSpotify):
+        searched = []
+
+        def match_songs(self, songs, concurrency=1):
+            self.searched.extend(song.title for song in songs)
+            return super().match_songs(songs, concurrency)
+
+    pages = [
+        [PlaylistItem("v1", "Artist - Song"), PlaylistItem("v2", "ARTIST  - song")],
+        [PlaylistItem("v3", "Artist - Song"), PlaylistItem("v4", "Artist - Other")],
+    ]
+    spotify = CountingSpotify({"Song": "uri:song", "song": "uri:song", "Other": "uri:other"})
+    results = []
+    stats = ArchivePipeline(
+        FakeYoutube(pages), spotify, PlaylistWriter(spotify, "playlist"), on_result=results.append
+    ).run("PL")
+    assert spotify.searched == ["Song", "Other"]
+    assert stats.searches_saved == 2
+    results = {result.item.video_id: result for result in results}
+    assert [results[video_id].uri for video_id in ("v1", "v2", "v3", "v4")] == ["uri:song"] * 3 + ["uri:other"]
+    assert spotify.added == ["uri:song", "uri:other"]
+    assert {video_id for video_id, result in results.items() if result.duplicate} == {"v2", "v3"}
+
+
+def test_tracks_already_in_playlist_are_not_written():
+    spotify = FakeSpotify({f"Song {idx}": f"uri:{idx}" for idx in range(3)})
+    writer = PlaylistWriter(spotify, "playlist", existing_uris={"uri:1"})
+    stats = ArchivePipeline(FakeYoutube([make_page(0, 3)]), spotify, writer).run("PL")
+    assert spotify.added == ["uri:0", "uri:2"]
+    assert (stats.added, stats.duplicates) == (2, 1)
+
+
+def test_resumed_run_repeats_no_work(tmp_path):
+    class CountingYoutube(FakeYoutube):
+        extracted = []
+
+        def extract_songs(self, items, strategy="ytdlp-first"):
+            self.extracted.extend(item.video_id for item in items)
+            return super().extract_songs(items, strategy)
+
+    class CrashingSpotify(FakeSpotify):
+        searched = []
+        crash_after = None
+
+        def match_songs(self, songs, concurrency=1):
+            self.searched.extend(song.title for song in songs)
+            return super().match_songs(songs, concurrency)
+
+        def add_songs_to_playlist(self, song_uris, playlist_id):
+            if self.crash_after is not None and len(self.added) >= self.crash_after:
+                raise ConnectionError("network blip")
+            return super().add_songs_to_playlist(song_uris, playlist_id)
+
+    pages = [make_page(0, 50), make_page(50, 50), make_page(100, 50), make_page(150, 10)]
+    uris = {f"Song {idx}": f"uri:{idx}" for idx in range(160) if idx != 7}
+    path = str(tmp_path / "journal.jsonl")
+
+    youtube, spotify = CountingYoutube(pages), CrashingSpotify(uris)
+    spotify.crash_after = 40
+    journal = Journal(path)
+    with pytest.raises(ConnectionError):
+        ArchivePipeline(
+            youtube, spotify, PlaylistWriter(spotify, "playlist", batch_size=20), journal=journal
+        ).run("PL")
+    journal.close()
+    first_extracted, first_searched = list(youtube.extracted), list(spotify.searched)
+
+    resume = Journal.load(path)
+    assert "v7" in resume.final_video_ids  # not found
+    assert all(f"v{idx}" in resume.final_video_ids for idx in range(41))
+    spotify.crash_after = None
+    youtube.extracted.clear()
+    spotify.searched.clear()
+    journal = Journal(path, resume=True)
+    stats = ArchivePipeline(
+        youtube, spotify, PlaylistWriter(spotify, "playlist", batch_size=20), journal=journal
+    ).run("PL", resume=resume)
+    journal.close(complete=True)
+
+    assert spotify.added == [f"uri:{idx}" for idx in range(160) if idx != 7]
+    assert not set(youtube.extracted) & set(first_extracted)
+    assert not set(spotify.searched) & set(first_searched)
+    assert stats.added == 159 - 40
+    assert not (tmp_path / "journal.jsonl").exists()
+
+
+def test_parse_first_escalates_low_confidence_matches(tmp_path):
+    class TitleYoutube(FakeYoutube):
+        strategies = []
+        escalated = []
+
+        def extract_songs(self, items, strategy="ytdlp-first"):
+            self.strategies.append(strategy)
+            return [Song(*item.title.split(" - "), item.video_id, source="title") for item in items]
+
+        def extract_songs_ytdlp(self, items):
+            self.escalated.extend(item.video_id for item in items)
+            return [Song("Artist", "Real Song", item.video_id, 200, "ytdlp") if item.video_id == "v1" else None for item in items]
+
+    class ScoringSpotify(FakeSpotify):
+        scores = {"Clear Song": 95, "Vague Song": 65, "Lost Song": 70, "Real Song": 97}
+
+        def match_songs(self, songs, concurrency=1):
+            return [Match(f"uri:{song.title}", self.scores[song.title]) for song in songs]
+
+    page = [PlaylistItem(f"v{idx}", f"Artist - {title} Song") for idx, title in enumerate(["Clear", "Vague", "Lost"])]
+    youtube = TitleYoutube([page])
+    spotify = ScoringSpotify({})
+    journal = Journal(str(tmp_path / "journal.jsonl"))
+    results = []
+    stats = ArchivePipeline(
+        youtube, spotify, on_result=results.append, journal=journal, strategy="parse-first"
+    ).run("PL")
+    journal.close()
+
+    assert youtube.strategies == ["parse-first"]
+    assert youtube.escalated == ["v1", "v2"]
+    assert [(result.uri, result.song.source) for result in results] == [
+        ("uri:Clear Song", "title"), ("uri:Real Song", "ytdlp"), ("uri:Lost Song", "title")
+    ]
+    assert stats.escalated == 2
+    songs = Journal.load(str(tmp_path / "journal.jsonl")).songs
+    assert {video_id: song["uri"] for video_id, song in songs.items()} == {
+        "v0": "uri:Clear Song", "v1": "uri:Real Song", "v2": "uri:Lost Song"
+    }
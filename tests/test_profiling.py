@@ -0,0 +1,43 @@
+import pstats
+import time
+import tracemalloc
+from app.tools.pipeline import STAGE_FUNCTIONS, ArchivePipeline
+from app.tools.profiling import StageProfiler
+from app.tools.spotify import PlaylistWriter
+from tests.test_pipeline import FakeSpotify, FakeYoutube, make_page
+
+
+class SlowYoutube(FakeYoutube):
+    def extract_songs(self, items, strategy="ytdlp-first"):
+        time.sleep(0.05)
+        self.kept = [bytearray(1024) for _ in items]
+        return super().extract_songs(items, strategy)
+
+
+def test_profiled_run_writes_every_view(tmp_path):
+    pages = [make_page(0, 20), make_page(20, 20)]
+    spotify = FakeSpotify({f"Song {idx}": f"uri:{idx}" for idx in range(40)})
+    profiler = StageProfiler(str(tmp_path), STAGE_FUNCTIONS).start()
+    ArchivePipeline(
+        SlowYoutube(pages), spotify, PlaylistWriter(spotify, "playlist"), profiler=profiler
+    ).run("PL")
+    profiler.stop()
+
+    stats = pstats.Stats(str(tmp_path / "extract.pstats"))
+    assert any(function == "extract_songs" for _, _, function in stats.stats)
+    assert (tmp_path / "write.pstats").exists()
+
+    folded = (tmp_path / "extract.folded").read_text().splitlines()
+    assert folded and all(line.rsplit(" ", 1)[1].isdigit() for line in folded)
+    assert any(line.startswith("pipeline-extract;") and "extract_songs" in line for line in folded)
+    assert all(
+        line.split(";", 1)[0] in {*STAGE_FUNCTIONS, "other"}
+        for line in (tmp_path / "all.folded").read_text().splitlines()
+    )
+
+    snapshot = tracemalloc.Snapshot.load(str(tmp_path / "extract.tracemalloc"))
+    assert snapshot.traces
+    summary = (tmp_path / "summary.txt").read_text()
+    assert "== extract ==" in summary and "extract_songs" in summary
+    assert "test_profiling.py:13" in summary
+    assert not tracemalloc.is_tracing()
@@ -0,0 +1,37 @@
+from app.tools.utils import duration_score, rank_candidates
+
+CANDIDATES = [
+    {"uri": "spotify:track:ship", "name": "Pirate Ship", "artists": [{"name": "Someone Else"}]},
+    {"uri": "spotify:track:inst", "name": "Mal - Instrumental", "artists": [{"name": "PO.U.RYU"}]},
+    {"uri": "spotify:track:mal", "name": "Mal", "artists": [{"name": "PO.U.RYU"}]},
+]
+
+
+def test_best_candidate_is_picked_not_first():
+    (match,) = rank_candidates([("PO.U.RYU", "Mal", None)], [CANDIDATES])
+    assert match.uri == "spotify:track:mal"
+    assert match.confidence == 100
+
+
+def test_featured_artists_are_considered():
+    candidates = [{"uri": "a", "name": "Song", "artists": [{"name": "Main"}, {"name": "Guest"}]}]
+    (match,) = rank_candidates([("Guest", "Song", None)], [candidates])
+    assert match.confidence == 100
+
+
+def test_duration_breaks_ties():
+    candidates = [
+        {"uri": "edit", "name": "Song", "artists": [{"name": "Artist"}], "duration_ms": 180_000},
+        {"uri": "album", "name": "Song", "artists": [{"name": "Artist"}], "duration_ms": 240_000},
+    ]
+    (match,) = rank_candidates([("Artist", "Song", 241)], [candidates])
+    assert match.uri == "album"
+    assert duration_score(None, 1000) is None
+
+
+def test_batch_ranking_handles_empty_searches():
+    matches = rank_candidates(
+        [("PO.U.RYU", "Mal", None), ("Nobody", "Nothing", None)], [CANDIDATES, []]
+    )
+    assert matches[0].uri == "spotify:track:mal"
+    assert (matches[1].uri, matches[1].confidence) == (None, 0.0)
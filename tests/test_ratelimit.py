@@ -0,0 +1,59 @@
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import MagicMock
+import pytest
+from app.tools.ratelimit import (
+    AdaptiveLimiter,
+    RateLimitedError,
+    RequestScheduler,
+    retry_after_seconds,
+)
+
+
+def make_response(status_code, retry_after=None):
+    response = MagicMock()
+    response.status_code = status_code
+    response.headers = {} if retry_after is None else {"Retry-After": retry_after}
+    return response
+
+
+def test_retry_after_header_is_honored():
+    assert retry_after_seconds(make_response(429, "3"), attempt=0) == 3
+    assert retry_after_seconds(make_response(429), attempt=2) == 4
+
+
+def test_scheduler_retries_throttled_requests():
+    responses = [make_response(429, "0"), make_response(429, "0"), make_response(200)]
+    scheduler = RequestScheduler(rate=1000, max_concurrency=4)
+    response = scheduler.send(lambda: responses.pop(0))
+    assert response.status_code == 200
+    assert scheduler.throttled == 2
+
+
+def test_scheduler_reports_rate_limit_instead_of_dropping():
+    scheduler = RequestScheduler(rate=1000, max_retries=2)
+    with pytest.raises(RateLimitedError):
+        scheduler.send(lambda: make_response(429, "0"))
+    assert scheduler.throttled == 3
+
+
+def test_throttled_requests_are_counted_across_threads():
+    scheduler = RequestScheduler(rate=100_000, max_concurrency=8, max_retries=0)
+
+    def send(_):
+        with pytest.raises(RateLimitedError):
+            scheduler.send(lambda: make_response(429, "0"))
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(send, range(400)))
+    assert scheduler.throttled == 400
+
+
+def test_limiter_backs_off_and_recovers():
+    limiter = AdaptiveLimiter(maximum=8)
+    limiter.acquire()
+    limiter.release(throttled=True)
+    assert limiter.limit == 4
+    for _ in range(20):
+        limiter.acquire()
+        limiter.release(latency=0.1)
+    assert 4 < limiter.limit <= 8
@@ -3,10 +3,10 @@ from unittest.mock import patch, MagicMock
 from spotipy import util
 import requests 
 import os
+import time
 from app.tools.app_logger import setup_logger
 from urllib.parse import quote
-from app.tools.utils import fuzzy_match_artist, artist_names_from_tracks
-from app.tools.spotify import Spotify
+from app.tools.spotify import PlaylistWriter, SearchFailedError, Spotify, SpotifyClientManager
 
 class TestSpotify:
     @patch.object(util, 'prompt_for_user_token')
@@ -39,3 +39,119 @@ class TestSpotify:
         result = spotify.add_song_to_playlist('test_song_uri', 'test_playlist_id')
         assert result == True
 
+
+    @patch.object(util, 'prompt_for_user_token')
+    @patch.object(requests.Session, 'request')
+    def test_add_songs_to_playlist_batches(self, mock_post, mock_prompt_for_user_token):
+        mock_prompt_for_user_token.return_value = 'test_token'
+        mock_response = MagicMock()
+        mock_response.ok = True
+        mock_response.status_code = 201
+        mock_post.return_value = mock_response
+        spotify = Spotify()
+        uris = [f'spotify:track:{idx}' for idx in range(250)]
+        results = spotify.add_songs_to_playlist(uris, 'test_playlist_id')
+        assert mock_post.call_count == 3
+        assert [len(result.uris) for result in results] == [100, 100, 50]
+        assert [uri for result in results for uri in result.uris] == uris
+
+    @patch.object(util, 'prompt_for_user_token')
+    @patch.object(requests.Session, 'request')
+    def test_playlist_writer_reports_failed_chunks(self, mock_post, mock_prompt_for_user_token):
+        mock_prompt_for_user_token.return_value = 'test_token'
+        ok_response, bad_response = MagicMock(ok=True, status_code=201), MagicMock(ok=False, status_code=500)
+        mock_post.side_effect = [ok_response, bad_response]
+        writer = PlaylistWriter(Spotify(), 'test_playlist_id', batch_size=2)
+        outcomes = writer.add('uri:1', 'a') + writer.add('uri:2', 'b') + writer.add('uri:3', 'c')
+        outcomes += writer.flush()
+        assert outcomes == [('a', 'uri:1', True), ('b', 'uri:2', True), ('c', 'uri:3', False)]
+
+    @patch.object(util, 'prompt_for_user_token')
+    @patch.object(requests.Session, 'request')
+    def test_playlist_track_uris_are_paginated(self, mock_get, mock_prompt_for_user_token):
+        mock_prompt_for_user_token.return_value = 'test_token'
+        first = MagicMock(ok=True, status_code=200)
+        first.json.return_value = {
+            'items': [{'track': {'uri': 'uri:1'}}, {'track': None}],
+            'next': 'https://api.spotify.com/v1/playlists/p/tracks?offset=100&limit=100',
+        }
+        second = MagicMock(ok=True, status_code=200)
+        second.json.return_value = {'items': [{'track': {'uri': 'uri:2'}}], 'next': None}
+        mock_get.side_effect = [first, second]
+        assert Spotify().get_playlist_track_uris('p') == {'uri:1', 'uri:2'}
+        assert mock_get.call_args_list[0].kwargs['params'] == {'fields': 'items(track(uri)),next', 'limit': 100}
+        assert mock_get.call_args_list[1].kwargs['params'] is None
+
+    @patch.object(util, 'prompt_for_user_token')
+    @patch.object(requests.Session, 'request')
+    def test_find_playlist_follows_next_pages(self, mock_get, mock_prompt_for_user_token):
+        mock_prompt_for_user_token.return_value = 'test_token'
+        next_url = 'https://api.spotify.com/v1/me/playlists?offset=50&limit=50'
+        first = MagicMock(ok=True, status_code=200)
+        first.json.return_value = {
+            'items': [{'id': 'theirs', 'name': 'Archive', 'owner': {'id': 'someone_else'}}],
+            'next': next_url,
+        }
+        second = MagicMock(ok=True, status_code=200)
+        second.json.return_value = {
+            'items': [{'id': 'mine', 'name': 'Archive', 'owner': {'id': 'test_user'}}],
+            'next': None,
+        }
+        mock_get.side_effect = [first, second]
+        spotify = Spotify()
+        spotify.spotify.user_id = 'test_user'
+        assert spotify.find_playlist('Archive') == 'mine'
+        assert mock_get.call_count == 2
+        assert mock_get.call_args_list[1].args == ('GET', next_url)
+        assert mock_get.call_args_list[1].kwargs['params'] is None
+
+    @patch.object(util, 'prompt_for_user_token')
+    @patch.object(requests.Session, 'request')
+    def test_failed_searches_are_not_reported_as_not_found(self, mock_get, mock_prompt_for_user_token):
+        mock_prompt_for_user_token.return_value = 'test_token'
+        mock_get.return_value = MagicMock(ok=False, status_code=401)
+        song = MagicMock(artist='test_artist', title='test_song', duration=None)
+        [match] = Spotify().match_songs([song])
+        assert isinstance(match, SearchFailedError)
+        assert match.status_code == 401
+
+    @patch.object(requests.Session, 'request')
+    def test_search_without_title_sends_no_request(self, mock_get):
+        spotify = Spotify(auth_mode='client')
+        assert spotify.search_tracks('test_artist', None) == []
+        assert spotify.get_song_uri('test_artist', '') is None
+        mock_get.assert_not_called()
+        spotify.http.close()
+
+    def test_concurrent_searches_keep_input_order(self):
+        finished = []
+
+        def search_tracks(artist, song_name):
+            index = int(song_name.split()[-1])
+            # Later songs finish first.
+            time.sleep((5 - index) * 0.02)
+            finished.append(index)
+            if index == 2:
+                raise SearchFailedError(503)
+            return [{'uri': f'uri:{index}', 'name': song_name, 'artists': [{'name': artist}], 'duration_ms': None}]
+
+        spotify = Spotify(auth_mode='client')
+        spotify.search_tracks = search_tracks
+        songs = [MagicMock(artist='Artist', title=f'Song {idx}', duration=None) for idx in range(5)]
+        matches = spotify.match_songs(songs, concurrency=5)
+        assert finished != sorted(finished)
+        assert [match.uri for idx, match in enumerate(matches) if idx != 2] == ['uri:0', 'uri:1', 'uri:3', 'uri:4']
+        assert isinstance(matches[2], SearchFailedError)
+        assert matches[2].status_code == 503
+        spotify.http.close()
+
+    @patch.object(util, 'prompt_for_user_token')
+    def test_token_is_cached_until_it_expires(self, mock_prompt_for_user_token):
+        mock_prompt_for_user_token.return_value = 'test_token'
+        manager = SpotifyClientManager()
+        assert manager.token == 'test_token'
+        assert manager.token == 'test_token'
+        assert mock_prompt_for_user_token.call_count == 1
+        manager._token_info['expires_at'] = 0
+        assert manager.token == 'test_token'
+        assert mock_prompt_for_user_token.call_count == 2
@@ -0,0 +1,21 @@
+import os
+import subprocess
+import sys
+
+APP_DIR = os.path.join(os.path.dirname(__file__), "..", "app")
+HEAVY_MODULES = ("googleapiclient", "yt_dlp", "spotipy", "requests")
+
+
+def test_importing_main_skips_heavy_dependencies():
+    code = (
+        "import sys, main; "
+        f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=APP_DIR,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    assert result.stdout.strip() == ""
@@ -0,0 +1,92 @@
+import argparse
+from unittest.mock import MagicMock
+from app.main import archive_playlist
+from app.tools.state import SyncState
+from tests.test_pipeline import FakeSpotify, FakeYoutube, make_page
+
+
+def test_sync_state_round_trip(tmp_path):
+    path = str(tmp_path / "sync_state.sqlite")
+    state = SyncState(path)
+    assert state.get_spotify_playlist("PL1") is None
+    state.set_spotify_playlist("PL1", "spotify_playlist")
+    state.mark_handled("PL1", ["a", "b"], "added")
+    state.mark_handled("PL2", ["c"], "not_found")
+    state.close()
+
+    reopened = SyncState(path)
+    assert reopened.get_spotify_playlist("PL1") == "spotify_playlist"
+    assert reopened.handled_video_ids("PL1") == {"a", "b"}
+    assert reopened.handled_video_ids("PL2") == {"c"}
+
+
+class SyncYoutube(FakeYoutube):
+    def get_playlist_title(self, playlist_id):
+        return "Archive"
+
+    def get_playlist_description(self, playlist_id):
+        return ""
+
+
+class SyncSpotify(FakeSpotify):
+    def __init__(self, uris, found=None):
+        super().__init__(uris)
+        self.found = found
+        self.created = []
+        self.searched = []
+
+    def find_playlist(self, playlist_name):
+        return self.found
+
+    def create_playlist(self, playlist_name, playlist_description):
+        self.created.append(playlist_name)
+        return "created"
+
+    def get_playlist_track_uris(self, playlist_id):
+        return set(self.added)
+
+    def match_songs(self, songs, concurrency=1):
+        self.searched.extend(song.title for song in songs)
+        return super().match_songs(songs, concurrency)
+
+    def _num_playlist_songs(self, playlist_id):
+        return len(self.added)
+
+
+def sync(tmp_path, pages, spotify, state):
+    args = argparse.Namespace(
+        dryrun=False,
+        output=str(tmp_path),
+        resume=False,
+        concurrency=1,
+        strategy="ytdlp-first",
+        escalate_confidence=80,
+    )
+    return archive_playlist("PL", spotify, SyncYoutube(pages), args, MagicMock(), state=state)
+
+
+def test_second_sync_reuses_the_playlist_and_skips_handled_videos(tmp_path):
+    state = SyncState(str(tmp_path / "sync_state.sqlite"))
+    spotify = SyncSpotify({f"Song {idx}": f"uri:{idx}" for idx in range(5)})
+    sync(tmp_path, [make_page(0, 3)], spotify, state)
+    assert spotify.created == ["Archive"]
+    assert state.get_spotify_playlist("PL") == "created"
+
+    spotify.found, spotify.searched = "found", []
+    stats = sync(tmp_path, [make_page(0, 3), make_page(3, 2)], spotify, state)
+    assert spotify.created == ["Archive"]
+    assert state.get_spotify_playlist("PL") == "created"
+    assert spotify.searched == ["Song 3", "Song 4"]
+    assert spotify.added == [f"uri:{idx}" for idx in range(5)]
+    assert (stats.items, stats.added) == (2, 2)
+    assert state.handled_video_ids("PL") == {f"v{idx}" for idx in range(5)}
+    state.close()
+
+
+def test_sync_without_state_finds_the_existing_playlist(tmp_path):
+    state = SyncState(str(tmp_path / "sync_state.sqlite"))
+    spotify = SyncSpotify({"Song 0": "uri:0"}, found="found")
+    sync(tmp_path, [make_page(0, 1)], spotify, state)
+    assert spotify.created == []
+    assert state.get_spotify_playlist("PL") == "found"
+    state.close()
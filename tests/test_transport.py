@@ -0,0 +1,85 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+import pytest
+from app.tools.transport import BearerAuth, HttpTransport
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    failures_left = 0
+    posts = 0
+
+    def do_GET(self):
+        if StandInHandler.failures_left:
+            StandInHandler.failures_left -= 1
+            self.send_response(503)
+            self.end_headers()
+            return
+        body = json.dumps({"path": self.path, "auth": self.headers.get("Authorization")})
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.end_headers()
+        self.wfile.write(body.encode())
+
+    def do_POST(self):
+        StandInHandler.posts += 1
+        self.send_response(503)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = HTTPServer(("127.0.0.1", 0), StandInHandler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_port}/v1"
+    httpd.shutdown()
+
+
+def test_relative_paths_use_base_url(server):
+    transport = HttpTransport(server)
+    response = transport.get("/search", params={"q": "song"})
+    assert response.json()["path"] == "/v1/search?q=song"
+
+
+def test_retries_transient_server_errors(server):
+    StandInHandler.failures_left = 2
+    transport = HttpTransport(server, backoff_factor=0)
+    response = transport.get("/search")
+    assert response.ok
+    assert StandInHandler.failures_left == 0
+
+
+def test_server_errors_of_posts_are_not_retried(server):
+    # The server may have applied the POST before failing.
+    StandInHandler.posts = 0
+    transport = HttpTransport(server, backoff_factor=0)
+    assert transport.post("/playlists/x/tracks").status_code == 503
+    assert StandInHandler.posts == 1
+
+
+def test_auth_is_applied_per_request(server):
+    class Manager:
+        token = "first"
+
+    manager = Manager()
+    transport = HttpTransport(server, auth=BearerAuth(manager))
+    assert transport.get("/me").json()["auth"] == "Bearer first"
+    manager.token = "second"
+    assert transport.get("/me").json()["auth"] == "Bearer second"
+
+
+def test_requests_and_retries_are_counted(server):
+    from app.tools.transport import metrics
+
+    metrics.reset()
+    StandInHandler.failures_left = 1
+    transport = HttpTransport(server, backoff_factor=0, name="stand-in")
+    transport.get("/search")
+    assert metrics.counter("api_requests_total", api="stand-in", method="GET", status=200) == 1
+    assert metrics.counter("api_retries_total", api="stand-in") == 1
+    assert metrics.histogram("api_request_seconds", api="stand-in", method="GET").count == 1
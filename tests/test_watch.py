@@ -0,0 +1,80 @@
+import json
+import threading
+import time
+from urllib.request import Request, urlopen
+from app.tools.watch import PlaylistWatcher, start_control_server
+
+
+class Playlists:
+    def __init__(self, versions):
+        self.versions = versions
+        self.checked = []
+        self.synced = []
+        self.failing = set()
+
+    def check_versions(self, playlists):
+        self.checked.append(list(playlists))
+        return {playlist: self.versions[playlist] for playlist in playlists if playlist in self.versions}
+
+    def sync(self, playlists):
+        self.synced.append(list(playlists))
+        return {playlist: playlist not in self.failing for playlist in playlists}
+
+
+def test_only_changed_playlists_are_synced():
+    source = Playlists({"PL1": "10:a", "PL2": "5:b"})
+    watcher = PlaylistWatcher(["PL1", "PL2", "PL3"], source.check_versions, source.sync)
+    watched = list(watcher.playlists.values())
+
+    watcher.poll(watched)
+    assert source.synced == [["PL1", "PL2"]]  # PL3 is unavailable
+
+    source.versions["PL2"] = "6:c"
+    watcher.poll(watched)
+    assert source.synced[-1] == ["PL2"]
+
+    watcher.poll(watched)
+    assert len(source.synced) == 2
+    assert all(watched.due_at > time.monotonic() for watched in watched)
+
+
+def test_failed_syncs_are_retried_and_triggers_force_a_sync():
+    source = Playlists({"PL1": "10:a", "PL2": "5:b"})
+    source.failing = {"PL1"}
+    watcher = PlaylistWatcher(["PL1", "PL2"], source.check_versions, source.sync)
+    watched = list(watcher.playlists.values())
+    watcher.poll(watched)
+    watcher.poll(watched)
+    assert source.synced == [["PL1", "PL2"], ["PL1"]]
+    assert watcher.playlists["PL1"].failures == 2
+
+    assert watcher.trigger("PL2") == ["PL2"]
+    assert watcher.trigger("unknown") == []
+    watcher.poll(watcher._take_due())
+    assert source.synced[-1] == ["PL2"]
+
+
+def test_control_endpoint_triggers_running_watcher():
+    source = Playlists({"PL1": "1:a"})
+    watcher = PlaylistWatcher(["PL1"], source.check_versions, source.sync, interval=60)
+    server = start_control_server(watcher, 0)
+    base_url = f"http://127.0.0.1:{server.server_port}"
+    thread = threading.Thread(target=watcher.run)
+    thread.start()
+    try:
+        deadline = time.monotonic() + 5
+        while len(source.synced) < 1 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        with urlopen(Request(f"{base_url}/sync?playlist=PL1", method="POST")) as response:
+            assert response.status == 202
+        while len(source.synced) < 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        with urlopen(f"{base_url}/status") as response:
+            status = json.load(response)["playlists"][0]
+        assert status["syncs"] == 2
+        assert status["next_poll_in"] > 50
+    finally:
+        watcher.request_stop()
+        thread.join(timeout=5)
+        server.shutdown()
+    assert not thread.is_alive()
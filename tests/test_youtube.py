@@ -61,4 +61,112 @@ def test_fetch_uri(youtube_instance, sp_instance):
 
 def test_url_to_id():
     playlist_id = "https://www.youtube.com/playlist?list=PLnKNmWNuQnyzNywBaSk2nOBpFkIQ0k89v"
-    assert url_to_id(playlist_id) == "PLnKNmWNuQnyzNywBaSk2nOBpFkIQ0k89v"
\ No newline at end of file
+    assert url_to_id(playlist_id) == "PLnKNmWNuQnyzNywBaSk2nOBpFkIQ0k89v"
+
+def test_track_from_provided_to_youtube_description():
+    from app.tools.youtube import track_from_video_snippet
+    snippet = {
+        "title": "Mal",
+        "channelTitle": "PO.U.RYU - Topic",
+        "description": "Provided to YouTube by DistroKid\n\nMal · PO.U.RYU\n\nMal\n\n℗ 2021",
+    }
+    song = track_from_video_snippet(snippet)
+    assert (song.artist, song.title) == ("PO.U.RYU", "Mal")
+
+def test_track_from_topic_channel():
+    from app.tools.youtube import track_from_video_snippet
+    song = track_from_video_snippet({"title": "Waves", "channelTitle": "Mr. Probz - Topic"})
+    assert (song.artist, song.title) == ("Mr. Probz", "Waves")
+
+def test_track_from_snippet_needs_confident_source():
+    from app.tools.youtube import track_from_video_snippet
+    snippet = {"title": "Some Band - Live at Home", "channelTitle": "Uploader", "tags": ["music"]}
+    assert track_from_video_snippet(snippet) is None
+    snippet["tags"].append("Some Band")
+    assert track_from_video_snippet(snippet).artist == "Some Band"
+
+@pytest.mark.parametrize("strategy, extracted", [("ytdlp-first", ["v1", "v2"]), ("parse-first", ["v2"])])
+def test_extract_songs_strategy(youtube_instance, monkeypatch, strategy, extracted):
+    from app.tools.youtube import PlaylistItem
+    calls = []
+
+    def get_yt_metadata_many(video_ids):
+        calls.extend(video_ids)
+        return [{"artist": "Band", "track": "Track", "duration": 200} if video_id == "v2" else None for video_id in video_ids]
+
+    monkeypatch.setattr(Youtube, "youtube", None)
+    monkeypatch.setattr(youtube_instance, "_Youtube__fetch_video_snippets", lambda youtube, video_ids: {})
+    monkeypatch.setattr(youtube_instance.ytdl, "get_yt_metadata_many", get_yt_metadata_many)
+    items = [PlaylistItem("v1", "Artist - Song (Official Video)"), PlaylistItem("v2", "untitled upload")]
+    songs = youtube_instance.extract_songs(items, strategy)
+    assert calls == extracted
+    assert [(song.title, song.source) for song in songs] == [("Song", "title"), ("Track", "ytdlp")]
+
+class FakeRequest:
+    def __init__(self, kwargs, response):
+        self.kwargs = kwargs
+        self.response = response
+        self.headers = {}
+
+    def execute(self, http=None):
+        if isinstance(self.response, Exception):
+            raise self.response
+        return self.response
+
+class FakeResource:
+    """Stands in for the Data API client, answering each request with the next response."""
+
+    def __init__(self, responses):
+        self.responses = responses
+        self.requests = []
+
+    def list(self, **kwargs):
+        request = FakeRequest(kwargs, self.responses.pop(0))
+        self.requests.append(request)
+        return request
+
+    def playlists(self):
+        return self
+
+    def playlistItems(self):
+        return self
+
+def not_modified():
+    import httplib2
+    from googleapiclient.errors import HttpError
+    return HttpError(httplib2.Response({"status": 304}), b"")
+
+def page(etag, *video_ids):
+    items = [{"snippet": {"title": f"Artist - {video_id}", "resourceId": {"videoId": video_id}}} for video_id in video_ids]
+    return {"etag": etag, "items": items}
+
+def test_playlist_pages_are_revalidated_with_their_etag(ydl_opts, tmp_path, monkeypatch):
+    from app.tools.cache import PageCache
+    from app.tools.youtube import PLAYLIST_ITEMS_FIELDS, PLAYLIST_ITEMS_PER_REQUEST
+    cache = PageCache(str(tmp_path / "pages.sqlite"))
+    resource = FakeResource([page("etag-1", "v1"), not_modified(), page("etag-2", "v1", "v2")])
+    monkeypatch.setattr(Youtube, "youtube", resource)
+    youtube = Youtube(ydl_input_ops=ydl_opts, page_cache=cache)
+
+    first = list(youtube.iter_playlist_pages("PL"))
+    unchanged = list(youtube.iter_playlist_pages("PL"))
+    changed = list(youtube.iter_playlist_pages("PL"))
+
+    assert [item.video_id for item in first[0]] == [item.video_id for item in unchanged[0]] == ["v1"]
+    assert [item.video_id for item in changed[0]] == ["v1", "v2"]
+    assert [request.headers.get("If-None-Match") for request in resource.requests] == [None, "etag-1", "etag-1"]
+    assert cache.revalidated == 1
+    assert cache.get("playlistItems:PL:") == ("etag-2", page("etag-2", "v1", "v2"))
+    assert resource.requests[0].kwargs["fields"] == PLAYLIST_ITEMS_FIELDS
+    assert resource.requests[0].kwargs["maxResults"] == PLAYLIST_ITEMS_PER_REQUEST == 50
+
+def test_playlist_snippet_is_fetched_once(ydl_opts, monkeypatch):
+    from app.tools.youtube import PLAYLIST_FIELDS
+    snippet = {"etag": "etag-1", "items": [{"snippet": {"title": "Mix", "description": "Songs"}}]}
+    resource = FakeResource([snippet])
+    monkeypatch.setattr(Youtube, "youtube", resource)
+    youtube = Youtube(ydl_input_ops=ydl_opts)
+    assert youtube.get_playlist_title("PL") == "Mix"
+    assert youtube.get_playlist_description("PL") == "Songs"
+    assert len(resource.requests) == 1
+    assert resource.requests[0].kwargs["fields"] == PLAYLIST_FIELDS
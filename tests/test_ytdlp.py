@@ -0,0 +1,49 @@
+import threading
+import time
+import yt_dlp
+from app.tools.ytdlp import VideoTitleExtractor
+
+
+class FakeYoutubeDL:
+    instances = []
+
+    def __init__(self, options):
+        self.thread = threading.get_ident()
+        self.extracted = []
+        self.closed = False
+        FakeYoutubeDL.instances.append(self)
+
+    def extract_info(self, url, download=True):
+        assert threading.get_ident() == self.thread
+        video_id = url.rsplit("=", 1)[1]
+        self.extracted.append(video_id)
+        # Later videos finish first.
+        time.sleep(0.002 * (20 - int(video_id.lstrip("bad"))))
+        if video_id.startswith("bad"):
+            return None  # What yt-dlp returns for a failed video with ignoreerrors.
+        return {"id": video_id, "artist": "Artist", "track": video_id}
+
+    def close(self):
+        self.closed = True
+
+
+def test_parallel_extraction_keeps_order_and_reuses_one_instance_per_thread(monkeypatch):
+    monkeypatch.setattr(yt_dlp, "YoutubeDL", FakeYoutubeDL)
+    monkeypatch.setattr(FakeYoutubeDL, "instances", [])
+    extractor = VideoTitleExtractor({}, workers=3)
+    video_ids = [f"bad{idx}" if idx == 5 else f"{idx}" for idx in range(12)]
+
+    results = extractor.get_yt_metadata_many(video_ids)
+    results += extractor.get_yt_metadata_many(["12"])
+
+    assert [result and result["id"] for result in results] == [
+        *video_ids[:5], None, *video_ids[6:], "12"
+    ]
+    instances = FakeYoutubeDL.instances
+    assert 1 < len(instances) <= 3
+    assert len({instance.thread for instance in instances}) == len(instances)
+    assert sorted(video for instance in instances for video in instance.extracted) == sorted(
+        video_ids + ["12"]
+    )
+    extractor.close()
+    assert all(instance.closed for instance in instances)